@@ -0,0 +1 @@
+"""Performance benchmarks for sans-subtitle-generator."""
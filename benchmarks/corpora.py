@@ -0,0 +1,75 @@
+import random
+
+CJK_CHARS = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经"
+LATIN_WORDS = ["sans", "typing", "subtitle", "render", "frame", "audio", "video", "text", "sound", "pixel"]
+CJK_ENDERS = "。！？"
+LATIN_ENDERS = ".!?"
+PAUSES = "，、,"
+OTHER_PUNCTUATION = "：；“”《》（）—…"
+
+CORPUS_KINDS = ("cjk", "mixed", "punct", "long")
+CORPUS_SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+
+
+def _cjk_sentence(rng: random.Random) -> str:
+    body = "".join(rng.choice(CJK_CHARS) for _ in range(rng.randint(6, 30)))
+    return body + rng.choice(CJK_ENDERS)
+
+
+def _mixed_sentence(rng: random.Random) -> str:
+    parts = []
+    for _ in range(rng.randint(2, 6)):
+        if rng.random() < 0.5:
+            parts.append("".join(rng.choice(CJK_CHARS) for _ in range(rng.randint(2, 8))))
+        else:
+            parts.append(" ".join(rng.choice(LATIN_WORDS) for _ in range(rng.randint(1, 4))))
+    return "".join(parts) + rng.choice(CJK_ENDERS + LATIN_ENDERS)
+
+
+def _punct_sentence(rng: random.Random) -> str:
+    chars = []
+    for _ in range(rng.randint(6, 30)):
+        roll = rng.random()
+        if roll < 0.3:
+            chars.append(rng.choice(PAUSES))
+        elif roll < 0.5:
+            chars.append(rng.choice(OTHER_PUNCTUATION))
+        else:
+            chars.append(rng.choice(CJK_CHARS))
+    return "".join(chars) + rng.choice(CJK_ENDERS)
+
+
+def _long_sentence(rng: random.Random) -> str:
+    # No enders at all, so each 200-character line is a single sentence
+    return "".join(rng.choice(CJK_CHARS) for _ in range(200)) + "\n"
+
+
+_GENERATORS = {
+    "cjk": _cjk_sentence,
+    "mixed": _mixed_sentence,
+    "punct": _punct_sentence,
+    "long": _long_sentence,
+}
+
+
+def generate_corpus(kind: str, size: int, seed: int = 0) -> str:
+    """Return a deterministic synthetic script of exactly `size` characters.
+
+    Lines are separated by newlines every few sentences, except for the
+    "long" kind where every line is one 200-character sentence.
+    """
+    if kind not in _GENERATORS:
+        raise ValueError(f"Unknown corpus kind: {kind}")
+
+    rng = random.Random(f"{kind}:{size}:{seed}")
+    make_sentence = _GENERATORS[kind]
+    pieces: list[str] = []
+    length = 0
+    while length < size:
+        piece = make_sentence(rng)
+        if kind != "long" and rng.random() < 0.2:
+            piece += "\n"
+        pieces.append(piece)
+        length += len(piece)
+
+    return "".join(pieces)[:size]
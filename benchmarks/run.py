@@ -0,0 +1,348 @@
+"""Benchmark runner.
+
+Usage:
+    python -m benchmarks.run                      # run and compare to baseline
+    python -m benchmarks.run --update-baseline    # record a new baseline
+    python -m benchmarks.run --stage parse --size 100k
+
+Every case runs in a fresh process so peak-memory figures are not polluted
+by earlier cases. Stages that need ffmpeg are skipped when it is missing.
+"""
+
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Optional
+
+import click
+
+from benchmarks.corpora import CORPUS_KINDS, CORPUS_SIZES, generate_corpus
+
+STAGES = ("parse", "audio", "frames", "video")
+FFMPEG_STAGES = ("audio", "video")
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+
+BENCH_STYLE = {
+    "font_path": "./fonts/default.ttf",
+    "font_size": 48,
+    "text_color": "#FFFFFF",
+    "background_color": "#000000",
+    "text_position": [100, 500],
+}
+BENCH_AUDIO = {
+    "pitch_variation": {"min": 1.0, "max": 1.0, "random": False},
+    "character_duration_ms": 80,
+    "sentence_pause_ms": 1000,
+    "character_pause_ms": 250,
+}
+PAUSE_CHARS = ["，", "、", ","]
+PARSE_REPEATS = 5
+# Slowdowns smaller than this are timer noise, whatever the percentage
+TIME_NOISE_FLOOR_S = 0.005
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _iter_frames(sentences: list[str], frame_config: dict, fps: int):
+    from src.frame_generator import iter_timeline_frames
+
+    font_path = BENCH_STYLE["font_path"]
+    if not Path(font_path).exists():
+        font_path = None
+
+    return iter_timeline_frames(
+        sentences,
+        frame_config,
+        font_path,
+        fps=fps,
+        character_duration_ms=BENCH_AUDIO["character_duration_ms"],
+        pause_chars=PAUSE_CHARS,
+        character_pause_ms=BENCH_AUDIO["character_pause_ms"],
+        sentence_pause_ms=BENCH_AUDIO["sentence_pause_ms"],
+    )
+
+
+def _make_sound(path: str) -> None:
+    cmd = [
+        "ffmpeg", "-y",
+        "-f", "lavfi",
+        "-i", "sine=frequency=440:duration=0.1",
+        path,
+    ]
+    subprocess.run(cmd, check=True, capture_output=True)
+
+
+def _timeline_frame_count(sentences: list[str], fps: int) -> int:
+    """Frames the frame generator renders for sentences, from the timing model."""
+    from src.timing import iter_sentence_block_runs
+
+    frames = 0
+    elapsed_ms = 0.0
+    for i, sentence in enumerate(sentences):
+        runs = iter_sentence_block_runs(
+            sentence,
+            fps=fps,
+            character_duration_ms=BENCH_AUDIO["character_duration_ms"],
+            pause_chars=PAUSE_CHARS,
+            character_pause_ms=BENCH_AUDIO["character_pause_ms"],
+            sentence_pause_ms=BENCH_AUDIO["sentence_pause_ms"],
+            elapsed_ms=elapsed_ms,
+            pause_after=i < len(sentences) - 1,
+        )
+        while True:
+            try:
+                count, _ = next(runs)
+            except StopIteration as stop:
+                elapsed_ms = stop.value
+                break
+            frames += count
+    return frames
+
+
+def _run_case(stage: str, kind: str, size: int, resolution: list[int], fps: int) -> dict:
+    """Run a single benchmark case. Executed inside a fresh worker process."""
+    from src.parser import split_sentences
+
+    text = generate_corpus(kind, size)
+    rss_before = _peak_rss_mb()
+    frames = 0
+
+    if stage == "parse":
+        # Parsing is fast enough that a single run is mostly noise
+        seconds = float("inf")
+        for _ in range(PARSE_REPEATS):
+            start = time.perf_counter()
+            split_sentences(text)
+            seconds = min(seconds, time.perf_counter() - start)
+
+    elif stage == "frames":
+        sentences = split_sentences(text)
+        frame_config = {**BENCH_STYLE, "resolution": resolution}
+        start = time.perf_counter()
+        for _ in _iter_frames(sentences, frame_config, fps):
+            frames += 1
+        seconds = time.perf_counter() - start
+
+    elif stage == "audio":
+        from src.audio_builder import build_audio_track
+
+        sentences = split_sentences(text)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            sound_path = str(Path(temp_dir) / "sound.wav")
+            _make_sound(sound_path)
+            start = time.perf_counter()
+            build_audio_track(
+                sentences,
+                sound_path,
+                str(Path(temp_dir) / "audio.wav"),
+                BENCH_AUDIO,
+                pause_chars=PAUSE_CHARS,
+            )
+            seconds = time.perf_counter() - start
+
+    elif stage == "video":
+        from PIL import Image
+
+        from src.video_builder import assemble_video_stream
+
+        sentences = split_sentences(text)
+        frames = _timeline_frame_count(sentences, fps)
+        # Encode cost is what is measured here, so every frame is the same
+        # pre-rendered image rather than the output of the frame generator.
+        frame = Image.new("RGB", tuple(resolution), BENCH_STYLE["background_color"])
+        with tempfile.TemporaryDirectory() as temp_dir:
+            audio_path = str(Path(temp_dir) / "silence.wav")
+            subprocess.run(
+                [
+                    "ffmpeg", "-y",
+                    "-f", "lavfi",
+                    "-i", "anullsrc=r=44100:cl=stereo",
+                    "-t", f"{frames / fps}",
+                    audio_path,
+                ],
+                check=True,
+                capture_output=True,
+            )
+            start = time.perf_counter()
+            assemble_video_stream(
+                (frame for _ in range(frames)),
+                audio_path,
+                "-",
+                # The ffmpeg pipe is benchmarked, whether or not PyAV is installed
+                {"resolution": resolution, "fps": fps, "format": "null", "backend": "cli"},
+            )
+            seconds = time.perf_counter() - start
+
+    else:
+        raise ValueError(f"Unknown stage: {stage}")
+
+    rss_after = _peak_rss_mb()
+    peak_mb = None
+    if rss_before is not None and rss_after is not None:
+        peak_mb = round(rss_after - rss_before, 1)
+
+    return {
+        "seconds": round(seconds, 4),
+        "chars_per_s": round(size / seconds, 1) if seconds else None,
+        "frames_per_s": round(frames / seconds, 1) if seconds and frames else None,
+        "peak_mb": peak_mb,
+    }
+
+
+def run_case_isolated(stage: str, kind: str, size: int, resolution: list[int], fps: int) -> dict:
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        try:
+            return pool.submit(_run_case, stage, kind, size, resolution, fps).result()
+        except BrokenProcessPool:
+            # The worker died without raising, almost always the OOM killer
+            return {"error": "worker killed (out of memory?)"}
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}"}
+
+
+def compare_to_baseline(
+    results: dict,
+    baseline: dict,
+    time_tolerance: float,
+    memory_tolerance: float,
+) -> list[str]:
+    """Return a human readable line for every case that regressed."""
+    regressions = []
+    for case_id, current in results.items():
+        previous = baseline.get(case_id)
+        if previous is None:
+            continue
+
+        if "error" in current:
+            if "error" not in previous:
+                regressions.append(f"{case_id}: failed ({current['error']})")
+            continue
+        if "error" in previous:
+            continue
+
+        allowed_s = max(previous["seconds"] * (1 + time_tolerance), previous["seconds"] + TIME_NOISE_FLOOR_S)
+        if current["seconds"] > allowed_s:
+            regressions.append(
+                f"{case_id}: {current['seconds']:.3f}s vs baseline "
+                f"{previous['seconds']:.3f}s (+{time_tolerance:.0%} allowed)"
+            )
+
+        prev_mb = previous.get("peak_mb")
+        cur_mb = current.get("peak_mb")
+        # Ignore memory noise below a few megabytes
+        if prev_mb is not None and cur_mb is not None and cur_mb > max(prev_mb * (1 + memory_tolerance), prev_mb + 5):
+            regressions.append(
+                f"{case_id}: peak {cur_mb:.1f}MB vs baseline {prev_mb:.1f}MB "
+                f"(+{memory_tolerance:.0%} allowed)"
+            )
+    return regressions
+
+
+def _format_row(case_id: str, result: dict) -> str:
+    if "error" in result:
+        return f"{case_id:<28} FAILED: {result['error']}"
+
+    def fmt(value, width, precision):
+        if value is None:
+            return f"{'-':>{width}}"
+        return f"{value:>{width}.{precision}f}"
+
+    return (
+        f"{case_id:<28} {fmt(result['seconds'], 10, 3)} "
+        f"{fmt(result['chars_per_s'], 12, 0)} "
+        f"{fmt(result['frames_per_s'], 10, 1)} "
+        f"{fmt(result['peak_mb'], 9, 1)}"
+    )
+
+
+@click.command()
+@click.option("--stage", "stages", multiple=True, type=click.Choice(STAGES), help="Stages to run (default: all)")
+@click.option("--kind", "kinds", multiple=True, type=click.Choice(CORPUS_KINDS), help="Corpus kinds (default: all)")
+@click.option("--size", "sizes", multiple=True, type=click.Choice(list(CORPUS_SIZES)), help="Corpus sizes (default: all)")
+@click.option(
+    "--max-render-chars",
+    default=1_000,
+    show_default=True,
+    help="Skip non-parse stages for corpora larger than this",
+)
+@click.option("--resolution", default="1920x1080", show_default=True, help="Frame resolution WxH")
+@click.option("--fps", default=30, show_default=True)
+@click.option("--baseline", "baseline_path", type=click.Path(), default=str(DEFAULT_BASELINE))
+@click.option("--update-baseline", is_flag=True, help="Write results as the new baseline")
+@click.option("--time-tolerance", default=0.30, show_default=True, help="Allowed slowdown fraction")
+@click.option("--memory-tolerance", default=0.30, show_default=True, help="Allowed peak-memory growth fraction")
+@click.option("--json", "json_output", type=click.Path(), help="Also write results to this JSON file")
+def cli(
+    stages, kinds, sizes, max_render_chars, resolution, fps,
+    baseline_path, update_baseline, time_tolerance, memory_tolerance, json_output,
+):
+    """Benchmark the subtitle pipeline against synthetic corpora."""
+    stages = stages or STAGES
+    kinds = kinds or CORPUS_KINDS
+    sizes = sizes or tuple(CORPUS_SIZES)
+    width, height = (int(v) for v in resolution.lower().split("x"))
+
+    has_ffmpeg = shutil.which("ffmpeg") is not None
+    results: dict[str, dict] = {}
+
+    click.echo(f"{'case':<28} {'seconds':>10} {'chars/s':>12} {'frames/s':>10} {'peak MB':>9}")
+    for stage in stages:
+        if stage in FFMPEG_STAGES and not has_ffmpeg:
+            click.echo(f"skipping {stage}: ffmpeg not found")
+            continue
+        for kind in kinds:
+            for size_name in sizes:
+                size = CORPUS_SIZES[size_name]
+                if stage != "parse" and size > max_render_chars:
+                    continue
+                case_id = f"{stage}/{kind}/{size_name}"
+                result = run_case_isolated(stage, kind, size, [width, height], fps)
+                results[case_id] = result
+                click.echo(_format_row(case_id, result))
+
+    if json_output:
+        Path(json_output).write_text(json.dumps(results, indent=2) + "\n")
+
+    baseline_file = Path(baseline_path)
+    if update_baseline:
+        baseline = json.loads(baseline_file.read_text()) if baseline_file.exists() else {}
+        baseline.update(results)
+        baseline_file.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        click.echo(f"Baseline written to {baseline_file}")
+        return
+
+    if not baseline_file.exists():
+        click.echo(f"No baseline at {baseline_file}; run with --update-baseline to create one")
+        return
+
+    regressions = compare_to_baseline(
+        results,
+        json.loads(baseline_file.read_text()),
+        time_tolerance,
+        memory_tolerance,
+    )
+    if regressions:
+        click.echo("\nPERFORMANCE REGRESSIONS:", err=True)
+        for line in regressions:
+            click.echo(f"  {line}", err=True)
+        raise SystemExit(1)
+    click.echo("\nNo regressions against baseline.")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Iterable, Iterator, Optional, Union
+
+from src.audio_builder import build_audio_track
+from src.config import resolve_config
+from src.effects import bytes_per_pixel
+from src.frame_generator import frames_for_budget, iter_timeline_frames, prefetch_frames
+from src.parser import SentenceParser
+from src.timeline import TimelineIndex
+from src.utils import check_ffmpeg
+from src.video_builder import assemble_video_stream, iter_encoded_stream
+
+logger = logging.getLogger(__name__)
+
+# Text to render: the whole script, or an iterable of lines (e.g. an open file)
+TextSource = Union[str, Iterable[str]]
+
+
+class RenderError(Exception):
+    """A render could not be started or did not finish."""
+
+
+def prepare_job(text: TextSource, config: Optional[dict] = None) -> dict:
+    """Parse text and resolve config (deep-merged over the defaults).
+
+    Returns a dict with config, sentences, font_path, frame_config and
+    pause_chars, as used by the CLI and the functions below.
+    """
+    config = resolve_config(config)
+
+    parser = SentenceParser.from_config(config.get("parsing"))
+    if isinstance(text, str):
+        sentences = parser.split(text)
+    else:
+        sentences = list(parser.iter_sentences(text))
+    if not sentences:
+        raise RenderError("Input text is empty")
+
+    logger.info(f"Found {len(sentences)} sentences")
+    return job_for_sentences(sentences, config)
+
+
+def job_for_sentences(sentences: list[str], config: dict) -> dict:
+    """prepare_job for a script that is already split, with a resolved config."""
+    font_path = config["style"].get("font_path")
+    if font_path and not Path(font_path).exists():
+        logger.warning(f"Font file not found: {font_path}, using default")
+        font_path = None
+
+    return {
+        "config": config,
+        "sentences": sentences,
+        "font_path": font_path,
+        "frame_config": {
+            **config["style"],
+            "resolution": config["video"]["resolution"],
+        },
+        "pause_chars": list(SentenceParser.from_config(config.get("parsing")).sentence_pauses),
+    }
+
+
+def timeline_frames(
+    sentences: list[str],
+    config: dict,
+    frame_config: dict,
+    font_path: Optional[str],
+    pause_chars: list[str],
+    elapsed_ms: float = 0.0,
+    pause_after_last: bool = False,
+    previous_sentences: Iterable[str] = (),
+) -> Iterator:
+    """Frames of sentences, prefetched within video.memory_budget_mb."""
+    frames = iter_timeline_frames(
+        sentences,
+        frame_config,
+        font_path,
+        fps=config["video"]["fps"],
+        character_duration_ms=config["audio"]["character_duration_ms"],
+        pause_chars=pause_chars,
+        character_pause_ms=config["audio"].get("character_pause_ms", 200),
+        sentence_pause_ms=config["audio"]["sentence_pause_ms"],
+        elapsed_ms=elapsed_ms,
+        pause_after_last=pause_after_last,
+        previous_sentences=previous_sentences,
+    )
+    max_buffered = frames_for_budget(
+        config["video"]["resolution"],
+        config["video"].get("memory_budget_mb", 256),
+        bytes_per_pixel(frame_config),
+    )
+    logger.debug(f"Buffering up to {max_buffered} frames")
+    return prefetch_frames(frames, max_buffered)
+
+
+def timeline_index(
+    sentences: list[str],
+    config: dict,
+    frame_config: dict,
+    font_path: Optional[str],
+    pause_chars: list[str],
+) -> TimelineIndex:
+    """TimelineIndex of the frames timeline_frames would produce."""
+    return TimelineIndex(
+        sentences,
+        frame_config,
+        font_path,
+        fps=config["video"]["fps"],
+        character_duration_ms=config["audio"]["character_duration_ms"],
+        pause_chars=pause_chars,
+        character_pause_ms=config["audio"].get("character_pause_ms", 200),
+        sentence_pause_ms=config["audio"]["sentence_pause_ms"],
+    )
+
+
+def render_segment(job: dict, segment: dict, audio_path: str, targets: list[dict]) -> int:
+    """Render one plan_segments segment of a prepared job.
+
+    Writes the segment's audio track (WAV) to audio_path and its video-only
+    encode to every target's path; returns the number of frames written.
+    Segments render independently: the exact start offset comes from the
+    plan, every segment but the last ends with its sentence pause, and the
+    history layer starts from the sentences before the segment.
+    """
+    config = job["config"]
+    sentences = job["sentences"][segment["first_sentence"]:segment["last_sentence"]]
+    pause_after_last = segment["last_sentence"] < len(job["sentences"])
+
+    build_audio_track(
+        sentences,
+        config["audio"]["typing_sound"],
+        audio_path,
+        config["audio"],
+        pause_chars=job["pause_chars"],
+        pause_after_last=pause_after_last,
+    )
+
+    frame_count = 0
+
+    def counted(frames):
+        nonlocal frame_count
+        for frame in frames:
+            frame_count += 1
+            yield frame
+
+    frames = timeline_frames(
+        sentences,
+        config,
+        job["frame_config"],
+        job["font_path"],
+        job["pause_chars"],
+        elapsed_ms=segment["start_ms"],
+        pause_after_last=pause_after_last,
+        previous_sentences=job["sentences"][:segment["first_sentence"]],
+    )
+    assemble_video_stream(counted(frames), None, "", config["video"], targets=targets)
+    return frame_count
+
+
+def iter_render(
+    text: TextSource,
+    config: Optional[dict] = None,
+    chunk_size: int = 64 * 1024,
+) -> Iterator[bytes]:
+    """Render text to a fragmented MP4, yielded in chunks as it is encoded.
+
+    Input and config problems raise RenderError immediately; encoding
+    failures raise it from the iterator. The audio track is built in a
+    private temporary directory; the video never touches the disk.
+    """
+    if not check_ffmpeg():
+        raise RenderError("ffmpeg not found")
+    job = prepare_job(text, config)
+    sound_path = job["config"]["audio"]["typing_sound"]
+    if not Path(sound_path).exists():
+        raise RenderError(f"Sound file not found: {sound_path}")
+    return _encode_job(job, sound_path, chunk_size)
+
+
+def _encode_job(job: dict, sound_path: str, chunk_size: int) -> Iterator[bytes]:
+    config = job["config"]
+    with tempfile.TemporaryDirectory(prefix="sans-sub-") as temp_dir:
+        audio_output = str(Path(temp_dir) / "audio.wav")
+        try:
+            build_audio_track(
+                job["sentences"],
+                sound_path,
+                audio_output,
+                config["audio"],
+                pause_chars=job["pause_chars"],
+            )
+            frames = timeline_frames(
+                job["sentences"],
+                config,
+                job["frame_config"],
+                job["font_path"],
+                job["pause_chars"],
+            )
+            yield from iter_encoded_stream(frames, audio_output, config["video"], chunk_size)
+        except (subprocess.CalledProcessError, RuntimeError) as e:
+            raise RenderError(str(e)) from e
+
+
+def render(text: TextSource, config: Optional[dict] = None) -> bytes:
+    """Render text and return the whole MP4."""
+    return b"".join(iter_render(text, config))
+
+
+def render_to(output: BinaryIO, text: TextSource, config: Optional[dict] = None) -> int:
+    """Render text into a writable binary file object; returns bytes written."""
+    written = 0
+    for chunk in iter_render(text, config):
+        output.write(chunk)
+        written += len(chunk)
+    return written
+
+
+async def aiter_render(
+    text: TextSource,
+    config: Optional[dict] = None,
+    chunk_size: int = 64 * 1024,
+) -> AsyncIterator[bytes]:
+    """Async version of iter_render; encoding runs in the default executor."""
+    loop = asyncio.get_running_loop()
+    chunks = await loop.run_in_executor(None, iter_render, text, config, chunk_size)
+    try:
+        while True:
+            chunk = await loop.run_in_executor(None, next, chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        await loop.run_in_executor(None, chunks.close)
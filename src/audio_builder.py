@@ -1,8 +1,13 @@
 import random
 import subprocess
+import tempfile
 from pathlib import Path
+from typing import Iterator
 
-from src.parser import is_pause_marker, is_punctuation
+from src.av_backend import select_backend, write_audio_track
+from src.parser import CHAR_PAUSE, CHAR_TEXT, char_kind, get_char_table
+from src.sound_bank import SoundBank, load_sound_bank
+from src.timing import sentence_duration_ms  # noqa: F401 (moved to src.timing)
 
 
 def get_character_count(sentences: list[str]) -> list[int]:
@@ -63,26 +68,27 @@ def get_audio_sample_rate(sound_path: str) -> int:
     return get_audio_properties(sound_path)["sample_rate"]
 
 
-def build_audio_track(
+def schedule_clips(
     sentences: list[str],
-    sound_path: str,
-    output_path: str,
+    bank: SoundBank,
     config: dict,
     pause_chars: list[str] | None = None,
-) -> str:
+    pause_after_last: bool = False,
+) -> Iterator[dict]:
+    """Yield the clips of a typing track in order.
+
+    A clip is {"type": "char" or "silence", "duration" (ms), "sentence",
+    "char_idx", "pitch"} plus "sample" for char clips. Pitch is drawn once
+    per sentence.
+    """
     if pause_chars is None:
         pause_chars = ["，", "、", ","]
 
     char_duration_ms = config.get("character_duration_ms", 50)
     sentence_pause_ms = config.get("sentence_pause_ms", 500)
     character_pause_ms = config.get("character_pause_ms", 200)
-    audio_props = get_audio_properties(sound_path)
-    sample_rate = audio_props["sample_rate"]
-    channels = audio_props["channels"]
-    channel_layout = "stereo" if channels >= 2 else "mono"
-
-    audio_clips = []
-    temp_files = []
+    char_table = get_char_table(pause_chars)
+    pause_has_sound = bank.has_class("punctuation")
 
     for i, sentence in enumerate(sentences):
         pitch = calculate_pitch_shift(config)
@@ -90,10 +96,21 @@ def build_audio_track(
 
         # Group durations to allow sounds to naturally decay into pauses
         for char_idx, char in enumerate(sentence):
-            if is_punctuation(char):
-                if is_pause_marker(char, pause_chars):
+            kind = char_kind(char, char_table)
+            if kind != CHAR_TEXT:
+                if kind == CHAR_PAUSE:
+                    if pause_has_sound:
+                        # A punctuation sample plays for the pause's duration
+                        clips_to_generate.append(
+                            {
+                                "type": "char",
+                                "duration": character_pause_ms,
+                                "char_idx": char_idx,
+                                "sample": bank.next_sample(char),
+                            }
+                        )
                     # If there's an active character before this pause, let it ring out by absorbing the pause
-                    if clips_to_generate and clips_to_generate[-1]["type"] == "char":
+                    elif clips_to_generate and clips_to_generate[-1]["type"] == "char":
                         clips_to_generate[-1]["duration"] += character_pause_ms
                     else:
                         clips_to_generate.append(
@@ -106,11 +123,16 @@ def build_audio_track(
                 continue
 
             clips_to_generate.append(
-                {"type": "char", "duration": char_duration_ms, "char_idx": char_idx}
+                {
+                    "type": "char",
+                    "duration": char_duration_ms,
+                    "char_idx": char_idx,
+                    "sample": bank.next_sample(char),
+                }
             )
 
         # Add the sentence pause (line break / sentence end padding)
-        if i < len(sentences) - 1:
+        if i < len(sentences) - 1 or pause_after_last:
             if clips_to_generate and clips_to_generate[-1]["type"] == "char":
                 clips_to_generate[-1]["duration"] += sentence_pause_ms
             else:
@@ -122,14 +144,53 @@ def build_audio_track(
                     }
                 )
 
+        for clip in clips_to_generate:
+            yield {**clip, "sentence": i, "pitch": pitch}
+
+
+def build_audio_track(
+    sentences: list[str],
+    sound_path: str,
+    output_path: str,
+    config: dict,
+    pause_chars: list[str] | None = None,
+    pause_after_last: bool = False,
+) -> str:
+    """Render the typing track for sentences to output_path.
+
+    A sentence pause follows every sentence but the last; pause_after_last
+    adds it to the last one too, for tracks that are one segment of a
+    longer timeline. Clips are rendered in-process with PyAV when
+    config["backend"] selects it (the default when PyAV is installed),
+    otherwise by one ffmpeg call each.
+    """
+    audio_props = get_audio_properties(sound_path)
+    sample_rate = audio_props["sample_rate"]
+    channels = audio_props["channels"]
+    channel_layout = "stereo" if channels >= 2 else "mono"
+
+    # Every sample is decoded once into a shared memory-mapped store; clips
+    # read their PCM from it instead of decoding the sound file again.
+    bank = load_sound_bank(sound_path, config, sample_rate, channels)
+    clips = schedule_clips(sentences, bank, config, pause_chars, pause_after_last)
+    if select_backend(config.get("backend")) == "av":
+        return write_audio_track(clips, bank, output_path, sample_rate, channels)
+
+    # Clips live in a private temporary directory (never the CWD) that is
+    # removed even if an ffmpeg call fails.
+    with tempfile.TemporaryDirectory(prefix="sans-sub-audio-") as temp_dir:
+        temp_path = Path(temp_dir)
+        audio_clips = []
+
         # Generate the scheduled clips
-        for clip_info in clips_to_generate:
+        for clip_info in clips:
             duration_ms = clip_info["duration"]
+            i = clip_info["sentence"]
             idx = clip_info["char_idx"]
+            pitch = clip_info["pitch"]
 
             if clip_info["type"] == "char":
-                temp_clip = f"temp_char_{i}_{idx}.wav"
-                temp_files.append(temp_clip)
+                temp_clip = str(temp_path / f"char_{i}_{idx}.wav")
 
                 duration_s = duration_ms / 1000
                 fade_ms = 10
@@ -139,8 +200,11 @@ def build_audio_track(
                 cmd = [
                     "ffmpeg",
                     "-y",
-                    "-i",
-                    sound_path,
+                    # Raw PCM from the sample store, piped from the mapping
+                    "-f", "s16le",
+                    "-ar", str(sample_rate),
+                    "-ac", str(channels),
+                    "-i", "-",
                     "-af",
                     (
                         f"asetrate={sample_rate}*{pitch},"
@@ -153,11 +217,15 @@ def build_audio_track(
                     f"{duration_s}",
                     temp_clip,
                 ]
-                subprocess.run(cmd, check=True, capture_output=True)
+                subprocess.run(
+                    cmd,
+                    input=bank.pcm(clip_info["sample"]),
+                    check=True,
+                    capture_output=True,
+                )
                 audio_clips.append(temp_clip)
             else:
-                silence_path = f"temp_silence_{i}_{idx}.wav"
-                temp_files.append(silence_path)
+                silence_path = str(temp_path / f"silence_{i}_{idx}.wav")
 
                 silence_cmd = [
                     "ffmpeg",
@@ -173,27 +241,24 @@ def build_audio_track(
                 subprocess.run(silence_cmd, check=True, capture_output=True)
                 audio_clips.append(silence_path)
 
-    concat_file = "temp_concat.txt"
-    with open(concat_file, "w") as f:
-        for clip in audio_clips:
-            f.write(f"file '{clip}'\n")
-
-    concat_cmd = [
-        "ffmpeg",
-        "-y",
-        "-f",
-        "concat",
-        "-safe",
-        "0",
-        "-i",
-        concat_file,
-        "-c",
-        "copy",
-        output_path,
-    ]
-    subprocess.run(concat_cmd, check=True, capture_output=True)
+        concat_file = temp_path / "concat.txt"
+        with open(concat_file, "w", encoding="utf-8") as f:
+            for clip in audio_clips:
+                f.write(f"file '{clip}'\n")
 
-    for temp_file in temp_files + [concat_file]:
-        Path(temp_file).unlink(missing_ok=True)
+        concat_cmd = [
+            "ffmpeg",
+            "-y",
+            "-f",
+            "concat",
+            "-safe",
+            "0",
+            "-i",
+            str(concat_file),
+            "-c",
+            "copy",
+            output_path,
+        ]
+        subprocess.run(concat_cmd, check=True, capture_output=True)
 
     return output_path
@@ -0,0 +1,320 @@
+import logging
+import wave
+from fractions import Fraction
+from functools import lru_cache
+from typing import Iterable, Iterator, Optional
+
+from PIL import Image
+
+from src.video_builder import (
+    AUDIO_BITRATE,
+    AUDIO_CODEC,
+    FRAGMENTED_MOVFLAGS,
+    VIDEO_CODEC,
+    VIDEO_CODEC_OPTIONS,
+    EncoderError,
+)
+
+try:
+    import av
+    import av.logging
+    import numpy as np
+except ImportError:  # optional: pip install sans-subtitle-generator[av]
+    av = None
+
+logger = logging.getLogger(__name__)
+
+# video.backend / audio.backend: "auto" uses PyAV when it is installed
+BACKENDS = ("auto", "av", "cli")
+
+
+@lru_cache(maxsize=1)
+def _warn_missing_av() -> None:
+    logger.warning(
+        "The av backend needs PyAV (pip install sans-subtitle-generator[av]), "
+        "using the ffmpeg CLI"
+    )
+
+
+@lru_cache(maxsize=2)
+def _log_auto_backend(backend: str) -> None:
+    if backend == "av":
+        logger.info("Encoding in-process with PyAV (backend: auto; set backend: cli for ffmpeg)")
+    else:
+        logger.info("Encoding with the ffmpeg CLI (backend: auto; PyAV is not installed)")
+
+
+def select_backend(requested: Optional[str]) -> str:
+    """Backend to encode with: "av" (in-process PyAV) or "cli" (ffmpeg pipe).
+
+    What "auto" picks is logged (once), since it depends on what is installed.
+    """
+    requested = requested or "auto"
+    if requested not in BACKENDS:
+        raise ValueError(f"Unknown backend: {requested} (expected {', '.join(BACKENDS)})")
+    if requested == "cli":
+        return "cli"
+    if av is None:
+        if requested == "av":
+            _warn_missing_av()
+        else:
+            _log_auto_backend("cli")
+        return "cli"
+    if requested == "auto":
+        _log_auto_backend("av")
+    return "av"
+
+
+def _capture_errors() -> None:
+    """Let libav report errors (PyAV silences it by default), so that
+    FFmpegError.log carries the encoder's own message."""
+    if av.logging.get_level() is None:
+        av.logging.set_level(av.logging.ERROR)
+
+
+def _encoder_error(e: "av.FFmpegError", stage: str, path: Optional[str]) -> EncoderError:
+    log = e.log[2].strip() if e.log else None
+    message = f"{stage} failed for {path}: {e.strerror}" + (f" ({log})" if log else "")
+    return EncoderError(message, path=path, stage=stage, errno=e.errno, log=log)
+
+
+def _layout(channels: int) -> str:
+    return "stereo" if channels >= 2 else "mono"
+
+
+def _clip_filters(sample_rate: int, channels: int, pitch: float, duration_ms: float):
+    """Filter chain of a typing clip, the same as audio_builder's ffmpeg -af."""
+    duration_s = duration_ms / 1000
+    fade_s = 0.01
+    fade_start_s = max(0, duration_s - fade_s)
+    return [
+        ("asetrate", f"{sample_rate}*{pitch}"),
+        ("atempo", f"1/{pitch}"),
+        ("aresample", str(sample_rate)),
+        ("apad", f"whole_dur={duration_ms}ms"),
+        ("afade", f"t=out:st={fade_start_s}:d={fade_s}"),
+        ("aformat", f"sample_fmts=s16:channel_layouts={_layout(channels)}"),
+    ]
+
+
+def _render_clip(pcm, sample_rate: int, channels: int, pitch: float, duration_ms: float):
+    """Interleaved s16 samples of one clip, filtered through a libav graph."""
+    graph = av.filter.Graph()
+    nodes = [
+        graph.add_abuffer(
+            sample_rate=sample_rate,
+            format="s16",
+            layout=_layout(channels),
+            time_base=Fraction(1, sample_rate),
+        )
+    ]
+    for name, args in _clip_filters(sample_rate, channels, pitch, duration_ms):
+        nodes.append(graph.add(name, args))
+    nodes.append(graph.add("abuffersink"))
+    graph.link_nodes(*nodes).configure()
+
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    frame = av.AudioFrame.from_ndarray(
+        samples.reshape(1, -1), format="s16", layout=_layout(channels)
+    )
+    frame.sample_rate = sample_rate
+    frame.pts = 0
+    frame.time_base = Fraction(1, sample_rate)
+    graph.push(frame)
+    graph.push(None)
+
+    chunks = []
+    while True:
+        try:
+            chunks.append(graph.pull().to_ndarray().reshape(-1))
+        except (av.error.EOFError, av.error.BlockingIOError):
+            break
+    return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int16)
+
+
+def write_audio_track(
+    clips: Iterable[dict],
+    bank,
+    output_path: str,
+    sample_rate: int,
+    channels: int,
+) -> str:
+    """Render scheduled clips (see audio_builder) into one WAV, in-process.
+
+    Each clip's PCM is taken from the sound bank's store, filtered by a
+    libav graph and appended to the output as it is produced: no ffmpeg
+    processes, temporary clip files or concat pass.
+    """
+    _capture_errors()
+    with wave.open(output_path, "wb") as output:
+        output.setnchannels(channels)
+        output.setsampwidth(2)
+        output.setframerate(sample_rate)
+        for clip in clips:
+            # ffmpeg -t: clips are cut (or padded) to exactly their duration
+            length = round(clip["duration"] * sample_rate / 1000) * channels
+            if clip["type"] == "char":
+                try:
+                    samples = _render_clip(
+                        bank.pcm(clip["sample"]),
+                        sample_rate,
+                        channels,
+                        clip["pitch"],
+                        clip["duration"],
+                    )[:length]
+                except av.FFmpegError as e:
+                    raise _encoder_error(e, "audio filter", clip["sample"]) from e
+                if len(samples) < length:
+                    samples = np.concatenate(
+                        [samples, np.zeros(length - len(samples), dtype=np.int16)]
+                    )
+            else:
+                samples = np.zeros(length, dtype=np.int16)
+            output.writeframes(samples.astype("<i2", copy=False).tobytes())
+    return output_path
+
+
+class _Output:
+    """One target's container with its video (and audio) stream."""
+
+    def __init__(self, target: dict, config: dict, audio_stream):
+        self.path = target["path"]
+        self.crop = target.get("crop")
+        self.width, self.height = target["resolution"]
+        options = {"movflags": FRAGMENTED_MOVFLAGS} if config.get("fragmented") else {}
+        fps = config.get("fps", 30)
+        try:
+            self.container = av.open(
+                self.path, "w", format=config.get("format"), options=options
+            )
+            self.video = self.container.add_stream(
+                VIDEO_CODEC, rate=fps, options=dict(VIDEO_CODEC_OPTIONS)
+            )
+            self.video.width = self.width
+            self.video.height = self.height
+            self.video.pix_fmt = "yuv420p"
+            self.video.time_base = Fraction(1, fps)
+            self.video.codec_context.time_base = Fraction(1, fps)
+            self.video.codec_context.open()
+            self.audio = None
+            if audio_stream is not None:
+                self.audio = self.container.add_stream(AUDIO_CODEC, rate=audio_stream.sample_rate)
+                # WAV headers rarely carry a layout; decoded frames are
+                # resampled to this one by the encoder
+                self.audio.layout = _layout(audio_stream.channels)
+                self.audio.bit_rate = int(AUDIO_BITRATE.rstrip("k")) * 1000
+                self.audio.codec_context.open()
+        except av.FFmpegError as e:
+            self.close()
+            raise _encoder_error(e, "open", self.path) from e
+
+    def prepare(self, rgb) -> "av.VideoFrame":
+        """The encoder-ready frame of an rgb24 array: cropped, scaled, yuv420p."""
+        if self.crop:
+            w, h, x, y = self.crop
+            rgb = np.ascontiguousarray(rgb[y:y + h, x:x + w])
+        frame = av.VideoFrame.from_ndarray(rgb, format="rgb24")
+        return frame.reformat(width=self.width, height=self.height, format="yuv420p")
+
+    def _mux(self, stage: str, stream, frame) -> None:
+        try:
+            self.container.mux(stream.encode(frame))
+        except av.FFmpegError as e:
+            raise _encoder_error(e, stage, self.path) from e
+
+    def encode_video(self, frame, pts: int) -> None:
+        frame.pts = pts
+        self._mux("video encode", self.video, frame)
+
+    def encode_audio(self, frame) -> None:
+        self._mux("audio encode", self.audio, frame)
+
+    def finish(self) -> None:
+        self._mux("video flush", self.video, None)
+        if self.audio is not None:
+            self._mux("audio flush", self.audio, None)
+
+    def close(self) -> None:
+        container = getattr(self, "container", None)
+        if container is not None:
+            container.close()
+
+
+def _frame_runs(frames: Iterable[Image.Image]) -> Iterator[tuple[Image.Image, int]]:
+    """(frame, count) for each run of the same frame object, like write_frames."""
+    current: Optional[Image.Image] = None
+    run = 0
+    for frame in frames:
+        if frame is current:
+            run += 1
+            continue
+        if current is not None:
+            yield current, run
+        current, run = frame, 1
+    if current is not None:
+        yield current, run
+
+
+def _next_audio(frames: Iterator, audio_path: Optional[str]):
+    try:
+        return next(frames, None)
+    except av.FFmpegError as e:
+        raise _encoder_error(e, "audio decode", audio_path) from e
+
+
+def encode_with_av(
+    frames_iterator: Iterator[Image.Image],
+    audio_path: Optional[str],
+    targets: list[dict],
+    config: dict,
+) -> None:
+    """Encode frames (and audio_path) into every target in-process with PyAV.
+
+    Each run of identical frames is converted to yuv420p once per target
+    and sent to the encoder with explicit pts (frame index, 1/fps time
+    base). Audio is decoded from audio_path and interleaved up to the
+    video's end (like -shortest). libav failures raise EncoderError.
+    """
+    _capture_errors()
+    fps = config.get("fps", 30)
+    audio_input = None
+    outputs: list[_Output] = []
+    try:
+        audio_frames: Iterator = iter(())
+        audio_stream = None
+        if audio_path:
+            try:
+                audio_input = av.open(audio_path)
+            except av.FFmpegError as e:
+                raise _encoder_error(e, "audio open", audio_path) from e
+            audio_stream = audio_input.streams.audio[0]
+            audio_frames = audio_input.decode(audio_stream)
+        for target in targets:
+            outputs.append(_Output(target, config, audio_stream))
+
+        pending_audio = _next_audio(audio_frames, audio_path)
+        frame_index = 0
+        for image, count in _frame_runs(frames_iterator):
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            rgb = np.asarray(image)
+            for output in outputs:
+                frame = output.prepare(rgb)
+                for offset in range(count):
+                    output.encode_video(frame, frame_index + offset)
+            frame_index += count
+
+            # Interleave the audio that starts before the video's current end
+            video_end = Fraction(frame_index, fps)
+            while pending_audio is not None and pending_audio.time < video_end:
+                for output in outputs:
+                    output.encode_audio(pending_audio)
+                pending_audio = _next_audio(audio_frames, audio_path)
+
+        for output in outputs:
+            output.finish()
+    finally:
+        for output in outputs:
+            output.close()
+        if audio_input is not None:
+            audio_input.close()
@@ -0,0 +1,246 @@
+import hashlib
+import json
+import logging
+import os
+import wave
+from pathlib import Path
+from typing import Optional
+
+from src.timing import iter_sentence_block_runs
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def render_fingerprint(sentences: list[str], config: dict) -> str:
+    """Hash of everything that affects the rendered output.
+
+    A checkpoint is only resumed when the fingerprint matches, so editing the
+    script or the config invalidates previously rendered segments.
+    """
+    payload = {
+        "sentences": sentences,
+        "video": config.get("video", {}),
+        "style": config.get("style", {}),
+        "audio": config.get("audio", {}),
+        "parsing": config.get("parsing", {}),
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def plan_segments(
+    sentences: list[str],
+    audio_config: dict,
+    fps: int,
+    pause_chars: list[str],
+    segment_ms: float,
+) -> list[dict]:
+    """Split the timeline at sentence boundaries into ~segment_ms chunks.
+
+    Each segment records its sentence range [first, last), its exact
+    start/end on the global clock and its first/end frame, so it can be
+    rendered independently. Frames are counted with the renderers' timing
+    model, which can run ahead of the clock (a sentence that starts with
+    punctuation shows it for a frame that takes no time).
+    """
+    segments: list[dict] = []
+    first = 0
+    start_ms = 0.0
+    elapsed_ms = 0.0
+    frame_start = 0
+    frame = 0
+    for i, sentence in enumerate(sentences):
+        is_last = i == len(sentences) - 1
+        runs = iter_sentence_block_runs(
+            sentence,
+            fps=fps,
+            character_duration_ms=audio_config.get("character_duration_ms", 50),
+            pause_chars=pause_chars,
+            character_pause_ms=audio_config.get("character_pause_ms", 200),
+            sentence_pause_ms=audio_config.get("sentence_pause_ms", 500),
+            elapsed_ms=elapsed_ms,
+            pause_after=not is_last,
+        )
+        while True:
+            try:
+                count, _ = next(runs)
+            except StopIteration as stop:
+                elapsed_ms = stop.value
+                break
+            frame += count
+
+        if is_last or elapsed_ms - start_ms >= segment_ms:
+            segments.append(
+                {
+                    "index": len(segments),
+                    "first_sentence": first,
+                    "last_sentence": i + 1,
+                    "start_ms": start_ms,
+                    "end_ms": elapsed_ms,
+                    "frame_start": frame_start,
+                    "frame_end": frame,
+                }
+            )
+            first = i + 1
+            start_ms = elapsed_ms
+            frame_start = frame
+
+    return segments
+
+
+def wav_duration_ms(path: str) -> Optional[float]:
+    try:
+        with wave.open(path, "rb") as wav:
+            return wav.getnframes() * 1000 / wav.getframerate()
+    except (OSError, EOFError, wave.Error):
+        return None
+
+
+class RenderCheckpoint:
+    """Manifest of finished segments kept in a work directory.
+
+    The manifest is rewritten atomically after every segment, so a crash at
+    any point leaves either the previous or the new state on disk.
+    """
+
+    def __init__(
+        self,
+        work_dir: str,
+        fingerprint: str,
+        fps: int,
+        target_names: Optional[list[str]] = None,
+    ):
+        self.work_dir = Path(work_dir)
+        self.fingerprint = fingerprint
+        self.fps = fps
+        # One video file per output target and segment (see output_targets)
+        self.target_names = target_names or [""]
+        self.completed: dict[int, dict] = {}
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.work_dir / MANIFEST_NAME
+
+    def video_path(self, index: int, target_name: str = "") -> Path:
+        suffix = f".{target_name}" if target_name else ""
+        return self.work_dir / f"segment_{index:05d}{suffix}.mp4"
+
+    def audio_path(self, index: int) -> Path:
+        return self.work_dir / f"segment_{index:05d}.wav"
+
+    def load(self) -> bool:
+        """Load a matching manifest. Returns False if none can be resumed."""
+        if not self.manifest_path.exists():
+            return False
+        try:
+            manifest = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            logger.warning(f"Unreadable checkpoint manifest: {self.manifest_path}")
+            return False
+
+        if manifest.get("version") != MANIFEST_VERSION:
+            logger.warning("Checkpoint was written by another version; starting over")
+            return False
+        if manifest.get("fingerprint") != self.fingerprint:
+            logger.warning("Script or config changed since the checkpoint; starting over")
+            return False
+
+        self.completed = {seg["index"]: seg for seg in manifest.get("segments", [])}
+        return True
+
+    def save(self) -> None:
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "fingerprint": self.fingerprint,
+            "segments": [self.completed[i] for i in sorted(self.completed)],
+        }
+        temp_path = self.manifest_path.with_suffix(".tmp")
+        temp_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        os.replace(temp_path, self.manifest_path)
+
+    def mark_done(self, segment: dict, frame_count: int) -> None:
+        self.completed[segment["index"]] = {
+            **segment,
+            "frame_count": frame_count,
+            "audio_ms": wav_duration_ms(str(self.audio_path(segment["index"]))),
+        }
+        self.save()
+
+    def verify(self, segment: dict) -> bool:
+        """Check a recorded segment against the plan and the files on disk.
+
+        The segment's audio must last as long as its span of the clock, and
+        it must have rendered the frames the plan counts for it.
+        """
+        record = self.completed.get(segment["index"])
+        if record is None:
+            return False
+
+        for key in ("first_sentence", "last_sentence", "start_ms", "end_ms"):
+            if record.get(key) != segment[key]:
+                logger.warning(f"Segment {segment['index']}: plan changed ({key})")
+                return False
+
+        for name in self.target_names:
+            video_path = self.video_path(segment["index"], name)
+            if not video_path.exists() or video_path.stat().st_size == 0:
+                logger.warning(f"Segment {segment['index']}: missing video {video_path}")
+                return False
+
+        audio_ms = wav_duration_ms(str(self.audio_path(segment["index"])))
+        expected_audio_ms = segment["end_ms"] - segment["start_ms"]
+        if audio_ms is None or audio_ms != record.get("audio_ms"):
+            logger.warning(f"Segment {segment['index']}: audio missing or modified")
+            return False
+        frame_ms = 1000 / self.fps
+        # Every clip is rounded to whole samples, so allow up to a frame
+        if abs(audio_ms - expected_audio_ms) > frame_ms:
+            logger.warning(
+                f"Segment {segment['index']}: audio is {audio_ms:.1f}ms, "
+                f"expected {expected_audio_ms:.1f}ms"
+            )
+            return False
+
+        expected_frames = segment["frame_end"] - segment["frame_start"]
+        if record.get("frame_count") != expected_frames:
+            logger.warning(
+                f"Segment {segment['index']}: rendered {record.get('frame_count')} frames, "
+                f"expected {expected_frames}"
+            )
+            return False
+
+        return True
+
+    def resumable_prefix(self, segments: list[dict]) -> int:
+        """Number of leading segments that verify and can be reused."""
+        for segment in segments:
+            if not self.verify(segment):
+                return segment["index"]
+        return len(segments)
+
+    def clear(self) -> None:
+        """Remove everything the checkpoint wrote (other files are left alone)."""
+        if not self.work_dir.exists():
+            return
+        self.manifest_path.unlink(missing_ok=True)
+        self.manifest_path.with_suffix(".tmp").unlink(missing_ok=True)
+        # Segment outputs and concat_segments' lists
+        for pattern in ("segment_*", "*.video.txt", "*.audio.txt"):
+            for path in self.work_dir.glob(pattern):
+                path.unlink(missing_ok=True)
+
+    def remove(self) -> None:
+        """clear, then remove the work directory if nothing else is in it."""
+        self.clear()
+        try:
+            self.work_dir.rmdir()
+        except OSError:
+            pass
+
+    def discard_from(self, index: int) -> None:
+        for stale in [i for i in self.completed if i >= index]:
+            del self.completed[stale]
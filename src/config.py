@@ -1,3 +1,6 @@
+import copy
+from typing import Optional
+
 import yaml
 from pathlib import Path
 
@@ -5,7 +8,24 @@ DEFAULT_CONFIG = {
     "video": {
         "resolution": [1920, 1080],
         "fps": 30,
-        "format": "mp4",
+        "memory_budget_mb": 256,
+        "segment_seconds": 60,
+        "pipe_buffer_kb": 1024,
+        "backend": "auto",
+        "live": {
+            "format": "hls",
+            "segment_seconds": 6,
+        },
+        "image_sequence": {
+            "format": "png",
+            "mode": "hardlink",
+            "workers": None,
+        },
+        "queue": {
+            "lease_seconds": 120,
+            "poll_seconds": 2,
+            "max_attempts": 3,
+        },
     },
     "style": {
         "font_path": "./fonts/default.ttf",
@@ -13,6 +33,19 @@ DEFAULT_CONFIG = {
         "text_color": "#FFFFFF",
         "background_color": "#000000",
         "text_position": [100, 500],
+        "fallback_fonts": [],
+        "font_cache_dir": None,
+        "effects": {
+            "fade_in_ms": 0,
+            "cursor": False,
+            "cursor_blink_ms": 250,
+            "gradient": None,
+        },
+        "history": {
+            "lines": 0,
+            "line_spacing": 1.25,
+            "scroll_ms": 200,
+        },
     },
     "audio": {
         "typing_sound": "./sounds/sans_typing.wav",
@@ -24,6 +57,9 @@ DEFAULT_CONFIG = {
         "character_duration_ms": 50,
         "sentence_pause_ms": 500,
         "character_pause_ms": 200,
+        "sound_bank": {},
+        "sample_cache_dir": None,
+        "backend": "auto",
     },
     "parsing": {
         "sentence_enders": ["。", "！", "？", ".", "!", "?"],
@@ -40,5 +76,25 @@ def load_config(config_path: str) -> dict:
         return yaml.safe_load(f)
 
 
+def merge_config(base: dict, override: dict) -> dict:
+    """Return base updated with override, merging nested dicts key by key.
+
+    Neither argument is modified; the result shares no mutable values with
+    them.
+    """
+    merged = copy.deepcopy(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_config(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
 def get_default_config() -> dict:
-    return DEFAULT_CONFIG.copy()
+    return copy.deepcopy(DEFAULT_CONFIG)
+
+
+def resolve_config(config: Optional[dict] = None) -> dict:
+    """DEFAULT_CONFIG with config (possibly partial) merged on top."""
+    return merge_config(DEFAULT_CONFIG, config or {})
@@ -0,0 +1,509 @@
+import copy
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from src.api import RenderError, job_for_sentences, render_segment
+from src.checkpoint import RenderCheckpoint, plan_segments, render_fingerprint, wav_duration_ms
+from src.video_builder import concat_segments, output_targets
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "job.json"
+QUEUE_VERSION = 1
+# Until a job is published, workers poll with this interval (seconds)
+DEFAULT_POLL_SECONDS = 2
+
+
+def segment_name(index: int) -> str:
+    return f"segment_{index:05d}"
+
+
+def _write_json(path: Path, data: dict) -> None:
+    """Write data to path atomically (readers see the old or the new file)."""
+    temp_path = path.with_name(f"{path.name}.{socket.gethostname()}-{os.getpid()}.tmp")
+    temp_path.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
+    os.replace(temp_path, path)
+
+
+def _read_json(path: Path) -> Optional[dict]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def _absolute(path: Optional[str]) -> Optional[str]:
+    return str(Path(path).resolve()) if path else path
+
+
+def shared_config(config: dict) -> dict:
+    """config with its file paths made absolute, for workers in other directories."""
+    config = copy.deepcopy(config)
+    style = config["style"]
+    audio = config["audio"]
+    style["font_path"] = _absolute(style.get("font_path"))
+    style["fallback_fonts"] = [_absolute(path) for path in style.get("fallback_fonts") or []]
+    style["font_cache_dir"] = _absolute(style.get("font_cache_dir"))
+    audio["typing_sound"] = _absolute(audio.get("typing_sound"))
+    audio["sample_cache_dir"] = _absolute(audio.get("sample_cache_dir"))
+    audio["sound_bank"] = {
+        name: [_absolute(path) for path in ([samples] if isinstance(samples, str) else samples)]
+        for name, samples in (audio.get("sound_bank") or {}).items()
+        if samples
+    }
+    return config
+
+
+class Lease:
+    """A worker's claim on a segment: the file claims/<segment>.<attempt>.
+
+    The holder keeps the file's mtime fresh while it renders; a lease not
+    renewed for lease_seconds is expired and the segment can be claimed
+    again (as the next attempt).
+    """
+
+    def __init__(self, path: Path, index: int, attempt: int):
+        self.path = path
+        self.index = index
+        self.attempt = attempt
+
+    def renew(self) -> bool:
+        try:
+            os.utime(self.path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def release(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+    def expire(self) -> None:
+        """Give the segment up for another attempt, keeping the attempt number taken."""
+        try:
+            os.utime(self.path, (0, 0))
+        except FileNotFoundError:
+            pass
+
+
+class WorkQueue:
+    """The segments of one render job, in a directory every node can reach.
+
+    Layout:
+      job.json                    script, shared config, targets and segments
+      claims/<segment>.<attempt>  leases (see Lease)
+      done/<segment>.json         completion records (RenderCheckpoint format)
+      failed/<segment>.<id>.json  errors of failed attempts (and of segments
+                                  that did not verify)
+      segment_*.wav, *.mp4        segment outputs (RenderCheckpoint names)
+
+    Claims are created with O_EXCL and everything else is written to a
+    temporary name and renamed, so no server is needed: only a filesystem
+    with atomic exclusive create and rename (local disks, NFSv3+, SMB), and
+    node clocks close enough for the lease timeout.
+    """
+
+    def __init__(self, directory: str, lease_seconds: float = 120):
+        self.directory = Path(directory)
+        self.lease_seconds = lease_seconds
+
+    @property
+    def job_path(self) -> Path:
+        return self.directory / JOB_NAME
+
+    @property
+    def claims_dir(self) -> Path:
+        return self.directory / "claims"
+
+    @property
+    def done_dir(self) -> Path:
+        return self.directory / "done"
+
+    @property
+    def failed_dir(self) -> Path:
+        return self.directory / "failed"
+
+    def done_path(self, index: int) -> Path:
+        return self.done_dir / f"{segment_name(index)}.json"
+
+    def load_job(self) -> Optional[dict]:
+        return _read_json(self.job_path)
+
+    def publish(self, job: dict) -> bool:
+        """Publish job; returns True if finished segments of it were kept.
+
+        Republishing the same job (matching fingerprint) keeps its done
+        records so an interrupted run resumes; any other job replaces the
+        queue's contents. Failure records are always cleared.
+        """
+        current = self.load_job()
+        resumed = bool(current) and current.get("fingerprint") == job["fingerprint"]
+        if not resumed:
+            self.clear()
+        shutil.rmtree(self.failed_dir, ignore_errors=True)
+        for directory in (self.claims_dir, self.done_dir, self.failed_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+        _write_json(self.job_path, job)
+        return resumed and bool(self.done_records())
+
+    def clear(self) -> None:
+        """Remove everything the queue wrote (other files are left alone)."""
+        self.job_path.unlink(missing_ok=True)
+        for directory in (self.claims_dir, self.done_dir, self.failed_dir):
+            shutil.rmtree(directory, ignore_errors=True)
+        if self.directory.exists():
+            # Segment outputs and concat_segments' lists
+            for pattern in ("segment_*", "*.video.txt", "*.audio.txt"):
+                for path in self.directory.glob(pattern):
+                    path.unlink(missing_ok=True)
+
+    def remove(self) -> None:
+        self.clear()
+        try:
+            self.directory.rmdir()
+        except OSError:
+            pass
+
+    def _leases(self, index: int) -> list[tuple[int, Path]]:
+        prefix = f"{segment_name(index)}."
+        leases = []
+        for path in self.claims_dir.glob(f"{prefix}*"):
+            attempt = path.name[len(prefix):]
+            if attempt.isdigit():
+                leases.append((int(attempt), path))
+        return sorted(leases)
+
+    def _is_live(self, path: Path) -> bool:
+        try:
+            return time.time() - path.stat().st_mtime < self.lease_seconds
+        except FileNotFoundError:
+            return False
+
+    def claim(self, index: int, worker: str) -> Optional[Lease]:
+        """Claim segment index unless it is done or under a live lease."""
+        if self.done_path(index).exists():
+            return None
+        leases = self._leases(index)
+        if leases and self._is_live(leases[-1][1]):
+            return None
+        attempt = leases[-1][0] + 1 if leases else 0
+        path = self.claims_dir / f"{segment_name(index)}.{attempt}"
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return None  # another worker got there first
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"worker": worker, "host": socket.gethostname(), "pid": os.getpid()}, f)
+        if leases:
+            logger.info(f"Segment {index + 1}: retrying (attempt {attempt + 1})")
+        return Lease(path, index, attempt)
+
+    def claim_next(self, segments: list[dict], worker: str, max_attempts: int) -> Optional[Lease]:
+        """Claim the first segment that is free and has not failed max_attempts times."""
+        failures = self.failure_counts()
+        for segment in segments:
+            index = segment["index"]
+            if failures.get(index, 0) >= max_attempts:
+                continue
+            lease = self.claim(index, worker)
+            if lease is not None:
+                return lease
+        return None
+
+    def holds(self, lease: Lease) -> bool:
+        """Whether lease is still current (not requeued or taken over)."""
+        leases = self._leases(lease.index)
+        return bool(leases) and leases[-1][0] == lease.attempt and lease.path.exists()
+
+    @contextmanager
+    def heartbeat(self, lease: Lease) -> Iterator[None]:
+        """Renew lease in the background while the block runs."""
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(self.lease_seconds / 4):
+                if not lease.renew():
+                    return
+
+        thread = threading.Thread(target=renew, name=f"lease-{lease.index}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def complete(self, lease: Lease, record: dict) -> None:
+        _write_json(self.done_path(lease.index), record)
+        lease.release()
+
+    def fail(self, lease: Lease, worker: str, error: str) -> None:
+        path = self.failed_dir / f"{segment_name(lease.index)}.{worker}.{lease.attempt}.json"
+        _write_json(path, {"index": lease.index, "worker": worker, "error": error})
+        lease.expire()
+
+    def requeue(self, index: int) -> None:
+        self.done_path(index).unlink(missing_ok=True)
+        for _, path in self._leases(index):
+            path.unlink(missing_ok=True)
+
+    def reject(self, index: int, error: str) -> None:
+        """Count a done segment that did not verify as a failed attempt, and requeue it."""
+        record = _read_json(self.done_path(index)) or {}
+        count = len(self.failures().get(index, []))
+        path = self.failed_dir / f"{segment_name(index)}.rejected.{count}.json"
+        _write_json(path, {"index": index, "worker": record.get("worker"), "error": error})
+        self.requeue(index)
+
+    def done_records(self) -> dict[int, dict]:
+        records = {}
+        for path in self.done_dir.glob("segment_*.json"):
+            record = _read_json(path)
+            if record is not None:
+                records[record["index"]] = record
+        return records
+
+    def failures(self) -> dict[int, list[dict]]:
+        failures: dict[int, list[dict]] = {}
+        for path in sorted(self.failed_dir.glob("segment_*.json")):
+            record = _read_json(path)
+            if record is not None:
+                failures.setdefault(record["index"], []).append(record)
+        return failures
+
+    def failure_counts(self) -> dict[int, int]:
+        return {index: len(records) for index, records in self.failures().items()}
+
+    def finished(self, segments: list[dict], max_attempts: int) -> bool:
+        """Whether every segment is done or out of attempts."""
+        done = self.done_records()
+        failures = self.failure_counts()
+        return all(
+            seg["index"] in done or failures.get(seg["index"], 0) >= max_attempts
+            for seg in segments
+        )
+
+
+def _queue_settings(config: dict) -> dict:
+    settings = config["video"].get("queue", {})
+    return {
+        "lease_seconds": settings.get("lease_seconds", 120),
+        "poll_seconds": settings.get("poll_seconds", 2),
+        "max_attempts": settings.get("max_attempts", 3),
+    }
+
+
+def _checkpoint(queue: WorkQueue, record: dict) -> RenderCheckpoint:
+    """The queue directory seen as a checkpoint, for its file names and checks."""
+    return RenderCheckpoint(
+        str(queue.directory),
+        record["fingerprint"],
+        record["config"]["video"]["fps"],
+        target_names=[target["name"] for target in record["targets"]],
+    )
+
+
+def _partial_path(path: Path, token: str) -> Path:
+    return path.with_name(f"{path.stem}.{token}.partial{path.suffix}")
+
+
+def _render_leased(queue: WorkQueue, record: dict, job: dict, lease: Lease, worker: str) -> bool:
+    """Render a claimed segment and commit it; returns False if it failed or was lost."""
+    segment = record["segments"][lease.index]
+    checkpoint = _checkpoint(queue, record)
+    # Each attempt writes its own partial files, so a worker that lost its
+    # lease cannot clobber the outputs of the one that took it over.
+    token = f"{worker}.{lease.attempt}"
+    audio_path = checkpoint.audio_path(lease.index)
+    partial_audio = _partial_path(audio_path, token)
+    targets = [
+        {**target, "path": str(_partial_path(checkpoint.video_path(lease.index, target["name"]), token))}
+        for target in record["targets"]
+    ]
+    partials = [partial_audio, *(Path(target["path"]) for target in targets)]
+
+    logger.info(f"Rendering segment {lease.index + 1}/{len(record['segments'])}")
+    try:
+        with queue.heartbeat(lease):
+            frame_count = render_segment(job, segment, str(partial_audio), targets)
+    except Exception as e:
+        logger.error(f"Segment {lease.index + 1} failed: {e}")
+        queue.fail(lease, worker, f"{type(e).__name__}: {e}")
+        for path in partials:
+            path.unlink(missing_ok=True)
+        return False
+
+    if not queue.holds(lease):
+        logger.warning(f"Segment {lease.index + 1}: lease was taken over, discarding this render")
+        for path in partials:
+            path.unlink(missing_ok=True)
+        return False
+
+    for target in record["targets"]:
+        os.replace(
+            _partial_path(checkpoint.video_path(lease.index, target["name"]), token),
+            checkpoint.video_path(lease.index, target["name"]),
+        )
+    os.replace(partial_audio, audio_path)
+    queue.complete(
+        lease,
+        {
+            **segment,
+            "frame_count": frame_count,
+            "audio_ms": wav_duration_ms(str(audio_path)),
+            "worker": worker,
+        },
+    )
+    return True
+
+
+def run_worker(queue_dir: str, wait: bool = False, worker: Optional[str] = None) -> int:
+    """Render segments from the queue in queue_dir until none are left.
+
+    Returns the number of segments this worker rendered. With wait, keeps
+    polling for new jobs instead of returning once the queue is finished
+    (or has no job).
+    """
+    queue = WorkQueue(queue_dir)
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+    rendered = 0
+    job = None
+    while True:
+        record = queue.load_job()
+        if record is None or record.get("version") != QUEUE_VERSION:
+            if record is not None:
+                logger.error(f"Unsupported queue version in {queue.job_path}")
+            if not wait:
+                return rendered
+            time.sleep(DEFAULT_POLL_SECONDS)
+            continue
+
+        settings = _queue_settings(record["config"])
+        queue.lease_seconds = settings["lease_seconds"]
+        if job is None or job["fingerprint"] != record["fingerprint"]:
+            job = {
+                **job_for_sentences(record["sentences"], record["config"]),
+                "fingerprint": record["fingerprint"],
+            }
+
+        lease = queue.claim_next(record["segments"], worker, settings["max_attempts"])
+        if lease is None:
+            if not wait and queue.finished(record["segments"], settings["max_attempts"]):
+                return rendered
+            time.sleep(settings["poll_seconds"])
+            continue
+        if _render_leased(queue, record, job, lease, worker):
+            rendered += 1
+
+
+def _local_worker(queue_dir: str, log_level: int) -> None:
+    logging.basicConfig(level=log_level)
+    run_worker(queue_dir)
+
+
+def _start_local_workers(queue_dir: str, count: int) -> list:
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(
+            target=_local_worker,
+            args=(queue_dir, logging.getLogger().getEffectiveLevel()),
+            name=f"sans-sub-worker-{i}",
+        )
+        for i in range(count)
+    ]
+    for process in processes:
+        process.start()
+    return processes
+
+
+def render_distributed(
+    job: dict,
+    output: str,
+    queue_dir: str,
+    workers: int = 0,
+) -> list[str]:
+    """Render a prepared job through a work queue in queue_dir and join it.
+
+    The job is split into plan_segments segments and published to the
+    queue; `sans-sub worker QUEUE_DIR` processes on any node sharing the
+    directory render them, and workers > 0 also starts that many on this
+    machine. Once every segment is done and verifies (a segment that does
+    not is requeued, as a failed attempt), the segments are joined into
+    each output target. Returns the output paths; raises RenderError when
+    a segment fails max_attempts times.
+    """
+    config = job["config"]
+    fps = config["video"]["fps"]
+    settings = _queue_settings(config)
+    segment_ms = config["video"].get("segment_seconds", 60) * 1000
+    segments = plan_segments(job["sentences"], config["audio"], fps, job["pause_chars"], segment_ms)
+    targets = output_targets(config["video"], output)
+
+    record = {
+        "version": QUEUE_VERSION,
+        "fingerprint": render_fingerprint(job["sentences"], config),
+        "config": shared_config(config),
+        "sentences": job["sentences"],
+        "targets": [
+            {key: target[key] for key in ("name", "resolution", "crop") if key in target}
+            for target in targets
+        ],
+        "segments": segments,
+    }
+    queue = WorkQueue(queue_dir, settings["lease_seconds"])
+    if queue.publish(record):
+        logger.info(f"Resuming queue with {len(queue.done_records())}/{len(segments)} segments done")
+    logger.info(f"Published {len(segments)} segments to {queue_dir}")
+
+    checkpoint = _checkpoint(queue, record)
+    processes = _start_local_workers(queue_dir, workers) if workers else []
+    reported = None
+    try:
+        while True:
+            done = queue.done_records()
+            for index, failures in queue.failures().items():
+                if index not in done and len(failures) >= settings["max_attempts"]:
+                    raise RenderError(
+                        f"Segment {index + 1} failed {len(failures)} times: {failures[-1]['error']}"
+                    )
+            if len(done) != reported:
+                logger.info(f"Segments done: {len(done)}/{len(segments)}")
+                reported = len(done)
+
+            if len(done) == len(segments):
+                checkpoint.completed = done
+                valid = checkpoint.resumable_prefix(segments)
+                if valid == len(segments):
+                    break
+                logger.warning(f"Segment {valid + 1} did not verify, requeueing it")
+                queue.reject(valid, "rendered segment did not verify")
+                continue
+
+            if processes and not any(process.is_alive() for process in processes):
+                processes = _start_local_workers(queue_dir, workers)
+            time.sleep(settings["poll_seconds"])
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+    logger.info("Joining segments...")
+    for target in targets:
+        concat_segments(
+            [str(checkpoint.video_path(seg["index"], target["name"])) for seg in segments],
+            [str(checkpoint.audio_path(seg["index"])) for seg in segments],
+            target["path"],
+            config["video"],
+            queue_dir,
+        )
+    queue.remove()
+    return [target["path"] for target in targets]
@@ -0,0 +1,279 @@
+import logging
+from functools import lru_cache
+from importlib.util import find_spec
+from typing import Optional
+
+from PIL import Image, ImageColor
+
+from src.fonts import FontChain
+from src.frame_generator import FrameStream, RunStream, _to_palette_frame, render_draws
+from src.history import HistoryLayer
+
+# Optional (pip install sans-subtitle-generator[effects]), and only imported
+# once an effect is rendered, so renders without effects don't load it
+_HAS_NUMPY = find_spec("numpy") is not None
+
+logger = logging.getLogger(__name__)
+
+# A frame's look under effects: (draws, fades, cursor_visible, scroll), where
+# fades lists the (before_draws, after_draws, step) reveals still fading in
+# and scroll is the history layer's offset.
+EffectState = tuple
+
+
+@lru_cache(maxsize=1)
+def _warn_missing_numpy() -> None:
+    logger.warning(
+        "Reveal effects need NumPy (pip install sans-subtitle-generator[effects]), "
+        "rendering without them"
+    )
+
+
+def effects_enabled(config: dict) -> bool:
+    """Whether config["effects"] turns on any reveal effect that can be rendered."""
+    effects = config.get("effects") or {}
+    enabled = bool(effects.get("fade_in_ms") or effects.get("cursor") or effects.get("gradient"))
+    if enabled and not _HAS_NUMPY:
+        _warn_missing_numpy()
+        return False
+    return enabled
+
+
+def bytes_per_pixel(config: dict) -> int:
+    """Size of a frame pixel: gradients need RGB, everything else is a mask."""
+    if effects_enabled(config) and config["effects"].get("gradient"):
+        return 3
+    return 1
+
+
+def _changed_box(a, b) -> Optional[tuple[slice, slice]]:
+    """Bounding box (as array slices) of the pixels where a and b differ."""
+    import numpy as np
+
+    diff = a != b
+    rows = np.flatnonzero(diff.any(axis=1))
+    if not rows.size:
+        return None
+    cols = np.flatnonzero(diff[rows[0]:rows[-1] + 1].any(axis=0))
+    return slice(rows[0], rows[-1] + 1), slice(cols[0], cols[-1] + 1)
+
+
+class RevealLayer:
+    """Reveal effects for one sentence and the pause after it.
+
+    Frames are composed with NumPy from the masks of the runs' images
+    (render_draws, one render per distinct draws, as without effects).
+    Each change of draws is a reveal with its own alpha: while it fades
+    in, the not-yet-visible share of its glyphs is taken out again, inside
+    the box the reveal changed. The cursor is a filled box after the text,
+    and a gradient colours each character's columns. Composing a frame
+    therefore costs a copy plus work on the changed regions, whatever the
+    sentence length; frames with the same state are composed once. A
+    HistoryLayer is merged in before colouring, so the gradient sweeps
+    across the previous lines too.
+    """
+
+    def __init__(
+        self,
+        config: dict,
+        text: str,
+        fonts: Optional[FontChain],
+        fps: int,
+        history: Optional[HistoryLayer] = None,
+    ):
+        effects = config.get("effects") or {}
+        self.config = config
+        self.text = text
+        self.fonts = fonts
+        self.history = history
+        self.fade_frames = max(1, round(effects.get("fade_in_ms", 0) * fps / 1000))
+        self.cursor = bool(effects.get("cursor"))
+        self.blink_frames = max(1, round(effects.get("cursor_blink_ms", 250) * fps / 1000))
+        self.gradient = effects.get("gradient")
+
+        self._masks: dict = {}
+        self._boxes: dict = {}
+        self._cursor_boxes: dict[int, tuple[slice, slice]] = {}
+        self._draws: tuple[int, ...] = ()
+        self._start: Optional[int] = None
+        self._reveals: list[tuple[int, tuple[int, ...], tuple[int, ...]]] = []
+
+        self._columns = None
+        self._background = None
+        self._last_mask = None
+        self._last_rgb = None
+        if self.gradient:
+            import numpy as np
+
+            width, height = config["resolution"]
+            self._columns = self._column_colours(width)
+            self._background = np.array(
+                ImageColor.getrgb(config["background_color"])[:3], dtype=np.uint32
+            )
+            self._last_mask = np.zeros((height, width), dtype=np.uint8)
+            self._last_rgb = np.empty((height, width, 3), dtype=np.uint8)
+            self._last_rgb[:] = self._background
+
+    def _advance(self, length: int) -> float:
+        """x where text[length] starts, as FontChain.draw_text lays it out."""
+        x = self.config["text_position"][0]
+        if self.fonts is not None:
+            for index, run in self.fonts.runs(self.text[:length]):
+                x += self.fonts.fonts[index].getlength(run)
+        return x
+
+    def _column_colours(self, width: int):
+        """Colour of every pixel column: each character's share of the gradient."""
+        import numpy as np
+
+        start, end = (np.array(ImageColor.getrgb(c)[:3], dtype=np.float64) for c in self.gradient)
+        count = max(1, len(self.text))
+        steps = np.arange(count) / max(1, count - 1)
+        colours = np.rint(start + (end - start) * steps[:, None]).astype(np.uint32)
+        starts = np.array([self._advance(i) for i in range(count)])
+        owner = np.searchsorted(starts, np.arange(width) + 0.5, side="right") - 1
+        return colours[np.clip(owner, 0, count - 1)]
+
+    def _mask(self, draws: tuple[int, ...]):
+        mask = self._masks.get(draws)
+        if mask is None:
+            import numpy as np
+
+            mask = np.asarray(render_draws(self.config, self.text, draws, self.fonts))
+            self._masks[draws] = mask
+        return mask
+
+    def _box(self, before: tuple[int, ...], after: tuple[int, ...]):
+        key = (before, after)
+        if key not in self._boxes:
+            self._boxes[key] = _changed_box(self._mask(before), self._mask(after))
+        return self._boxes[key]
+
+    def _cursor_box(self, draws: tuple[int, ...]) -> tuple[slice, slice]:
+        length = max(draws, default=0)
+        box = self._cursor_boxes.get(length)
+        if box is None:
+            width, height = self.config["resolution"]
+            size = self.config["font_size"]
+            x = round(self._advance(length)) + max(1, size // 16)
+            y = self.config["text_position"][1]
+            bottom = y + (self.fonts.primary.getbbox("Ag")[3] if self.fonts else size)
+            box = (
+                slice(max(0, y), min(height, bottom)),
+                slice(max(0, x), min(width, x + max(2, size // 12))),
+            )
+            self._cursor_boxes[length] = box
+        return box
+
+    def reset(self) -> None:
+        self._draws = ()
+        self._start = None
+        self._reveals = []
+
+    def feed(self, first_frame: int, draws: tuple[int, ...]) -> None:
+        """Start a run of draws at first_frame (frames count from any origin)."""
+        if self._start is None:
+            self._start = first_frame
+        if draws == self._draws:
+            return
+        self._reveals.append((first_frame, self._draws, draws))
+        self._draws = draws
+        # Finished reveals and masks nothing can compose any more are dropped
+        self._reveals = [
+            reveal for reveal in self._reveals if first_frame - reveal[0] < self.fade_frames
+        ]
+        needed = {draws}
+        for _, before, after in self._reveals:
+            needed.update((before, after))
+        for key in [key for key in self._masks if key not in needed]:
+            del self._masks[key]
+        for key in [key for key in self._boxes if not set(key) <= needed]:
+            del self._boxes[key]
+
+    def state(self, frame: int, run_offset: int) -> EffectState:
+        """State of a frame of the current run (run_offset frames into it).
+
+        The cursor is shown for the first blink_frames of every run, so it
+        stays on while typing and blinks through pauses.
+        """
+        fades = tuple(
+            (before, after, frame - start + 1)
+            for start, before, after in self._reveals
+            if frame - start + 1 < self.fade_frames
+        )
+        cursor = self.cursor and (run_offset // self.blink_frames) % 2 == 0
+        scroll = self.history.scroll(frame - self._start) if self.history is not None else 0
+        return self._draws, fades, cursor, scroll
+
+    def seek(self, runs: list[tuple[int, int, tuple[int, ...]]], frame: int) -> EffectState:
+        """State of a frame given the (first_frame, count, draws) runs of the layer."""
+        self.reset()
+        run_start = 0
+        for first, _, draws in runs:
+            if first > frame:
+                break
+            self.feed(first, draws)
+            run_start = first
+        return self.state(frame, frame - run_start)
+
+    def compose(self, state: EffectState) -> Image.Image:
+        import numpy as np
+
+        draws, fades, cursor, scroll = state
+        mask = self._mask(draws).copy()
+        for before, after, step in fades:
+            box = self._box(before, after)
+            if box is None:
+                continue
+            change = self._mask(after)[box].astype(np.int32) - self._mask(before)[box]
+            hidden = (change * (self.fade_frames - step) + self.fade_frames // 2) // self.fade_frames
+            mask[box] = np.clip(mask[box] - hidden, 0, 255)
+        if cursor:
+            mask[self._cursor_box(draws)] = 255
+        if self.history is not None:
+            rows = slice(*self.history.live_rows)
+            live = mask[rows]
+            mask = np.array(self.history.frame_mask(scroll))
+            np.maximum(mask[rows], live, out=mask[rows])
+
+        if not self.gradient:
+            return _to_palette_frame(self.config, Image.fromarray(mask, "L"))
+
+        # Only the region that changed since the last frame is recoloured
+        rgb = self._last_rgb.copy()
+        box = _changed_box(self._last_mask, mask)
+        if box is not None:
+            coverage = mask[box].astype(np.uint32)[..., None]
+            value = self._background * (255 - coverage) + self._columns[box[1]] * coverage + 128
+            rgb[box] = ((value >> 8) + value) >> 8
+        self._last_mask = mask
+        self._last_rgb = rgb
+        return Image.fromarray(rgb, "RGB")
+
+
+def iter_effect_frames(
+    runs: RunStream,
+    config: dict,
+    text: str,
+    fonts: Optional[FontChain],
+    fps: int,
+    history: Optional[HistoryLayer] = None,
+) -> FrameStream:
+    """Render the runs of text through a RevealLayer; returns the runs' elapsed_ms."""
+    layer = RevealLayer(config, text, fonts, fps, history)
+    frame_index = 0
+    last_state = None
+    frame = None
+    while True:
+        try:
+            count, draws = next(runs)
+        except StopIteration as stop:
+            return stop.value
+        layer.feed(frame_index, draws)
+        for offset in range(count):
+            state = layer.state(frame_index + offset, offset)
+            if state != last_state:
+                frame = layer.compose(state)
+                last_state = state
+            yield frame
+        frame_index += count
@@ -0,0 +1,268 @@
+import hashlib
+import json
+import logging
+import os
+import struct
+from bisect import bisect_right
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from PIL import ImageDraw, ImageFont
+
+logger = logging.getLogger(__name__)
+
+COVERAGE_CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "sans-subtitle-generator" / "fonts"
+
+# (platform, encoding) pairs of Unicode cmap subtables, most complete first
+_UNICODE_SUBTABLES = [(3, 10), (0, 6), (0, 4), (3, 1), (0, 3), (0, 2), (0, 1), (0, 0)]
+
+
+def _read_cmap_ranges(data: bytes, font_offset: int = 0) -> list[tuple[int, int]]:
+    """Return the code point ranges (inclusive) mapped by a font's cmap table.
+
+    Supports sfnt fonts (TrueType/OpenType) and the first font of a TTC
+    collection, with format 4 and format 12 subtables.
+    """
+    if data[:4] == b"ttcf":
+        (font_offset,) = struct.unpack_from(">I", data, 12)
+
+    (num_tables,) = struct.unpack_from(">H", data, font_offset + 4)
+    cmap_offset = None
+    for i in range(num_tables):
+        tag, _, offset, _ = struct.unpack_from(">4sIII", data, font_offset + 12 + 16 * i)
+        if tag == b"cmap":
+            cmap_offset = offset
+            break
+    if cmap_offset is None:
+        raise ValueError("font has no cmap table")
+
+    (num_subtables,) = struct.unpack_from(">H", data, cmap_offset + 2)
+    subtables = {}
+    for i in range(num_subtables):
+        platform, encoding, offset = struct.unpack_from(">HHI", data, cmap_offset + 4 + 8 * i)
+        subtables[(platform, encoding)] = cmap_offset + offset
+
+    for key in _UNICODE_SUBTABLES:
+        if key not in subtables:
+            continue
+        offset = subtables[key]
+        (fmt,) = struct.unpack_from(">H", data, offset)
+        if fmt == 12:
+            return _read_format12(data, offset)
+        if fmt == 4:
+            return _read_format4(data, offset)
+    raise ValueError("font has no supported Unicode cmap subtable")
+
+
+def _read_format4(data: bytes, offset: int) -> list[tuple[int, int]]:
+    (seg_count_x2,) = struct.unpack_from(">H", data, offset + 6)
+    seg_count = seg_count_x2 // 2
+    ends_at = offset + 14
+    starts_at = ends_at + seg_count_x2 + 2
+    deltas_at = starts_at + seg_count_x2
+    range_offsets_at = deltas_at + seg_count_x2
+
+    ends = struct.unpack_from(f">{seg_count}H", data, ends_at)
+    starts = struct.unpack_from(f">{seg_count}H", data, starts_at)
+    deltas = struct.unpack_from(f">{seg_count}H", data, deltas_at)
+    range_offsets = struct.unpack_from(f">{seg_count}H", data, range_offsets_at)
+
+    ranges = []
+    for i in range(seg_count):
+        start, end = starts[i], ends[i]
+        if start == 0xFFFF:
+            continue
+        if range_offsets[i] == 0:
+            # Every code point in the segment maps to a glyph unless the
+            # delta sends it to .notdef
+            first = None
+            for code in range(start, end + 1):
+                mapped = (code + deltas[i]) & 0xFFFF != 0
+                if mapped and first is None:
+                    first = code
+                elif not mapped and first is not None:
+                    ranges.append((first, code - 1))
+                    first = None
+            if first is not None:
+                ranges.append((first, end))
+            continue
+
+        first = None
+        for code in range(start, end + 1):
+            glyph_at = range_offsets_at + 2 * i + range_offsets[i] + 2 * (code - start)
+            (glyph,) = struct.unpack_from(">H", data, glyph_at)
+            mapped = glyph != 0 and (glyph + deltas[i]) & 0xFFFF != 0
+            if mapped and first is None:
+                first = code
+            elif not mapped and first is not None:
+                ranges.append((first, code - 1))
+                first = None
+        if first is not None:
+            ranges.append((first, end))
+    return ranges
+
+
+def _read_format12(data: bytes, offset: int) -> list[tuple[int, int]]:
+    (num_groups,) = struct.unpack_from(">I", data, offset + 12)
+    ranges = []
+    for i in range(num_groups):
+        start, end, glyph = struct.unpack_from(">III", data, offset + 16 + 12 * i)
+        if glyph == 0:
+            start += 1
+        if start <= end:
+            ranges.append((start, end))
+    return ranges
+
+
+def _merge_ranges(ranges: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    merged: list[list[int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+class FontCoverage:
+    """Set of code points a font has glyphs for, stored as sorted ranges."""
+
+    def __init__(self, ranges: list[tuple[int, int]]):
+        self.ranges = _merge_ranges(ranges)
+        self._starts = [start for start, _ in self.ranges]
+
+    def __contains__(self, char: str) -> bool:
+        code = ord(char)
+        i = bisect_right(self._starts, code) - 1
+        return i >= 0 and code <= self.ranges[i][1]
+
+
+def load_coverage(font_path: str, cache_dir: Optional[str] = None) -> FontCoverage:
+    """Read a font's cmap coverage, using an on-disk cache keyed by the file.
+
+    The cache entry is invalidated when the font's path, size or mtime
+    changes, so parsing the cmap happens once per font file.
+    """
+    path = Path(font_path).resolve()
+    stat = path.stat()
+    key = hashlib.sha256(
+        f"{COVERAGE_CACHE_VERSION}:{path}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8")
+    ).hexdigest()
+    cache_path = Path(cache_dir) if cache_dir else DEFAULT_CACHE_DIR
+    cache_file = cache_path / f"{key}.json"
+
+    try:
+        return FontCoverage([tuple(r) for r in json.loads(cache_file.read_text())])
+    except (OSError, ValueError):
+        pass
+
+    ranges = _merge_ranges(_read_cmap_ranges(path.read_bytes()))
+    try:
+        cache_path.mkdir(parents=True, exist_ok=True)
+        temp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        temp_file.write_text(json.dumps(ranges))
+        os.replace(temp_file, cache_file)
+    except OSError as e:
+        logger.debug(f"Could not cache font coverage for {path}: {e}")
+    return FontCoverage(ranges)
+
+
+class FontChain:
+    """Primary font plus fallbacks, resolving each character to one font.
+
+    Characters are resolved through the fonts' cmap coverage (no trial
+    rendering) and memoized, so each lookup after the first is a dict hit.
+    Characters no font covers use the primary font.
+    """
+
+    def __init__(self, fonts: list, coverages: list[Optional[FontCoverage]]):
+        self.fonts = fonts
+        self.coverages = coverages
+        self._resolved: dict[str, int] = {}
+
+    @property
+    def primary(self):
+        return self.fonts[0]
+
+    def font_index(self, char: str) -> int:
+        index = self._resolved.get(char)
+        if index is None:
+            index = 0
+            for i, coverage in enumerate(self.coverages):
+                # Unknown coverage (e.g. Pillow's built-in font) accepts all
+                if coverage is None or char in coverage:
+                    index = i
+                    break
+            self._resolved[char] = index
+        return index
+
+    def runs(self, text: str) -> list[tuple[int, str]]:
+        """Split text into (font_index, substring) runs of the same font."""
+        runs: list[tuple[int, str]] = []
+        start = 0
+        current = None
+        for i, char in enumerate(text):
+            index = self.font_index(char)
+            if index != current:
+                if current is not None:
+                    runs.append((current, text[start:i]))
+                current, start = index, i
+        if current is not None:
+            runs.append((current, text[start:]))
+        return runs
+
+    def draw_text(self, draw: ImageDraw.ImageDraw, xy, text: str, fill) -> None:
+        runs = self.runs(text)
+        if len(runs) <= 1:
+            draw.text(tuple(xy), text, fill=fill, font=self.fonts[runs[0][0] if runs else 0])
+            return
+
+        # Mixed fonts: draw each run on the primary font's baseline
+        x, y = xy
+        baseline = y + self.primary.getmetrics()[0]
+        for index, run in runs:
+            font = self.fonts[index]
+            draw.text((x, baseline), run, fill=fill, font=font, anchor="ls")
+            x += font.getlength(run)
+
+
+def _load_truetype(font_path: str, font_size: int):
+    try:
+        return ImageFont.truetype(font_path, font_size)
+    except Exception as e:
+        logger.warning(f"Could not load font {font_path}: {e}")
+        return None
+
+
+@lru_cache(maxsize=16)
+def load_font_chain(
+    font_paths: tuple[str, ...],
+    font_size: int,
+    cache_dir: Optional[str] = None,
+) -> FontChain:
+    """Load the fonts in font_paths (missing/broken ones are skipped).
+
+    Falls back to Pillow's built-in font when none can be loaded.
+    """
+    fonts = []
+    coverages: list[Optional[FontCoverage]] = []
+    for font_path in font_paths:
+        if not font_path:
+            continue
+        font = _load_truetype(font_path, font_size)
+        if font is None:
+            continue
+        try:
+            coverage = load_coverage(font_path, cache_dir)
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning(f"Could not read glyph coverage of {font_path}: {e}")
+            coverage = None
+        fonts.append(font)
+        coverages.append(coverage)
+
+    if not fonts:
+        fonts.append(ImageFont.load_default())
+        coverages.append(None)
+    return FontChain(fonts, coverages)
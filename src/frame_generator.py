@@ -1,55 +1,150 @@
-from typing import Optional
+import queue
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import Generator, Iterable, Iterator, Optional
 
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageColor, ImageDraw
 
-from src.parser import is_punctuation, is_pause_marker
+from src.fonts import FontChain, load_font_chain
+from src.timing import (  # noqa: F401 (the run model used to live here)
+    FrameRun,
+    RunStream,
+    iter_pause_runs,
+    iter_sentence_block_runs,
+    iter_sentence_runs,
+)
 
+# Frames yielded by the iter_* generators are shared: a frame held on screen
+# for N video frames is the same Image object yielded N times. Consumers must
+# not mutate them in place (copy first if needed).
+#
+# Frames only ever contain background_color, text_color and anti-aliased
+# blends of the two, so they are rendered as 8-bit text coverage masks (one
+# byte per pixel) carrying a two-tone palette. convert("RGB") expands them
+# through that palette; the encoder does this once per unique frame.
+FrameStream = Generator[Image.Image, None, float]
 
-def generate_pause_frames(
+
+def _load_fonts(font_path: Optional[str], config: dict) -> FontChain:
+    """font_path followed by config["fallback_fonts"], as a FontChain."""
+    font_paths = (font_path, *(config.get("fallback_fonts") or []))
+    return load_font_chain(font_paths, config["font_size"], config.get("font_cache_dir"))
+
+
+@lru_cache(maxsize=16)
+def two_tone_palette(background_color, text_color) -> tuple[int, ...]:
+    """256-entry RGB palette mapping text coverage to the blended colour.
+
+    Entry c is what Pillow produces when it draws text_color over
+    background_color with coverage c (same rounding), so expanding a mask
+    through it matches drawing directly on an RGB frame. Where punctuation
+    is drawn over existing text the two may differ by one level.
+    """
+    background = ImageColor.getrgb(background_color)[:3]
+    text = ImageColor.getrgb(text_color)[:3]
+    palette = []
+    for coverage in range(256):
+        for bg, fg in zip(background, text):
+            value = bg * (255 - coverage) + fg * coverage + 128
+            palette.append(((value >> 8) + value) >> 8)
+    return tuple(palette)
+
+
+def _render_mask(config: dict, text: str, fonts: Optional[FontChain]) -> Image.Image:
+    """Text coverage (mode L, 0 = background, 255 = text) of a frame."""
+    width, height = config["resolution"]
+    mask = Image.new("L", (width, height), 0)
+    if text:
+        draw = ImageDraw.Draw(mask)
+        fonts.draw_text(draw, config["text_position"], text, 255)
+    return mask
+
+
+def _to_palette_frame(config: dict, mask: Image.Image) -> Image.Image:
+    """Attach the two-tone palette to a mask in place (mode L -> P, no copy)."""
+    mask.putpalette(two_tone_palette(config["background_color"], config["text_color"]))
+    return mask
+
+
+def _collect(stream: FrameStream) -> tuple[list[Image.Image], float]:
+    frames = []
+    while True:
+        try:
+            frames.append(next(stream))
+        except StopIteration as stop:
+            return frames, stop.value
+
+
+def render_draws(
+    config: dict,
+    text: str,
+    draws: tuple[int, ...],
+    fonts: Optional[FontChain],
+) -> Image.Image:
+    """Render the image of a run: each prefix of text in draws, in order."""
+    return _to_palette_frame(config, _draws_mask(config, text, draws, fonts))
+
+
+def _draws_mask(
+    config: dict,
+    text: str,
+    draws: tuple[int, ...],
+    fonts: Optional[FontChain],
+) -> Image.Image:
+    """Text coverage (mode L) of a run's image, before the palette is attached."""
+    mask = _render_mask(config, text[:draws[0]] if draws else "", fonts)
+    if len(draws) > 1:
+        draw = ImageDraw.Draw(mask)
+        for length in draws[1:]:
+            fonts.draw_text(draw, config["text_position"], text[:length], 255)
+    return mask
+
+
+def _render_runs(
+    runs: RunStream,
+    config: dict,
+    text: str,
+    fonts: Optional[FontChain],
+) -> FrameStream:
+    """Render runs, re-rendering only when the drawn text changes."""
+    last_draws = None
+    frame = None
+    while True:
+        try:
+            count, draws = next(runs)
+        except StopIteration as stop:
+            return stop.value
+        if draws != last_draws:
+            frame = render_draws(config, text, draws, fonts)
+            last_draws = draws
+        for _ in range(count):
+            yield frame
+
+
+def iter_pause_frames(
     config: dict,
     fps: int = 30,
     pause_duration_ms: int = 500,
     visible_text: str = "",
     font_path: Optional[str] = None,
     elapsed_ms: float = 0.0,
-) -> tuple[list[Image.Image], float]:
-    """Generate static pause frames and return (frames, updated_elapsed_ms).
+) -> FrameStream:
+    """Yield static pause frames; the generator returns the updated elapsed_ms.
 
     Uses cumulative time tracking to avoid frame-count drift relative to audio.
     The caller passes in the running elapsed_ms; this function advances it by
     pause_duration_ms and computes frame count from the difference in the
     cumulative frame position, keeping total error within ±1 frame.
-    """
-    width, height = config["resolution"]
-    bg_color = config["background_color"]
-
-    frames_before = round(elapsed_ms * fps / 1000)
-    elapsed_ms += pause_duration_ms
-    frames_after = round(elapsed_ms * fps / 1000)
-    pause_frames_count = max(1, frames_after - frames_before)
-
-    frame = Image.new("RGB", (width, height), bg_color)
-
-    if visible_text:
-        font_size = config["font_size"]
-        text_color = config["text_color"]
-        text_x, text_y = config["text_position"]
-
-        try:
-            if font_path:
-                font = ImageFont.truetype(font_path, font_size)
-            else:
-                font = ImageFont.load_default()
-        except Exception:
-            font = ImageFont.load_default()
 
-        draw = ImageDraw.Draw(frame)
-        draw.text((text_x, text_y), visible_text, fill=text_color, font=font)
-
-    return [frame.copy() for _ in range(pause_frames_count)], elapsed_ms
+    Only one frame is rendered; it is yielded once per video frame.
+    """
+    fonts = _load_fonts(font_path, config) if visible_text else None
+    runs = iter_pause_runs(visible_text, fps, pause_duration_ms, elapsed_ms)
+    return (yield from _render_runs(runs, config, visible_text, fonts))
 
 
-def generate_sentence_frames(
+def iter_sentence_frames(
     sentence: str,
     config: dict,
     font_path: Optional[str] = None,
@@ -58,78 +153,235 @@ def generate_sentence_frames(
     pause_chars: Optional[list[str]] = None,
     character_pause_ms: int = 200,
     elapsed_ms: float = 0.0,
-) -> tuple[list[Image.Image], float]:
-    """Generate frames for a sentence and return (frames, updated_elapsed_ms).
+) -> FrameStream:
+    """Yield frames for a sentence; the generator returns the updated elapsed_ms.
+
+    Use it as ``elapsed_ms = yield from iter_sentence_frames(...)`` to thread
+    the cumulative clock across sentences and inter-sentence pauses.
 
     Uses cumulative time tracking to stay in sync with the audio track.
     The audio builder absorbs pause-marker durations into the preceding
     character's clip (so the typing sound naturally fades into silence).
     This function mirrors that: when a pause marker follows a character,
     the elapsed time advances by character_pause_ms and the extra frames
-    are copies of the last frame (showing the pause-marker text).
+    repeat the last frame (showing the pause-marker text).
 
-    The caller passes in the running elapsed_ms counter; this function
-    returns the updated value so it can be threaded across sentences and
-    inter-sentence pauses.
+    Timing comes from iter_sentence_runs; only one rendered frame is alive
+    at any time, whatever the sentence length.
     """
     if not sentence:
-        return [], elapsed_ms
+        return elapsed_ms
 
-    if pause_chars is None:
-        pause_chars = ["，", "、", ","]
+    fonts = _load_fonts(font_path, config)
+    runs = iter_sentence_runs(
+        sentence,
+        fps=fps,
+        character_duration_ms=character_duration_ms,
+        pause_chars=pause_chars,
+        character_pause_ms=character_pause_ms,
+        elapsed_ms=elapsed_ms,
+    )
+    return (yield from _render_runs(runs, config, sentence, fonts))
 
-    width, height = config["resolution"]
-    font_size = config["font_size"]
-    text_color = config["text_color"]
-    bg_color = config["background_color"]
-    text_x, text_y = config["text_position"]
 
-    frames: list[Image.Image] = []
+def iter_timeline_frames(
+    sentences: Iterable[str],
+    config: dict,
+    font_path: Optional[str] = None,
+    fps: int = 30,
+    character_duration_ms: int = 50,
+    pause_chars: Optional[list[str]] = None,
+    character_pause_ms: int = 200,
+    sentence_pause_ms: int = 500,
+    elapsed_ms: float = 0.0,
+    pause_after_last: bool = False,
+    previous_sentences: Iterable[str] = (),
+) -> FrameStream:
+    """Yield every frame of the video: sentences with pauses between them.
 
-    try:
-        if font_path:
-            font = ImageFont.truetype(font_path, font_size)
-        else:
-            font = ImageFont.load_default()
-    except Exception:
-        font = ImageFont.load_default()
-
-    visible_text = ""
-    for char in sentence:
-        visible_text += char
-
-        if is_punctuation(char):
-            # Draw punctuation onto the last frame (in-place update)
-            if len(frames) > 0:
-                frame = frames[-1].copy()
-                draw = ImageDraw.Draw(frame)
-                draw.text((text_x, text_y), visible_text, fill=text_color, font=font)
-                frames[-1] = frame
+    A cumulative elapsed_ms counter is threaded through all frame generation
+    calls so that video frame counts stay in sync with the audio track's
+    exact millisecond durations. Returns the total elapsed_ms.
+
+    sentences may be a lazy iterator; only one sentence of lookahead is
+    needed to know whether a pause follows. elapsed_ms and pause_after_last
+    let a caller render one segment of a longer timeline, matching
+    build_audio_track's pause_after_last; previous_sentences are the ones
+    before it, shown by config["history"].
+    """
+    # src.effects and src.history build on this module, so they are
+    # imported here
+    from src.effects import effects_enabled, iter_effect_frames
+    from src.history import HistoryLayer, history_lines, iter_history_frames
+
+    effects = effects_enabled(config)
+    line_count = history_lines(config)
+    previous = deque(previous_sentences, maxlen=line_count) if line_count else None
+    strips: dict = {}
+    remaining = iter(sentences)
+    sentence = next(remaining, None)
+    while sentence is not None:
+        next_sentence = next(remaining, None)
+        pause_after = next_sentence is not None or pause_after_last
+        history = None
+        if previous:
+            fonts = _load_fonts(font_path, config)
+            history = HistoryLayer(config, list(previous), fonts, fps, strips)
+        if effects or history:
+            # Effects carry over from a sentence into its pause (a fade
+            # finishing, the cursor blinking), so both are one layer; the
+            # history layer is also kept for both
+            runs = iter_sentence_block_runs(
+                sentence,
+                fps=fps,
+                character_duration_ms=character_duration_ms,
+                pause_chars=pause_chars,
+                character_pause_ms=character_pause_ms,
+                sentence_pause_ms=sentence_pause_ms,
+                elapsed_ms=elapsed_ms,
+                pause_after=pause_after,
+            )
+            fonts = _load_fonts(font_path, config)
+            if effects:
+                elapsed_ms = yield from iter_effect_frames(
+                    runs, config, sentence, fonts, fps, history=history
+                )
             else:
-                frame = Image.new("RGB", (width, height), bg_color)
-                draw = ImageDraw.Draw(frame)
-                draw.text((text_x, text_y), visible_text, fill=text_color, font=font)
-                frames.append(frame)
-
-            if is_pause_marker(char, pause_chars):
-                # Mirror audio_builder: absorb pause into preceding char's
-                # duration so the typing sound fades naturally into silence.
-                frames_before = round(elapsed_ms * fps / 1000)
-                elapsed_ms += character_pause_ms
-                frames_after = round(elapsed_ms * fps / 1000)
-                pause_frame_count = max(1, frames_after - frames_before)
-                for _ in range(pause_frame_count):
-                    frames.append(frames[-1].copy())
+                elapsed_ms = yield from iter_history_frames(
+                    runs, config, sentence, fonts, history
+                )
         else:
-            frame = Image.new("RGB", (width, height), bg_color)
-            draw = ImageDraw.Draw(frame)
-            draw.text((text_x, text_y), visible_text, fill=text_color, font=font)
-
-            frames_before = round(elapsed_ms * fps / 1000)
-            elapsed_ms += character_duration_ms
-            frames_after = round(elapsed_ms * fps / 1000)
-            char_frame_count = max(1, frames_after - frames_before)
-            for _ in range(char_frame_count):
-                frames.append(frame.copy())
-
-    return frames, elapsed_ms
+            elapsed_ms = yield from iter_sentence_frames(
+                sentence,
+                config,
+                font_path,
+                fps=fps,
+                character_duration_ms=character_duration_ms,
+                pause_chars=pause_chars,
+                character_pause_ms=character_pause_ms,
+                elapsed_ms=elapsed_ms,
+            )
+            if pause_after:
+                elapsed_ms = yield from iter_pause_frames(
+                    config,
+                    fps=fps,
+                    pause_duration_ms=sentence_pause_ms,
+                    visible_text=sentence,
+                    font_path=font_path,
+                    elapsed_ms=elapsed_ms,
+                )
+        if previous is not None:
+            previous.append(sentence)
+        sentence = next_sentence
+
+    return elapsed_ms
+
+
+def frames_for_budget(
+    resolution: list[int],
+    memory_budget_mb: float,
+    bytes_per_pixel: int = 1,
+) -> int:
+    """Number of frames that fit in memory_budget_mb (at least one)."""
+    width, height = resolution
+    frame_bytes = width * height * bytes_per_pixel
+    return max(1, int(memory_budget_mb * 1024 * 1024) // frame_bytes)
+
+
+def prefetch_frames(frames: Iterable[Image.Image], max_frames: int) -> Iterator[Image.Image]:
+    """Render frames on a background thread, keeping at most max_frames queued.
+
+    Lets frame rendering overlap with encoding while bounding memory.
+    Exceptions raised by the producer are re-raised in the consumer.
+    """
+    buffer: queue.Queue = queue.Queue(maxsize=max(1, max_frames))
+    done = object()
+    stop = threading.Event()
+    error: list[BaseException] = []
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for frame in frames:
+                if not put(frame):
+                    return
+        except BaseException as e:
+            error.append(e)
+        put(done)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is done:
+                break
+            yield item
+        if error:
+            raise error[0]
+    finally:
+        stop.set()
+        thread.join()
+
+
+def generate_pause_frames(
+    config: dict,
+    fps: int = 30,
+    pause_duration_ms: int = 500,
+    visible_text: str = "",
+    font_path: Optional[str] = None,
+    elapsed_ms: float = 0.0,
+) -> tuple[list[Image.Image], float]:
+    """Generate static pause frames and return (frames, updated_elapsed_ms).
+
+    List-returning wrapper around iter_pause_frames; prefer the generator
+    for anything longer than a few seconds.
+    """
+    return _collect(
+        iter_pause_frames(
+            config,
+            fps=fps,
+            pause_duration_ms=pause_duration_ms,
+            visible_text=visible_text,
+            font_path=font_path,
+            elapsed_ms=elapsed_ms,
+        )
+    )
+
+
+def generate_sentence_frames(
+    sentence: str,
+    config: dict,
+    font_path: Optional[str] = None,
+    fps: int = 30,
+    character_duration_ms: int = 50,
+    pause_chars: Optional[list[str]] = None,
+    character_pause_ms: int = 200,
+    elapsed_ms: float = 0.0,
+) -> tuple[list[Image.Image], float]:
+    """Generate frames for a sentence and return (frames, updated_elapsed_ms).
+
+    List-returning wrapper around iter_sentence_frames. Held frames are the
+    same Image object repeated, so the list costs one image per character
+    rather than one per video frame.
+    """
+    return _collect(
+        iter_sentence_frames(
+            sentence,
+            config,
+            font_path,
+            fps=fps,
+            character_duration_ms=character_duration_ms,
+            pause_chars=pause_chars,
+            character_pause_ms=character_pause_ms,
+            elapsed_ms=elapsed_ms,
+        )
+    )
@@ -0,0 +1,145 @@
+from typing import Optional
+
+from PIL import Image, ImageChops, ImageDraw
+
+from src.fonts import FontChain
+from src.frame_generator import FrameStream, RunStream, _draws_mask, _to_palette_frame
+from src.timing import scroll_offset
+
+
+def history_lines(config: dict) -> int:
+    """Number of previous sentences config["history"] keeps on screen (0: off)."""
+    history = config.get("history") or {}
+    return max(0, int(history.get("lines") or 0))
+
+
+class HistoryLayer:
+    """Previous sentences stacked above the line being typed.
+
+    Each line is rasterized once into a strip (strips is a cache shared
+    from one sentence's layer to the next), and the strips are combined
+    into the layer's mask when the sentence starts. Over the first
+    scroll_ms of the sentence the layer slides up by one line, easing out,
+    as the sentence that just finished moves up from the typing line.
+
+    A frame is the cached full-frame mask of the layer at its scroll
+    offset, with the band of the typing line merged in, so it costs the
+    same however many lines are shown.
+    """
+
+    def __init__(
+        self,
+        config: dict,
+        lines: list[str],
+        fonts: FontChain,
+        fps: int,
+        strips: Optional[dict[str, Image.Image]] = None,
+    ):
+        history = config.get("history") or {}
+        self.config = config
+        width, self.frame_height = config["resolution"]
+        y = config["text_position"][1]
+        self.line_height = max(1, round(config["font_size"] * history.get("line_spacing", 1.25)))
+        self.scroll_frames = max(0, round(history.get("scroll_ms", 200) * fps / 1000))
+        # Frame y of the layer's first row: the newest line ends up one
+        # line height above the typing line
+        self.top = y - len(lines) * self.line_height
+        # One spare line below the newest line, for its descenders and
+        # for the scroll offset
+        self.image = Image.new("L", (width, (len(lines) + 1) * self.line_height), 0)
+        # Rows the typing line can draw into (with room for tall glyphs)
+        self.live_rows = (
+            max(0, y - self.line_height),
+            max(0, min(self.frame_height, y + 2 * self.line_height)),
+        )
+        self._frames: dict[int, Image.Image] = {}
+
+        strips = {} if strips is None else strips
+        for text in [text for text in strips if text not in lines]:
+            del strips[text]
+        for row, text in enumerate(lines):
+            row_y = row * self.line_height
+            if self.top + row_y + 3 * self.line_height <= 0:
+                continue  # above the frame even while scrolling
+            strip = strips.get(text)
+            if strip is None:
+                strip = strips[text] = self._strip(config, text, fonts)
+            box = (0, row_y, width, min(self.image.height, row_y + strip.height))
+            strip = strip.crop((0, 0, width, box[3] - row_y))
+            self.image.paste(ImageChops.lighter(self.image.crop(box), strip), box)
+
+    def _strip(self, config: dict, text: str, fonts: FontChain) -> Image.Image:
+        """Mask of one line, two line heights tall (room for descenders)."""
+        strip = Image.new("L", (self.image.width, 2 * self.line_height), 0)
+        fonts.draw_text(ImageDraw.Draw(strip), (config["text_position"][0], 0), text, 255)
+        return strip
+
+    def scroll(self, frame: int) -> int:
+        """Offset in pixels (down) of the layer, frame frames into the sentence."""
+        return scroll_offset(frame, self.scroll_frames, self.line_height)
+
+    def visible(self, scroll: int) -> Optional[tuple[int, int, int]]:
+        """(frame_y, first_row, end_row) of the layer rows inside the frame."""
+        y = self.top + scroll
+        first = max(0, -y)
+        end = min(self.image.height, self.frame_height - y)
+        if first >= end:
+            return None
+        return y + first, first, end
+
+    def frame_mask(self, scroll: int) -> Image.Image:
+        """Full-frame mask (mode L) of the layer alone at a scroll offset, cached."""
+        mask = self._frames.get(scroll)
+        if mask is None:
+            mask = Image.new("L", (self.image.width, self.frame_height), 0)
+            visible = self.visible(scroll)
+            if visible is not None:
+                y, first, end = visible
+                mask.paste(self.image.crop((0, first, self.image.width, end)), (0, y))
+            self._frames[scroll] = mask
+        return mask
+
+    def compose(self, live: Image.Image, scroll: int) -> Image.Image:
+        """Frame of the live line's mask with the layer under it.
+
+        Within the typing line's rows each pixel keeps the higher coverage.
+        """
+        mask = self.frame_mask(scroll).copy()
+        box = (0, self.live_rows[0], mask.width, self.live_rows[1])
+        if box[1] < box[3]:
+            mask.paste(ImageChops.lighter(mask.crop(box), live.crop(box)), box)
+        return _to_palette_frame(self.config, mask)
+
+
+def iter_history_frames(
+    runs: RunStream,
+    config: dict,
+    text: str,
+    fonts: Optional[FontChain],
+    history: HistoryLayer,
+) -> FrameStream:
+    """Render the runs of text over a HistoryLayer; returns the runs' elapsed_ms.
+
+    The live line is rendered once per change of draws; frames are composed
+    once per change of draws or scroll offset.
+    """
+    frame_index = 0
+    last_key = None
+    live_draws = None
+    live = None
+    frame = None
+    while True:
+        try:
+            count, draws = next(runs)
+        except StopIteration as stop:
+            return stop.value
+        if draws != live_draws:
+            live = _draws_mask(config, text, draws, fonts)
+            live_draws = draws
+        for offset in range(count):
+            key = (draws, history.scroll(frame_index + offset))
+            if key != last_key:
+                frame = history.compose(live, key[1])
+                last_key = key
+            yield frame
+        frame_index += count
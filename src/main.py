@@ -1,22 +1,72 @@
 import click
+import contextlib
+import json
 import logging
+import os
 import tempfile
 from pathlib import Path
 from typing import Optional
 
-from src.config import load_config, get_default_config
-from src.parser import split_sentences
-from src.frame_generator import generate_sentence_frames, generate_pause_frames
-from src.video_builder import assemble_video_stream
-from src.audio_builder import build_audio_track
+# Only light modules are imported up front: the rendering modules pull in
+# Pillow, NumPy and PyAV, so each command imports what it uses and
+# `sans-sub plan` starts without them.
+from src.config import load_config, resolve_config
+from src.parser import SentenceParser, open_text
 from src.utils import verify_ffmpeg
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-@click.command()
-@click.argument("input_file", type=click.Path(exists=True))
+class DefaultCommandGroup(click.Group):
+    """Command group that runs default_command when no subcommand is named.
+
+    Keeps ``sans-sub input.txt -o out.mp4`` working next to subcommands such
+    as ``sans-sub frame``.
+    """
+
+    default_command = "render"
+
+    def parse_args(self, ctx: click.Context, args: list[str]) -> list[str]:
+        if args and args[0] not in self.commands and args[0] not in ctx.help_option_names:
+            args = [self.default_command, *args]
+        return super().parse_args(ctx, args)
+
+
+@click.group(cls=DefaultCommandGroup)
+def cli():
+    """Generate subtitle video with typing sounds from text file (or - for stdin).
+
+    Runs the render command unless another command is named.
+    """
+
+
+def _load_job(input_file: str, config_path: Optional[str]) -> tuple:
+    """Load config and sentences; returns (config, sentences, font_path, frame_config, pause_chars)."""
+    from src.api import RenderError, prepare_job
+
+    config = load_config(config_path) if config_path else None
+
+    with open_text(input_file) as f:
+        # The audio track is built up front, so the sentence list is
+        # materialized here; the input itself is still parsed line by line.
+        try:
+            job = prepare_job(f, config)
+        except RenderError as e:
+            logger.error(str(e))
+            raise SystemExit(1)
+
+    return (
+        job["config"],
+        job["sentences"],
+        job["font_path"],
+        job["frame_config"],
+        job["pause_chars"],
+    )
+
+
+@cli.command()
+@click.argument("input_file", type=click.Path(exists=True, allow_dash=True))
 @click.option("-o", "--output", default="output/video.mp4", help="Output video path")
 @click.option(
     "-c",
@@ -25,44 +75,159 @@ logger = logging.getLogger(__name__)
     type=click.Path(exists=True),
     help="Config file path",
 )
+@click.option(
+    "--work-dir",
+    type=click.Path(file_okay=False),
+    help="Render in checkpointed segments kept in this directory",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    help="Continue from the last finished segment in --work-dir (default: OUTPUT.work)",
+)
+@click.option(
+    "--queue",
+    "queue_dir",
+    type=click.Path(file_okay=False),
+    help="Render segments through a work queue in this shared directory (see the worker command)",
+)
+@click.option(
+    "--workers",
+    default=0,
+    show_default=True,
+    help="Worker processes to run on this machine with --queue",
+)
+@click.option(
+    "--image-sequence",
+    "sequence_dir",
+    type=click.Path(file_okay=False),
+    help="Write a PNG/WebP image sequence and audio.wav to this directory instead of a video",
+)
+@click.option(
+    "--live",
+    "live_dir",
+    type=click.Path(file_okay=False),
+    help="Write HLS/DASH segments and a growing playlist to this directory while rendering",
+)
+@click.option(
+    "--live-format",
+    type=click.Choice(["dash", "hls"]),  # video_builder.LIVE_PLAYLISTS
+    help="Segment format for --live (default: video.live.format)",
+)
+@click.option(
+    "--metrics",
+    "metrics_path",
+    type=click.Path(dir_okay=False),
+    help="Append this render's timings and peak memory to this file (for plan --calibrate)",
+)
 @click.option("-v", "--verbose", is_flag=True, help="Enable verbose logging")
-def cli(input_file: str, output: str, config_path: Optional[str], verbose: bool):
-    """Generate subtitle video with typing sounds from text file."""
+def render(
+    input_file: str,
+    output: str,
+    config_path: Optional[str],
+    work_dir: Optional[str],
+    resume: bool,
+    queue_dir: Optional[str],
+    workers: int,
+    sequence_dir: Optional[str],
+    live_dir: Optional[str],
+    live_format: Optional[str],
+    metrics_path: Optional[str],
+    verbose: bool,
+):
+    """Generate subtitle video with typing sounds from text file (or - for stdin)."""
+    from src.api import RenderError, timeline_frames, timeline_index
+    from src.audio_builder import build_audio_track
+    from src.distributed import render_distributed
+    from src.video_builder import LIVE_PLAYLISTS, assemble_video_stream, output_targets
+
     if verbose:
         logging.getLogger().setLevel(logging.DEBUG)
 
     verify_ffmpeg()
 
-    config = load_config(config_path) if config_path else get_default_config()
-
-    with open(input_file, "r", encoding="utf-8") as f:
-        text = f.read()
+    config, sentences, font_path, frame_config, pause_chars = _load_job(input_file, config_path)
 
-    if not text.strip():
-        logger.error("Input file is empty")
+    sound_path = config["audio"]["typing_sound"]
+    if not Path(sound_path).exists():
+        logger.error(f"Sound file not found: {sound_path}")
         raise SystemExit(1)
 
-    sentences = split_sentences(text)
-    logger.info(f"Found {len(sentences)} sentences")
+    if queue_dir and (sequence_dir or live_dir or work_dir or resume):
+        raise click.UsageError(
+            "--queue cannot be combined with --image-sequence/--live/--work-dir/--resume"
+        )
+    if workers and not queue_dir:
+        raise click.UsageError("--workers needs --queue")
 
-    font_path = config["style"].get("font_path")
-    if font_path and not Path(font_path).exists():
-        logger.warning(f"Font file not found: {font_path}, using default")
-        font_path = None
+    if live_dir and (sequence_dir or work_dir or resume):
+        raise click.UsageError("--live cannot be combined with --image-sequence/--work-dir/--resume")
+    if metrics_path and (queue_dir or sequence_dir or work_dir or resume):
+        raise click.UsageError(
+            "--metrics cannot be combined with --queue/--image-sequence/--work-dir/--resume"
+        )
 
-    sound_path = config["audio"]["typing_sound"]
-    if not Path(sound_path).exists():
-        logger.error(f"Sound file not found: {sound_path}")
+    if sequence_dir:
+        if work_dir or resume:
+            raise click.UsageError("--image-sequence cannot be combined with --work-dir/--resume")
+        _render_image_sequence(
+            sentences, config, frame_config, font_path, sound_path, pause_chars, sequence_dir
+        )
+        return
+
+    live = None
+    if live_dir:
+        # Segments are cut only at sentence starts, so each one begins with
+        # a new sentence and playback can start after the first segment.
+        output = live_dir
+        live_config = config["video"].get("live", {})
+        segment_seconds = live_config.get("segment_seconds", 6)
+        index = timeline_index(sentences, config, frame_config, font_path, pause_chars)
+        live = {
+            "format": live_format or live_config.get("format", "hls"),
+            "segment_seconds": segment_seconds,
+            "segment_starts": index.segment_starts(segment_seconds),
+        }
+
+    try:
+        targets = output_targets(config["video"], output)
+    except ValueError as e:
+        logger.error(str(e))
         raise SystemExit(1)
+    for target in targets:
+        Path(target["path"]).parent.mkdir(parents=True, exist_ok=True)
 
-    frame_config = {
-        **config["style"],
-        "resolution": config["video"]["resolution"],
-    }
+    if queue_dir:
+        job = {
+            "config": config,
+            "sentences": sentences,
+            "font_path": font_path,
+            "frame_config": frame_config,
+            "pause_chars": pause_chars,
+        }
+        try:
+            paths = render_distributed(job, output, queue_dir, workers)
+        except RenderError as e:
+            logger.error(str(e))
+            raise SystemExit(1)
+        logger.info(f"Video saved to {', '.join(paths)}")
+        return
 
-    pause_chars = config["parsing"].get("sentence_pauses", ["，", "、", ","])
+    if resume and not work_dir:
+        work_dir = f"{output}.work"
 
-    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    if work_dir:
+        _render_checkpointed(
+            sentences, config, frame_config, font_path, pause_chars,
+            output, work_dir, resume,
+        )
+        return
+
+    metrics = None
+    if metrics_path:
+        from src.planner import RenderMetrics, plan_render
+
+        metrics = RenderMetrics(plan_render(sentences, config, pause_chars))
 
     with tempfile.TemporaryDirectory() as temp_dir:
         temp_path = Path(temp_dir)
@@ -70,56 +235,291 @@ def cli(input_file: str, output: str, config_path: Optional[str], verbose: bool)
         # 1. Build Audio Track First
         audio_output = str(temp_path / "temp_audio.wav")
         logger.info("Building audio track...")
-        build_audio_track(
-            sentences,
-            sound_path,
-            audio_output,
-            config["audio"],
-            pause_chars=pause_chars,
-        )
+        with metrics.phase("audio") if metrics else contextlib.nullcontext():
+            build_audio_track(
+                sentences,
+                sound_path,
+                audio_output,
+                config["audio"],
+                pause_chars=pause_chars,
+            )
         logger.info("Built audio track")
 
-        # 2. Define a generator function that yields frames one at a time.
-        #    A cumulative elapsed_ms counter is threaded through all frame
-        #    generation calls so that video frame counts stay in sync with
-        #    the audio track's exact millisecond durations.
-        def frame_generator():
-            elapsed_ms = 0.0
-            for i, sentence in enumerate(sentences):
-                logger.debug(f"Generating frames for sentence {i + 1}/{len(sentences)}")
-                frames, elapsed_ms = generate_sentence_frames(
-                    sentence,
-                    frame_config,
-                    font_path,
-                    fps=config["video"]["fps"],
-                    character_duration_ms=config["audio"]["character_duration_ms"],
-                    pause_chars=pause_chars,
-                    character_pause_ms=config["audio"].get("character_pause_ms", 200),
-                    elapsed_ms=elapsed_ms,
-                )
-
-                # Yield sentence frames sequentially
-                for frame in frames:
-                    yield frame
-
-                if i < len(sentences) - 1:
-                    pause_frames, elapsed_ms = generate_pause_frames(
-                        frame_config,
-                        fps=config["video"]["fps"],
-                        pause_duration_ms=config["audio"]["sentence_pause_ms"],
-                        visible_text=sentence,
-                        font_path=font_path,
-                        elapsed_ms=elapsed_ms,
-                    )
-
-                    # Yield pause frames sequentially
-                    for frame in pause_frames:
-                        yield frame
+        # 2. Frames are generated lazily and handed to FFmpeg as they are
+        #    produced, with at most memory_budget_mb worth of frames queued
+        #    between the renderer and the encoder.
+        frames = timeline_frames(sentences, config, frame_config, font_path, pause_chars)
+        if metrics:
+            frames = metrics.count(frames)
 
         # 3. Stream frames directly to FFmpeg
         logger.info("Streaming frames and encoding video via NVENC...")
-        assemble_video_stream(frame_generator(), audio_output, output, config["video"])
-        logger.info(f"Video saved to {output}")
+        if live:
+            playlist = LIVE_PLAYLISTS[live["format"]]
+            logger.info(
+                f"Writing {len(live['segment_starts'])} {live['format'].upper()} segments; "
+                f"view with: python -m http.server -d {output} (then open /{playlist})"
+            )
+        with metrics.phase("video") if metrics else contextlib.nullcontext():
+            paths = assemble_video_stream(
+                frames, audio_output, output, config["video"], live=live
+            )
+        logger.info(f"Video saved to {', '.join(paths)}")
+
+    if metrics:
+        metrics.write(metrics_path)
+        logger.info(f"Metrics appended to {metrics_path}")
+
+
+@cli.command()
+@click.argument("input_file", type=click.Path(exists=True, allow_dash=True))
+@click.option("--at", "at", help="Timestamp of the frame: 754.2s, 12:34.2 or seconds")
+@click.option("--poster", type=int, help="Poster frame of sentence N (1-based): the whole sentence shown")
+@click.option("--contact-sheet", "sheet_count", type=int, help="Grid of N evenly spaced frames")
+@click.option("--columns", default=4, show_default=True, help="Contact sheet columns")
+@click.option("--thumb-width", default=320, show_default=True, help="Contact sheet thumbnail width")
+@click.option("-o", "--output", default="frame.png", help="Output image path")
+@click.option(
+    "-c",
+    "--config",
+    "config_path",
+    type=click.Path(exists=True),
+    help="Config file path",
+)
+@click.option("-v", "--verbose", is_flag=True, help="Enable verbose logging")
+def frame(
+    input_file: str,
+    at: Optional[str],
+    poster: Optional[int],
+    sheet_count: Optional[int],
+    columns: int,
+    thumb_width: int,
+    output: str,
+    config_path: Optional[str],
+    verbose: bool,
+):
+    """Render a single frame, a sentence poster or a contact sheet as an image.
+
+    Only the requested frames are drawn; nothing is encoded, so ffmpeg is
+    not needed.
+    """
+    from src.api import timeline_index
+    from src.timeline import parse_timestamp
+    from src.video_builder import image_for_format
+
+    if verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+
+    if sum(option is not None for option in (at, poster, sheet_count)) != 1:
+        raise click.UsageError("Give exactly one of --at, --poster or --contact-sheet")
+
+    config, sentences, font_path, frame_config, pause_chars = _load_job(input_file, config_path)
+    index = timeline_index(sentences, config, frame_config, font_path, pause_chars)
+
+    if at is not None:
+        try:
+            seconds = parse_timestamp(at)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--at")
+        image = index.render_at(seconds)
+        logger.info(f"Frame {index.frame_index_at(seconds)} of {index.total_frames}")
+    elif poster is not None:
+        if not 1 <= poster <= len(sentences):
+            raise click.BadParameter(
+                f"must be between 1 and {len(sentences)}", param_hint="--poster"
+            )
+        image = index.render_poster(poster - 1)
+    else:
+        image = index.contact_sheet(sheet_count, columns=columns, thumb_width=thumb_width)
+
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    image_for_format(image, Path(output).suffix.lstrip(".")).save(output)
+    logger.info(f"Image saved to {output}")
+
+
+@cli.command()
+@click.argument("input_file", type=click.Path(exists=True, allow_dash=True))
+@click.option(
+    "-c",
+    "--config",
+    "config_path",
+    type=click.Path(exists=True),
+    help="Config file path",
+)
+@click.option(
+    "--calibrate",
+    "metrics_paths",
+    multiple=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help="Fit the cost model to runs recorded with render --metrics (repeatable)",
+)
+@click.option("--segments", is_flag=True, help="Also estimate each --work-dir/--queue segment")
+@click.option("--json", "as_json", is_flag=True, help="Print the plan as JSON")
+def plan(
+    input_file: str,
+    config_path: Optional[str],
+    metrics_paths: tuple[str, ...],
+    segments: bool,
+    as_json: bool,
+):
+    """Estimate the length, cost and resources of a render without rendering.
+
+    Prints duration, frame counts, ffmpeg spawns, peak memory and render
+    time. Neither ffmpeg nor the rendering libraries are used, so it is
+    quick to run before submitting jobs.
+    """
+    from src.planner import calibrate, format_plan, load_metrics, plan_render
+
+    config = resolve_config(load_config(config_path) if config_path else None)
+    parser = SentenceParser.from_config(config.get("parsing"))
+    with open_text(input_file) as f:
+        sentences = list(parser.iter_sentences(f))
+    if not sentences:
+        logger.error("Input text is empty")
+        raise SystemExit(1)
+
+    rates = calibrate(load_metrics(metrics_paths)) if metrics_paths else None
+    result = plan_render(
+        sentences, config, list(parser.sentence_pauses), rates, segmented=segments
+    )
+    click.echo(json.dumps(result, indent=2) if as_json else format_plan(result))
+
+
+@cli.command()
+@click.argument("queue_dir", type=click.Path(file_okay=False))
+@click.option("--wait", is_flag=True, help="Keep waiting for new jobs instead of exiting when the queue is done")
+@click.option("-v", "--verbose", is_flag=True, help="Enable verbose logging")
+def worker(queue_dir: str, wait: bool, verbose: bool):
+    """Render segments from a work queue published with render --queue.
+
+    Run any number of workers, on any machines that share QUEUE_DIR (and
+    see the fonts and sounds under the same absolute paths).
+    """
+    from src.distributed import run_worker
+
+    if verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+
+    verify_ffmpeg()
+    count = run_worker(queue_dir, wait=wait)
+    logger.info(f"Rendered {count} segments")
+
+
+def _render_image_sequence(
+    sentences: list[str],
+    config: dict,
+    frame_config: dict,
+    font_path: Optional[str],
+    sound_path: str,
+    pause_chars: list[str],
+    sequence_dir: str,
+) -> None:
+    from src.api import timeline_frames
+    from src.audio_builder import build_audio_track
+    from src.video_builder import export_image_sequence
+
+    sequence_config = config["video"].get("image_sequence", {})
+    Path(sequence_dir).mkdir(parents=True, exist_ok=True)
+
+    logger.info("Building audio track...")
+    build_audio_track(
+        sentences,
+        sound_path,
+        str(Path(sequence_dir) / "audio.wav"),
+        config["audio"],
+        pause_chars=pause_chars,
+    )
+
+    logger.info("Writing image sequence...")
+    frames = timeline_frames(sentences, config, frame_config, font_path, pause_chars)
+    count = export_image_sequence(
+        frames,
+        sequence_dir,
+        fps=config["video"]["fps"],
+        image_format=sequence_config.get("format", "png"),
+        mode=sequence_config.get("mode", "hardlink"),
+        workers=sequence_config.get("workers"),
+    )
+    logger.info(f"Wrote {count} frames to {sequence_dir}")
+
+
+def _render_checkpointed(
+    sentences: list[str],
+    config: dict,
+    frame_config: dict,
+    font_path: Optional[str],
+    pause_chars: list[str],
+    output: str,
+    work_dir: str,
+    resume: bool,
+) -> None:
+    """Render in sentence-aligned segments, checkpointing each to work_dir.
+
+    Each segment's audio (WAV) and video (video-only MP4) are written and
+    recorded in the manifest before the next one starts. With resume, the
+    leading segments that still verify are reused and rendering continues
+    from the first missing or invalid one.
+    """
+    from src.api import render_segment
+    from src.checkpoint import RenderCheckpoint, plan_segments, render_fingerprint
+    from src.video_builder import concat_segments, output_targets
+
+    fps = config["video"]["fps"]
+    segment_ms = config["video"].get("segment_seconds", 60) * 1000
+    segments = plan_segments(sentences, config["audio"], fps, pause_chars, segment_ms)
+
+    targets = output_targets(config["video"], output)
+    checkpoint = RenderCheckpoint(
+        work_dir,
+        render_fingerprint(sentences, config),
+        fps,
+        target_names=[target["name"] for target in targets],
+    )
+    start_index = 0
+    if resume and checkpoint.load():
+        start_index = checkpoint.resumable_prefix(segments)
+        logger.info(f"Resuming at segment {start_index + 1}/{len(segments)}")
+    checkpoint.discard_from(start_index)
+    checkpoint.save()
+
+    job = {
+        "config": config,
+        "sentences": sentences,
+        "font_path": font_path,
+        "frame_config": frame_config,
+        "pause_chars": pause_chars,
+    }
+    for segment in segments[start_index:]:
+        index = segment["index"]
+        logger.info(f"Rendering segment {index + 1}/{len(segments)}")
+
+        # Encode to partial files first so a crash never leaves a
+        # truncated segment under the final name.
+        segment_targets = [
+            {
+                **target,
+                "path": str(checkpoint.video_path(index, target["name"]).with_suffix(".partial.mp4")),
+            }
+            for target in targets
+        ]
+        frame_count = render_segment(
+            job, segment, str(checkpoint.audio_path(index)), segment_targets
+        )
+        for target, segment_target in zip(targets, segment_targets):
+            os.replace(segment_target["path"], checkpoint.video_path(index, target["name"]))
+        checkpoint.mark_done(segment, frame_count)
+
+    logger.info("Joining segments...")
+    for target in targets:
+        concat_segments(
+            [str(checkpoint.video_path(seg["index"], target["name"])) for seg in segments],
+            [str(checkpoint.audio_path(seg["index"])) for seg in segments],
+            target["path"],
+            config["video"],
+            work_dir,
+        )
+    checkpoint.remove()
+    logger.info(f"Video saved to {', '.join(target['path'] for target in targets)}")
 
 
 def main():
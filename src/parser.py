@@ -1,4 +1,17 @@
 import re
+import sys
+from contextlib import contextmanager
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Iterable, Iterator, Mapping, Optional
+
+DEFAULT_SENTENCE_ENDERS = ["。", "！", "？", ".", "!", "?"]
+DEFAULT_SENTENCE_PAUSES = ["，", "、", ","]
+
+# Character kinds used by the audio and frame builders
+CHAR_TEXT = 0
+CHAR_PUNCTUATION = 1
+CHAR_PAUSE = 2
 
 
 def is_punctuation(char: str) -> bool:
@@ -11,24 +24,118 @@ def is_pause_marker(char: str, pause_chars: list[str]) -> bool:
     return char in pause_chars
 
 
-def split_sentences(text: str) -> list[str]:
-    if not text.strip():
-        return []
+def build_char_table(pause_chars: Iterable[str] = DEFAULT_SENTENCE_PAUSES) -> dict[str, int]:
+    """Build a char -> CHAR_* lookup table of the configured pause markers.
+
+    Characters not in the table are classified by char_kind (memoized in
+    _default_kind, so the table itself is never modified); sentence enders
+    need no entry, being punctuation like any other.
+    """
+    table: dict[str, int] = {}
+    for char in pause_chars:
+        # A pause marker only pauses if it is also punctuation
+        if is_punctuation(char):
+            table[char] = CHAR_PAUSE
+    return table
+
+
+@lru_cache(maxsize=4096)
+def _default_kind(char: str) -> int:
+    return CHAR_PUNCTUATION if is_punctuation(char) else CHAR_TEXT
+
+
+def char_kind(char: str, table: Mapping[str, int]) -> int:
+    kind = table.get(char)
+    if kind is None:
+        kind = _default_kind(char)
+    return kind
+
+
+@lru_cache(maxsize=8)
+def _char_table_for(pause_chars: tuple[str, ...]) -> Mapping[str, int]:
+    return MappingProxyType(build_char_table(pause_chars))
+
+
+def get_char_table(pause_chars: Iterable[str]) -> Mapping[str, int]:
+    """Shared, read-only lookup table for the given pause markers (see build_char_table)."""
+    return _char_table_for(tuple(pause_chars))
+
+
+@lru_cache(maxsize=None)
+def _compile_sentence_pattern(sentence_enders: tuple[str, ...]) -> Optional[re.Pattern]:
+    if not sentence_enders:
+        return None
+    enders = "".join(re.escape(char) for char in sentence_enders)
+    return re.compile(f"[^{enders}]+[{enders}]?")
 
-    lines = text.split("\n")
-    sentences = []
 
-    for line in lines:
+class SentenceParser:
+    """Sentence splitter compiled once from config.
+
+    Sentences never span lines, so input is consumed one line at a time and
+    sentences are yielded as soon as their line has been read.
+    """
+
+    def __init__(
+        self,
+        sentence_enders: Optional[Iterable[str]] = None,
+        sentence_pauses: Optional[Iterable[str]] = None,
+    ):
+        self.sentence_enders = tuple(
+            DEFAULT_SENTENCE_ENDERS if sentence_enders is None else sentence_enders
+        )
+        self.sentence_pauses = tuple(
+            DEFAULT_SENTENCE_PAUSES if sentence_pauses is None else sentence_pauses
+        )
+        self._pattern = _compile_sentence_pattern(self.sentence_enders)
+
+    @classmethod
+    def from_config(cls, parsing_config: Optional[dict]) -> "SentenceParser":
+        parsing_config = parsing_config or {}
+        return cls(
+            parsing_config.get("sentence_enders"),
+            parsing_config.get("sentence_pauses"),
+        )
+
+    def split_line(self, line: str) -> list[str]:
         line = line.strip()
         if not line:
-            continue
-
-        pattern = r"[^。！？.!?]+[。！？.!?]?"
-        matches = re.findall(pattern, line)
+            return []
+        if self._pattern is None:
+            return [line]
 
-        for match in matches:
+        sentences = []
+        for match in self._pattern.findall(line):
             stripped = match.strip()
             if stripped:
                 sentences.append(stripped)
+        return sentences
+
+    def iter_sentences(self, lines: Iterable[str]) -> Iterator[str]:
+        for line in lines:
+            yield from self.split_line(line)
+
+    def split(self, text: str) -> list[str]:
+        if not text.strip():
+            return []
+        return list(self.iter_sentences(text.split("\n")))
+
+
+@lru_cache(maxsize=8)
+def _parser_for(sentence_enders: tuple[str, ...]) -> SentenceParser:
+    return SentenceParser(sentence_enders)
+
+
+def split_sentences(text: str, sentence_enders: Optional[list[str]] = None) -> list[str]:
+    enders = tuple(DEFAULT_SENTENCE_ENDERS if sentence_enders is None else sentence_enders)
+    return _parser_for(enders).split(text)
+
 
-    return sentences
+@contextmanager
+def open_text(path: str):
+    """Open a UTF-8 text file for line-by-line reading; "-" means stdin."""
+    if path == "-":
+        yield sys.stdin
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            yield f
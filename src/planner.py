@@ -0,0 +1,537 @@
+import copy
+import importlib.util
+import json
+import logging
+import os
+import socket
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Mapping, Optional
+
+from src.checkpoint import plan_segments
+from src.parser import CHAR_PAUSE, CHAR_TEXT, char_kind, get_char_table
+from src.sound_bank import SOUND_CLASSES, _as_list
+from src.timing import (
+    FrameRun,
+    RunStream,
+    iter_pause_runs,
+    iter_sentence_block_runs,
+    scroll_offset,
+)
+
+# Only the parser, the timing model and the standard library are used here
+# (no Pillow, PyAV, NumPy or ffmpeg), so that `sans-sub plan` starts fast.
+
+logger = logging.getLogger(__name__)
+
+METRICS_VERSION = 1
+
+# Cost model used until --metrics runs calibrate it (rough figures for a
+# desktop CPU with NVENC), per backend where it matters: seconds per
+# megapixel of each unique frame drawn, per megapixel of each frame encoded
+# (summed over the targets) and per audio clip; memory of the process and
+# of the encoder.
+DEFAULT_RATES = {
+    "render_seconds_per_mpx": {"cli": 0.003, "av": 0.003},
+    "encode_seconds_per_mpx": {"cli": 0.0006, "av": 0.0006},
+    "audio_seconds_per_clip": {"cli": 0.02, "av": 0.002},
+    "startup_seconds": 0.5,
+    "base_memory_mb": 120.0,
+    "encoder_memory_mb": 250.0,
+}
+
+
+def _available(module: str) -> bool:
+    """Whether module is installed, without importing it."""
+    return importlib.util.find_spec(module) is not None
+
+
+def resolve_backend(requested: Optional[str]) -> str:
+    """The backend av_backend.select_backend picks, found without importing PyAV."""
+    if (requested or "auto") == "cli":
+        return "cli"
+    return "av" if _available("av") and _available("numpy") else "cli"
+
+
+def _effect_frames(style: dict, fps: int) -> Optional[dict]:
+    """Frame lengths of the reveal effects that will be rendered (None: off)."""
+    effects = style.get("effects") or {}
+    if not (effects.get("fade_in_ms") or effects.get("cursor") or effects.get("gradient")):
+        return None
+    if not _available("numpy"):
+        return None  # rendered without effects, see effects.effects_enabled
+    return {
+        "fade": max(1, round(effects.get("fade_in_ms", 0) * fps / 1000)),
+        "blink": max(1, round(effects.get("cursor_blink_ms", 250) * fps / 1000))
+        if effects.get("cursor")
+        else None,
+        "gradient": bool(effects.get("gradient")),
+    }
+
+
+def _collect(runs: RunStream) -> tuple[list[FrameRun], float]:
+    collected = []
+    while True:
+        try:
+            collected.append(next(runs))
+        except StopIteration as stop:
+            return collected, stop.value
+
+
+def _covered(intervals: list[tuple[int, int]], end: int) -> int:
+    """Number of frames in [0, end) inside any of the [start, stop) intervals."""
+    covered = 0
+    reach = 0
+    for start, stop in sorted(intervals):
+        start, stop = max(start, reach), min(stop, end)
+        if stop > start:
+            covered += stop - start
+            reach = stop
+    return covered
+
+
+def _unique_frames(runs: list[FrameRun], effects: Optional[dict], scroll: list[int]) -> int:
+    """Frames of a block that differ from the one before, as the renderers draw them.
+
+    A change of draws makes one new frame (fade frames with a fade-in), a
+    blinking cursor one per toggle (its blink restarts with every run) and
+    a scrolling history layer one per change of its offset (scroll lists
+    the offsets, frame by frame, until the layer stops).
+    """
+    fade = effects["fade"] if effects else 1
+    blink = effects["blink"] if effects else None
+    intervals = [
+        (frame, frame + 1)
+        for frame in range(1, len(scroll))
+        if scroll[frame] != scroll[frame - 1]
+    ]
+    frame = 0
+    last_draws = None
+    cursor_off = False
+    for count, draws in runs:
+        if draws != last_draws:
+            intervals.append((frame, frame + fade))
+            last_draws = draws
+        elif cursor_off:
+            intervals.append((frame, frame + 1))
+        if blink:
+            cursor_off = ((count - 1) // blink) % 2 == 1
+            toggles = range(frame + blink, frame + count, blink)
+            intervals.extend((toggle, toggle + 1) for toggle in toggles)
+        frame += count
+    return _covered(intervals, frame)
+
+
+def _clip_count(
+    sentence: str, char_table: Mapping[str, int], pause_has_sound: bool, pause_after: bool
+) -> int:
+    """Number of clips audio_builder.schedule_clips makes of a sentence."""
+    clips = 0
+    after_char = False
+    for char in sentence:
+        kind = char_kind(char, char_table)
+        if kind == CHAR_TEXT or (kind == CHAR_PAUSE and pause_has_sound):
+            clips += 1
+            after_char = True
+        elif kind == CHAR_PAUSE and not after_char:
+            clips += 1  # silence; after a character the pause is absorbed
+    if pause_after and not after_char:
+        clips += 1
+    return clips
+
+
+def _sound_samples(audio: dict) -> tuple[list[str], bool]:
+    """(sample files, whether punctuation has its own), as load_sound_bank finds them."""
+    samples = [audio["typing_sound"]]
+    has_punctuation = False
+    bank = audio.get("sound_bank") or {}
+    for name in SOUND_CLASSES:
+        found = [path for path in _as_list(bank.get(name)) if os.path.exists(path)]
+        if found and name == "punctuation":
+            has_punctuation = True
+        samples.extend(path for path in found if path not in samples)
+    return samples, has_punctuation
+
+
+def _target_resolutions(video: dict) -> list[list[int]]:
+    """Resolutions of the encode targets, as video_builder.output_targets."""
+    outputs = video.get("outputs")
+    if not outputs:
+        return [list(video["resolution"])]
+    return [list(target.get("resolution", video["resolution"])) for target in outputs]
+
+
+def sentence_costs(sentences: list[str], config: dict, pause_chars: list[str]) -> list[dict]:
+    """Frames, unique frames and audio clips of each sentence with its pause.
+
+    Walks the same timing model as the renderers, so frame counts and
+    durations are exact; unique frames follow how each render path reuses
+    frames.
+    """
+    fps = config["video"]["fps"]
+    audio = config["audio"]
+    style = config["style"]
+    effects = _effect_frames(style, fps)
+    history = style.get("history") or {}
+    scroll_frames = max(0, round(history.get("scroll_ms", 200) * fps / 1000))
+    line_height = max(1, round(style["font_size"] * history.get("line_spacing", 1.25)))
+    offsets = [
+        scroll_offset(frame, scroll_frames, line_height) for frame in range(scroll_frames + 1)
+    ]
+    char_table = get_char_table(pause_chars)
+    _, pause_has_sound = _sound_samples(audio)
+
+    costs = []
+    elapsed_ms = 0.0
+    for index, sentence in enumerate(sentences):
+        pause_after = index < len(sentences) - 1
+        scroll = offsets if history.get("lines") and index > 0 else []
+        # Effects and history render a sentence and its pause as one layer;
+        # otherwise the pause frame is drawn on its own
+        joined = effects is not None or index > 0 and bool(history.get("lines"))
+        runs, elapsed_ms = _collect(
+            iter_sentence_block_runs(
+                sentence,
+                fps=fps,
+                character_duration_ms=audio["character_duration_ms"],
+                pause_chars=pause_chars,
+                character_pause_ms=audio.get("character_pause_ms", 200),
+                sentence_pause_ms=audio["sentence_pause_ms"],
+                elapsed_ms=elapsed_ms,
+                pause_after=pause_after and joined,
+            )
+        )
+        unique = _unique_frames(runs, effects, scroll)
+        frames = sum(count for count, _ in runs)
+        if pause_after and not joined:
+            pause, elapsed_ms = _collect(
+                iter_pause_runs(sentence, fps, audio["sentence_pause_ms"], elapsed_ms)
+            )
+            unique += 1
+            frames += sum(count for count, _ in pause)
+        costs.append(
+            {
+                "frames": frames,
+                "unique_frames": unique,
+                "audio_clips": _clip_count(sentence, char_table, pause_has_sound, pause_after),
+                "end_ms": elapsed_ms,
+            }
+        )
+    return costs
+
+
+def _video_seconds(work: dict, rates: dict, backend: str) -> float:
+    return (
+        work["render_mpx"] * rates["render_seconds_per_mpx"][backend]
+        + work["encode_mpx"] * rates["encode_seconds_per_mpx"][backend]
+    )
+
+
+def _estimate(
+    costs: list[dict],
+    config: dict,
+    rates: dict,
+    backends: dict,
+) -> dict:
+    """Work, ffmpeg spawns, memory and time of rendering costs in one process."""
+    video = config["video"]
+    width, height = video["resolution"]
+    targets = _target_resolutions(video)
+    frames = sum(cost["frames"] for cost in costs)
+    unique = sum(cost["unique_frames"] for cost in costs)
+    clips = sum(cost["audio_clips"] for cost in costs)
+
+    work = {
+        "render_mpx": unique * width * height / 1e6,
+        "encode_mpx": frames * sum(w * h for w, h in targets) / 1e6,
+        "audio_clips": clips,
+    }
+    audio_seconds = clips * rates["audio_seconds_per_clip"][backends["audio"]]
+    video_seconds = _video_seconds(work, rates, backends["video"])
+
+    # Audio: ffprobe, then one ffmpeg per clip and a concat on the CLI
+    spawns = 1 + (clips + 1 if backends["audio"] == "cli" else 0)
+    spawns += 1 if backends["video"] == "cli" else 0
+
+    gradient = (_effect_frames(config["style"], video["fps"]) or {}).get("gradient")
+    frame_mb = width * height * (3 if gradient else 1) / 2**20
+    # The prefetch queue holds at most memory_budget_mb, and never more
+    # than the unique frames; each frame is also converted for every target
+    frames_mb = min(video.get("memory_budget_mb", 256), unique * frame_mb)
+    frames_mb += frame_mb + width * height * 3 / 2**20
+    frames_mb += sum(w * h * 1.5 for w, h in targets) / 2**20
+    memory = {
+        "base": round(rates["base_memory_mb"], 1),
+        "frames": round(frames_mb, 1),
+        "encoder": round(rates["encoder_memory_mb"], 1),
+    }
+    return {
+        "frames": frames,
+        "unique_frames": unique,
+        "audio_clips": clips,
+        "work": work,
+        "ffmpeg_spawns": spawns,
+        "memory_mb": memory,
+        "peak_memory_mb": round(sum(memory.values())),
+        "audio_seconds": audio_seconds,
+        "video_seconds": video_seconds,
+        "render_seconds": rates["startup_seconds"] + audio_seconds + video_seconds,
+    }
+
+
+def plan_render(
+    sentences: list[str],
+    config: dict,
+    pause_chars: list[str],
+    rates: Optional[dict] = None,
+    segmented: bool = False,
+) -> dict:
+    """Size, cost and resources of rendering sentences with a resolved config.
+
+    rates is a cost model from calibrate (default: DEFAULT_RATES). With
+    segmented, the plan also lists the plan_segments segments a --work-dir
+    or --queue render would use, each estimated on its own, so a scheduler
+    can place them on nodes.
+    """
+    rates = rates or DEFAULT_RATES
+    video = config["video"]
+    backends = {
+        "audio": resolve_backend(config["audio"].get("backend")),
+        "video": resolve_backend(video.get("backend")),
+    }
+    costs = sentence_costs(sentences, config, pause_chars)
+    samples, _ = _sound_samples(config["audio"])
+
+    plan = {
+        "sentences": len(sentences),
+        "duration_ms": costs[-1]["end_ms"] if costs else 0.0,
+        "fps": video["fps"],
+        "resolution": list(video["resolution"]),
+        "targets": len(_target_resolutions(video)),
+        "backends": backends,
+        **_estimate(costs, config, rates, backends),
+        # Extra ffmpeg runs when the sample cache is cold
+        "sample_decodes": len(samples),
+        "calibration_runs": rates.get("runs", 0),
+    }
+    if segmented:
+        segments = plan_segments(
+            sentences,
+            config["audio"],
+            video["fps"],
+            pause_chars,
+            video.get("segment_seconds", 60) * 1000,
+        )
+        plan["segments"] = [
+            {
+                **segment,
+                **_estimate(
+                    costs[segment["first_sentence"]:segment["last_sentence"]],
+                    config,
+                    rates,
+                    backends,
+                ),
+            }
+            for segment in segments
+        ]
+        # Each segment is encoded on its own; joining runs ffmpeg per target
+        plan["segmented_ffmpeg_spawns"] = (
+            sum(segment["ffmpeg_spawns"] for segment in plan["segments"]) + plan["targets"]
+        )
+    return plan
+
+
+def load_metrics(paths: Iterable[str]) -> list[dict]:
+    """Records of past render --metrics runs (JSON lines; bad lines are skipped)."""
+    records = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict) and record.get("version") == METRICS_VERSION:
+                    records.append(record)
+    return records
+
+
+def _median(values: list[float]) -> Optional[float]:
+    return statistics.median(values) if values else None
+
+
+def calibrate(records: list[dict]) -> dict:
+    """DEFAULT_RATES fitted to measured renders.
+
+    Video time is the default render/encode model scaled, per video backend,
+    by the median ratio of measured to predicted time (the median over all
+    records for a backend without any). Audio time per clip, startup time
+    and the fixed memory (process and encoder, besides the frames) are
+    medians of the measured values.
+    """
+    rates = copy.deepcopy(DEFAULT_RATES)
+    rates["runs"] = len(records)
+    if not records:
+        return rates
+
+    scales = {"cli": [], "av": []}
+    for record in records:
+        plan = record["plan"]
+        predicted = _video_seconds(plan["work"], DEFAULT_RATES, plan["backends"]["video"])
+        if predicted > 0:
+            scales[plan["backends"]["video"]].append(record["video_seconds"] / predicted)
+    overall = _median(scales["cli"] + scales["av"])
+    for backend, measured in scales.items():
+        scale = _median(measured) or overall
+        if scale is not None:
+            rates["render_seconds_per_mpx"][backend] *= scale
+            rates["encode_seconds_per_mpx"][backend] *= scale
+
+    for backend in ("cli", "av"):
+        per_clip = _median(
+            [
+                record["audio_seconds"] / record["plan"]["audio_clips"]
+                for record in records
+                if record["plan"]["backends"]["audio"] == backend and record["plan"]["audio_clips"]
+            ]
+        )
+        if per_clip is not None:
+            rates["audio_seconds_per_clip"][backend] = per_clip
+
+    startup = _median(
+        [
+            max(0.0, record["wall_seconds"] - record["audio_seconds"] - record["video_seconds"])
+            for record in records
+        ]
+    )
+    if startup is not None:
+        rates["startup_seconds"] = startup
+
+    fixed = _median(
+        [
+            record["peak_memory_mb"] - record["plan"]["memory_mb"]["frames"]
+            for record in records
+            if record.get("peak_memory_mb") is not None
+        ]
+    )
+    if fixed is not None:
+        rates["base_memory_mb"] = max(0.0, fixed)
+        rates["encoder_memory_mb"] = 0.0
+    return rates
+
+
+def _peak_rss_mb(who: str) -> Optional[float]:
+    """Peak resident memory of this process ("self") or its largest child ("children")."""
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return None
+    usage = resource.getrusage(
+        resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN
+    ).ru_maxrss
+    # ru_maxrss is in bytes on macOS, kilobytes elsewhere
+    return usage / 2**20 if sys.platform == "darwin" else usage / 1024
+
+
+class RenderMetrics:
+    """Measurements of one render, appended to a --metrics file for calibrate."""
+
+    def __init__(self, plan: dict):
+        self.plan = plan
+        self.started = time.perf_counter()
+        self.seconds: dict[str, float] = {}
+        self.frames = 0
+        self.unique_frames = 0
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = time.perf_counter() - start
+
+    def count(self, frames: Iterable) -> Iterator:
+        """Pass frames through, counting them and the distinct (unique) ones."""
+        last = None
+        for frame in frames:
+            self.frames += 1
+            if frame is not last:
+                self.unique_frames += 1
+                last = frame
+            yield frame
+
+    def record(self) -> dict:
+        process_mb = _peak_rss_mb("self")
+        child_mb = _peak_rss_mb("children")
+        peak_mb = None
+        if process_mb is not None:
+            # An ffmpeg encoder runs beside this process
+            peak_mb = process_mb + (child_mb or 0.0)
+        return {
+            "version": METRICS_VERSION,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "host": socket.gethostname(),
+            "plan": {key: value for key, value in self.plan.items() if key != "segments"},
+            "frames": self.frames,
+            "unique_frames": self.unique_frames,
+            "audio_seconds": self.seconds.get("audio", 0.0),
+            "video_seconds": self.seconds.get("video", 0.0),
+            "wall_seconds": time.perf_counter() - self.started,
+            "peak_memory_mb": peak_mb,
+        }
+
+    def write(self, path: str) -> None:
+        """Append the record to path (one JSON object per line)."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.record()) + "\n")
+
+
+def _duration(seconds: float) -> str:
+    if round(seconds, 1) < 60:
+        return f"{seconds:.1f}s"
+    # Rounded before it is split, so 119.7s is 2m00s rather than 1m60s
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m{seconds:02d}s"
+    return f"{minutes}m{seconds:02d}s"
+
+
+def format_plan(plan: dict) -> str:
+    """The plan as a short human-readable report."""
+    width, height = plan["resolution"]
+    source = (
+        f"calibrated from {plan['calibration_runs']} run(s)"
+        if plan["calibration_runs"]
+        else "default cost model"
+    )
+    lines = [
+        f"Sentences:      {plan['sentences']}",
+        f"Duration:       {_duration(plan['duration_ms'] / 1000)}",
+        f"Frames:         {plan['frames']} at {plan['fps']} fps, {plan['unique_frames']} unique "
+        f"({width}x{height}, {plan['targets']} target(s))",
+        f"Audio clips:    {plan['audio_clips']}",
+        f"Backends:       audio {plan['backends']['audio']}, video {plan['backends']['video']}",
+        f"ffmpeg spawns:  {plan['ffmpeg_spawns']} "
+        f"(+{plan['sample_decodes']} with a cold sample cache)",
+        f"Peak memory:    ~{plan['peak_memory_mb']} MB",
+        f"Render time:    ~{_duration(plan['render_seconds'])} ({source})",
+    ]
+    if "segments" in plan:
+        lines.append(
+            f"Segments:       {len(plan['segments'])}, "
+            f"{plan['segmented_ffmpeg_spawns']} ffmpeg spawns in total"
+        )
+        for segment in plan["segments"]:
+            lines.append(
+                f"  {segment['index'] + 1:>4}  sentences {segment['first_sentence'] + 1}-"
+                f"{segment['last_sentence']}  {segment['frames']} frames  "
+                f"~{_duration(segment['render_seconds'])}  ~{segment['peak_memory_mb']} MB"
+            )
+    return "\n".join(lines)
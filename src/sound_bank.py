@@ -0,0 +1,235 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import subprocess
+import unicodedata
+import wave
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Optional
+
+from src.parser import is_punctuation
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_STORE_VERSION = 2
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "sans-subtitle-generator" / "samples"
+
+# Character classes that can have their own samples in audio.sound_bank
+SOUND_CLASSES = ("cjk", "latin", "digit", "punctuation")
+
+
+def char_class(char: str) -> Optional[str]:
+    """Sound class of a character (one of SOUND_CLASSES), or None."""
+    if is_punctuation(char):
+        return "punctuation"
+    if char.isdigit():
+        return "digit"
+    if unicodedata.east_asian_width(char) in ("W", "F"):
+        return "cjk"
+    if char.isalpha() and unicodedata.name(char, "").startswith("LATIN"):
+        return "latin"
+    return None
+
+
+def _decode_pcm(path: str, sample_rate: int, channels: int) -> bytes:
+    """Decode a sound file to interleaved s16le PCM at the given format."""
+    try:
+        with wave.open(path, "rb") as wav:
+            if (
+                wav.getsampwidth() == 2
+                and wav.getframerate() == sample_rate
+                and wav.getnchannels() == channels
+            ):
+                # Already in the store's format: no decoder needed
+                return wav.readframes(wav.getnframes())
+    except (OSError, EOFError, wave.Error):
+        pass
+
+    cmd = [
+        "ffmpeg",
+        "-v", "error",
+        "-i", path,
+        "-f", "s16le",
+        "-acodec", "pcm_s16le",
+        "-ar", str(sample_rate),
+        "-ac", str(channels),
+        "-",
+    ]
+    return subprocess.run(cmd, check=True, capture_output=True).stdout
+
+
+class SampleStore:
+    """Decoded samples in one raw s16le file, memory-mapped read-only.
+
+    Every process that opens the same store maps the same file, so the
+    decoded bank lives once in the page cache however many renders or
+    workers use it.
+    """
+
+    def __init__(self, pcm_path: Path, index: dict, names: Iterable[str]):
+        self.pcm_path = pcm_path
+        self.sample_rate = index["sample_rate"]
+        self.channels = index["channels"]
+        # The index lists spans in path order; names are the paths as given
+        # by the caller (the cache key only sees resolved paths)
+        self.samples: dict[str, tuple[int, int]] = {
+            name: tuple(span) for name, span in zip(names, index["samples"])
+        }
+        with open(pcm_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._map = b""
+
+    def __contains__(self, sample: str) -> bool:
+        return sample in self.samples
+
+    def pcm(self, sample: str) -> memoryview:
+        """PCM of a sample, as a view into the mapping (no copy)."""
+        offset, length = self.samples[sample]
+        return memoryview(self._map)[offset:offset + length]
+
+
+def _store_key(paths: tuple[str, ...], sample_rate: int, channels: int) -> str:
+    parts = [f"{SAMPLE_STORE_VERSION}:{sample_rate}:{channels}"]
+    for path in paths:
+        stat = Path(path).stat()
+        parts.append(f"{Path(path).resolve()}:{stat.st_size}:{stat.st_mtime_ns}")
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+@lru_cache(maxsize=8)
+def open_sample_store(
+    paths: tuple[str, ...],
+    sample_rate: int,
+    channels: int,
+    cache_dir: Optional[str] = None,
+) -> SampleStore:
+    """Decode paths once into a cached store and map it.
+
+    The store is keyed by the files' paths, sizes and mtimes and the
+    target format, so later renders (and other processes) only map it.
+    """
+    cache_path = Path(cache_dir) if cache_dir else DEFAULT_CACHE_DIR
+    key = _store_key(paths, sample_rate, channels)
+    pcm_path = cache_path / f"{key}.pcm"
+    index_path = cache_path / f"{key}.json"
+
+    try:
+        index = json.loads(index_path.read_text(encoding="utf-8"))
+        expected_size = sum(length for _, length in index["samples"])
+        if len(index["samples"]) == len(paths) and pcm_path.stat().st_size == expected_size:
+            return SampleStore(pcm_path, index, paths)
+    except (OSError, ValueError, KeyError):
+        pass
+
+    logger.debug(f"Decoding {len(paths)} samples into {pcm_path}")
+    cache_path.mkdir(parents=True, exist_ok=True)
+    index = {"sample_rate": sample_rate, "channels": channels, "samples": []}
+    temp_pcm = pcm_path.with_suffix(f".{os.getpid()}.tmp")
+    offset = 0
+    with open(temp_pcm, "wb") as f:
+        for path in paths:
+            pcm = _decode_pcm(path, sample_rate, channels)
+            f.write(pcm)
+            index["samples"].append([offset, len(pcm)])
+            offset += len(pcm)
+    os.replace(temp_pcm, pcm_path)
+    # The index is written last: a store is only used once both are complete
+    temp_index = index_path.with_suffix(f".{os.getpid()}.tmp")
+    temp_index.write_text(json.dumps(index), encoding="utf-8")
+    os.replace(temp_index, index_path)
+    return SampleStore(pcm_path, index, paths)
+
+
+def _as_list(value) -> list[str]:
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return list(value)
+
+
+class SoundBank:
+    """Typing samples per character class, with round-robin variants.
+
+    Each character is resolved to its class's variant list once and
+    memoized; successive characters of a class cycle through the variants.
+    Classes without samples use the default sound.
+    """
+
+    def __init__(self, store: SampleStore, variants: dict[str, list[str]], default: str):
+        self.store = store
+        self.variants = variants
+        self.default = default
+        self._table: dict[str, tuple[str, ...]] = {}
+        self._turns: dict[tuple[str, ...], int] = {}
+
+    @property
+    def sample_rate(self) -> int:
+        return self.store.sample_rate
+
+    @property
+    def channels(self) -> int:
+        return self.store.channels
+
+    def has_class(self, name: str) -> bool:
+        return bool(self.variants.get(name))
+
+    def samples_for(self, char: str) -> tuple[str, ...]:
+        samples = self._table.get(char)
+        if samples is None:
+            samples = tuple(self.variants.get(char_class(char), ())) or (self.default,)
+            self._table[char] = samples
+        return samples
+
+    def next_sample(self, char: str) -> str:
+        samples = self.samples_for(char)
+        if len(samples) == 1:
+            return samples[0]
+        turn = self._turns.get(samples, 0)
+        self._turns[samples] = turn + 1
+        return samples[turn % len(samples)]
+
+    def pcm(self, sample: str) -> memoryview:
+        return self.store.pcm(sample)
+
+
+def _existing(paths: Iterable[str]) -> list[str]:
+    found = []
+    for path in paths:
+        if Path(path).exists():
+            found.append(path)
+        else:
+            logger.warning(f"Sound file not found: {path}, skipping")
+    return found
+
+
+def load_sound_bank(
+    default_sound: str,
+    config: dict,
+    sample_rate: int,
+    channels: int,
+) -> SoundBank:
+    """Build the bank for config["sound_bank"] around default_sound.
+
+    All samples are converted to sample_rate/channels (the default sound's
+    format) so clips can be concatenated without resampling.
+    """
+    bank_config = config.get("sound_bank") or {}
+    variants = {}
+    for name in SOUND_CLASSES:
+        samples = _existing(_as_list(bank_config.get(name)))
+        if samples:
+            variants[name] = samples
+
+    paths = [default_sound]
+    for samples in variants.values():
+        paths.extend(sample for sample in samples if sample not in paths)
+    store = open_sample_store(
+        tuple(paths), sample_rate, channels, config.get("sample_cache_dir")
+    )
+    return SoundBank(store, variants, default_sound)
@@ -0,0 +1,241 @@
+import math
+from bisect import bisect_right
+from typing import Iterable, Optional
+
+from PIL import Image
+
+from src.effects import RevealLayer, effects_enabled
+from src.frame_generator import _draws_mask, _load_fonts, render_draws
+from src.history import HistoryLayer, history_lines
+from src.timing import iter_sentence_block_runs
+
+
+def parse_timestamp(value: str) -> float:
+    """Parse "754.2s", "754.2", "12:34.2" or "1:02:03" into seconds."""
+    text = value.strip().lower()
+    if text.endswith("s"):
+        text = text[:-1]
+    seconds = 0.0
+    try:
+        for part in text.split(":"):
+            seconds = seconds * 60 + float(part)
+    except ValueError:
+        raise ValueError(f"Invalid timestamp: {value!r}") from None
+    if seconds < 0:
+        raise ValueError(f"Invalid timestamp: {value!r}")
+    return seconds
+
+
+class TimelineIndex:
+    """Random access to the frames of a timeline without rendering it.
+
+    Building the index walks the timing model of iter_timeline_frames (no
+    drawing) and records where each sentence starts, in frames and on the
+    audio clock. Any frame can then be rendered by locating its sentence
+    with a bisect and replaying only that sentence's runs, so the frame at
+    12:34 costs the same as the first one.
+    """
+
+    def __init__(
+        self,
+        sentences: Iterable[str],
+        config: dict,
+        font_path: Optional[str] = None,
+        fps: int = 30,
+        character_duration_ms: int = 50,
+        pause_chars: Optional[list[str]] = None,
+        character_pause_ms: int = 200,
+        sentence_pause_ms: int = 500,
+    ):
+        self.sentences = list(sentences)
+        self.config = config
+        self.font_path = font_path
+        self.fps = fps
+        self.character_duration_ms = character_duration_ms
+        self.pause_chars = pause_chars
+        self.character_pause_ms = character_pause_ms
+        self.sentence_pause_ms = sentence_pause_ms
+
+        # First frame and starting elapsed_ms of each sentence
+        self.frame_starts: list[int] = []
+        self.elapsed_starts: list[float] = []
+        frame = 0
+        elapsed_ms = 0.0
+        for index in range(len(self.sentences)):
+            self.frame_starts.append(frame)
+            self.elapsed_starts.append(elapsed_ms)
+            runs = self._sentence_runs(index, elapsed_ms)
+            while True:
+                try:
+                    count, _ = next(runs)
+                except StopIteration as stop:
+                    elapsed_ms = stop.value
+                    break
+                frame += count
+        self.total_frames = frame
+        self.duration_ms = elapsed_ms
+
+        self._cached_sentence: Optional[int] = None
+        self._cached_runs: list[tuple[int, int, tuple[int, ...]]] = []
+        self._effects = effects_enabled(config)
+        self._layer: Optional[RevealLayer] = None
+        self._layer_sentence: Optional[int] = None
+        self._history_lines = history_lines(config)
+        self._history: Optional[HistoryLayer] = None
+        self._history_sentence: Optional[int] = None
+        self._strips: dict = {}
+
+    def _sentence_runs(self, index: int, elapsed_ms: float):
+        """Runs of a sentence and the pause after it, as iter_timeline_frames."""
+        return iter_sentence_block_runs(
+            self.sentences[index],
+            fps=self.fps,
+            character_duration_ms=self.character_duration_ms,
+            pause_chars=self.pause_chars,
+            character_pause_ms=self.character_pause_ms,
+            sentence_pause_ms=self.sentence_pause_ms,
+            elapsed_ms=elapsed_ms,
+            pause_after=index < len(self.sentences) - 1,
+        )
+
+    def _runs_of(self, index: int) -> list[tuple[int, int, tuple[int, ...]]]:
+        """(first_frame, frame_count, draws) of a sentence, kept for reuse."""
+        if self._cached_sentence != index:
+            runs = []
+            frame = self.frame_starts[index]
+            for count, draws in self._sentence_runs(index, self.elapsed_starts[index]):
+                runs.append((frame, count, draws))
+                frame += count
+            self._cached_sentence = index
+            self._cached_runs = runs
+        return self._cached_runs
+
+    def sentence_at(self, frame_index: int) -> int:
+        return bisect_right(self.frame_starts, frame_index) - 1
+
+    def frame_index_at(self, seconds: float) -> int:
+        """Index of the frame on screen at the given time, clamped to the video."""
+        # Small epsilon so e.g. 0.1s at 30fps lands on frame 3, not 2
+        index = math.floor(seconds * self.fps + 1e-6)
+        return min(max(index, 0), self.total_frames - 1)
+
+    def _history_of(self, index: int) -> Optional[HistoryLayer]:
+        """HistoryLayer of a sentence (None without history), kept for reuse."""
+        if not self._history_lines or index == 0:
+            return None
+        if self._history_sentence != index:
+            lines = self.sentences[max(0, index - self._history_lines):index]
+            fonts = _load_fonts(self.font_path, self.config)
+            self._history = HistoryLayer(self.config, lines, fonts, self.fps, self._strips)
+            self._history_sentence = index
+        return self._history
+
+    def _layer_of(self, index: int) -> RevealLayer:
+        """RevealLayer of a sentence, kept for reuse like its runs."""
+        if self._layer_sentence != index:
+            fonts = _load_fonts(self.font_path, self.config)
+            self._layer = RevealLayer(
+                self.config, self.sentences[index], fonts, self.fps, self._history_of(index)
+            )
+            self._layer_sentence = index
+        return self._layer
+
+    def _draws_at(self, frame_index: int) -> tuple[int, tuple]:
+        """(sentence_index, what is drawn): the run's draws, or its effect state.
+
+        With a history layer, draws are paired with the layer's scroll offset.
+        """
+        if not 0 <= frame_index < self.total_frames:
+            raise IndexError(f"Frame {frame_index} is outside 0..{self.total_frames - 1}")
+        sentence_index = self.sentence_at(frame_index)
+        runs = self._runs_of(sentence_index)
+        if self._effects:
+            return sentence_index, self._layer_of(sentence_index).seek(runs, frame_index)
+        starts = [start for start, _, _ in runs]
+        _, _, draws = runs[bisect_right(starts, frame_index) - 1]
+        history = self._history_of(sentence_index)
+        if history is not None:
+            return sentence_index, (draws, history.scroll(frame_index - starts[0]))
+        return sentence_index, draws
+
+    def segment_starts(self, segment_seconds: float) -> list[int]:
+        """First frames of sentence-aligned segments of at least segment_seconds.
+
+        A segment ends at the first sentence boundary once it is long
+        enough, like checkpoint.plan_segments; the last one may be shorter.
+        """
+        segment_frames = segment_seconds * self.fps
+        starts = [0]
+        for start in self.frame_starts[1:]:
+            if start - starts[-1] >= segment_frames:
+                starts.append(start)
+        return starts
+
+    def render_frame(self, frame_index: int) -> Image.Image:
+        """Render a single frame, identical to the one iter_timeline_frames yields."""
+        sentence_index, draws = self._draws_at(frame_index)
+        if self._effects:
+            return self._layer_of(sentence_index).compose(draws)
+        sentence = self.sentences[sentence_index]
+        history = self._history_of(sentence_index)
+        if history is not None:
+            draws, scroll = draws
+            fonts = _load_fonts(self.font_path, self.config) if draws else None
+            return history.compose(_draws_mask(self.config, sentence, draws, fonts), scroll)
+        fonts = _load_fonts(self.font_path, self.config) if draws else None
+        return render_draws(self.config, sentence, draws, fonts)
+
+    def render_at(self, seconds: float) -> Image.Image:
+        return self.render_frame(self.frame_index_at(seconds))
+
+    def poster_frame_index(self, sentence_index: int) -> int:
+        """Last frame of a sentence (with its pause), showing the whole sentence."""
+        if not 0 <= sentence_index < len(self.sentences):
+            raise IndexError(f"Sentence {sentence_index} is outside 0..{len(self.sentences) - 1}")
+        if sentence_index == len(self.sentences) - 1:
+            return self.total_frames - 1
+        return self.frame_starts[sentence_index + 1] - 1
+
+    def render_poster(self, sentence_index: int) -> Image.Image:
+        return self.render_frame(self.poster_frame_index(sentence_index))
+
+    def contact_sheet(
+        self,
+        count: int,
+        columns: int = 4,
+        thumb_width: int = 320,
+    ) -> Image.Image:
+        """Grid of count thumbnails taken at evenly spaced frames.
+
+        Frames are visited in timeline order, so each sentence's runs are
+        replayed once and frames with the same content are rendered once.
+        """
+        count = max(1, min(count, self.total_frames))
+        if count == 1:
+            indices = [0]
+        else:
+            step = (self.total_frames - 1) / (count - 1)
+            indices = [round(i * step) for i in range(count)]
+
+        width, height = self.config["resolution"]
+        thumb_height = max(1, round(height * thumb_width / width))
+        columns = max(1, min(columns, count))
+        rows = math.ceil(count / columns)
+        sheet = Image.new(
+            "RGB",
+            (columns * thumb_width, rows * thumb_height),
+            self.config["background_color"],
+        )
+
+        last_key = None
+        thumb = None
+        for position, frame_index in enumerate(indices):
+            key = self._draws_at(frame_index)
+            if key != last_key:
+                thumb = self.render_frame(frame_index).convert("RGB").resize(
+                    (thumb_width, thumb_height), Image.LANCZOS
+                )
+                last_key = key
+            row, column = divmod(position, columns)
+            sheet.paste(thumb, (column * thumb_width, row * thumb_height))
+        return sheet
@@ -0,0 +1,149 @@
+from typing import Generator, Optional
+
+from src.parser import CHAR_PAUSE, CHAR_TEXT, char_kind, get_char_table
+
+# The timing model shared by the audio track, the frame generators and the
+# planner. It needs nothing but the parser, so it can be used without
+# Pillow, PyAV or ffmpeg (see src.planner).
+
+# A run is (frame_count, draws): the same image shown for frame_count video
+# frames. draws lists prefix lengths of the text drawn, in order, onto a
+# fresh background; more than one entry means punctuation was drawn over the
+# frame of the preceding character.
+FrameRun = tuple[int, tuple[int, ...]]
+RunStream = Generator[FrameRun, None, float]
+
+
+def _advance(elapsed_ms: float, duration_ms: float, fps: int) -> tuple[int, float]:
+    """Advance the cumulative clock and return (frame_count, new_elapsed_ms)."""
+    frames_before = round(elapsed_ms * fps / 1000)
+    elapsed_ms += duration_ms
+    frames_after = round(elapsed_ms * fps / 1000)
+    return max(1, frames_after - frames_before), elapsed_ms
+
+
+def sentence_duration_ms(
+    sentence: str,
+    config: dict,
+    pause_chars: list[str] | None = None,
+) -> float:
+    """Duration of a sentence's clips, excluding the inter-sentence pause."""
+    if pause_chars is None:
+        pause_chars = ["，", "、", ","]
+
+    char_table = get_char_table(pause_chars)
+    char_duration_ms = config.get("character_duration_ms", 50)
+    character_pause_ms = config.get("character_pause_ms", 200)
+
+    duration_ms = 0.0
+    for char in sentence:
+        kind = char_kind(char, char_table)
+        if kind == CHAR_TEXT:
+            duration_ms += char_duration_ms
+        elif kind == CHAR_PAUSE:
+            duration_ms += character_pause_ms
+    return duration_ms
+
+
+def iter_sentence_runs(
+    sentence: str,
+    fps: int = 30,
+    character_duration_ms: int = 50,
+    pause_chars: Optional[list[str]] = None,
+    character_pause_ms: int = 200,
+    elapsed_ms: float = 0.0,
+) -> RunStream:
+    """Yield the frame runs of a sentence without rendering anything.
+
+    This is the timing model behind iter_sentence_frames; the generator
+    returns the updated elapsed_ms. Consecutive runs may share the same
+    draws (a held frame is emitted as a separate run once the next
+    character is known).
+    """
+    if pause_chars is None:
+        pause_chars = ["，", "、", ","]
+    char_table = get_char_table(pause_chars)
+
+    held: Optional[tuple[int, ...]] = None
+    for index, char in enumerate(sentence):
+        visible_length = index + 1
+        kind = char_kind(char, char_table)
+
+        if kind != CHAR_TEXT:
+            # Draw punctuation onto the held frame (or start the first one)
+            held = held + (visible_length,) if held else (visible_length,)
+
+            if kind == CHAR_PAUSE:
+                # Mirror audio_builder: absorb pause into preceding char's
+                # duration so the typing sound fades naturally into silence.
+                pause_frame_count, elapsed_ms = _advance(
+                    elapsed_ms, character_pause_ms, fps
+                )
+                yield pause_frame_count, held
+        else:
+            if held is not None:
+                yield 1, held
+
+            char_frame_count, elapsed_ms = _advance(
+                elapsed_ms, character_duration_ms, fps
+            )
+            if char_frame_count > 1:
+                yield char_frame_count - 1, (visible_length,)
+            held = (visible_length,)
+
+    if held is not None:
+        yield 1, held
+
+    return elapsed_ms
+
+
+def iter_pause_runs(
+    visible_text: str,
+    fps: int = 30,
+    pause_duration_ms: int = 500,
+    elapsed_ms: float = 0.0,
+) -> RunStream:
+    pause_frames_count, elapsed_ms = _advance(elapsed_ms, pause_duration_ms, fps)
+    yield pause_frames_count, (len(visible_text),) if visible_text else ()
+    return elapsed_ms
+
+
+def iter_sentence_block_runs(
+    sentence: str,
+    fps: int = 30,
+    character_duration_ms: int = 50,
+    pause_chars: Optional[list[str]] = None,
+    character_pause_ms: int = 200,
+    sentence_pause_ms: int = 500,
+    elapsed_ms: float = 0.0,
+    pause_after: bool = False,
+) -> RunStream:
+    """Runs of a sentence, then of the pause after it if pause_after."""
+    if sentence:
+        elapsed_ms = yield from iter_sentence_runs(
+            sentence,
+            fps=fps,
+            character_duration_ms=character_duration_ms,
+            pause_chars=pause_chars,
+            character_pause_ms=character_pause_ms,
+            elapsed_ms=elapsed_ms,
+        )
+    if pause_after:
+        elapsed_ms = yield from iter_pause_runs(
+            sentence,
+            fps=fps,
+            pause_duration_ms=sentence_pause_ms,
+            elapsed_ms=elapsed_ms,
+        )
+    return elapsed_ms
+
+
+def scroll_offset(frame: int, scroll_frames: int, line_height: int) -> int:
+    """Offset in pixels (down) of a scrolling history layer, frame frames in.
+
+    The layer eases out, up by one line height, over scroll_frames frames.
+    """
+    if frame >= scroll_frames:
+        return 0
+    remaining = 1 - (frame + 1) / (scroll_frames + 1)
+    return round(line_height * remaining * remaining)
@@ -1,16 +1,259 @@
+import os
+import shutil
 import subprocess
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 from PIL import Image
-from typing import Iterator
+from typing import Iterable, Iterator, Optional
 
-def assemble_video_stream(
-    frames_iterator: Iterator[Image.Image],
-    audio_path: str,
-    output_path: str,
+# Upper bound for the buffers in a single writev() call (POSIX guarantees
+# at least 16)
+try:
+    IOV_MAX = os.sysconf("SC_IOV_MAX")
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 16
+# Keep each writev() well under the kernel's ~2 GiB per-call limit
+WRITEV_MAX_BYTES = 256 * 1024 * 1024
+FRAGMENTED_MOVFLAGS = "frag_keyframe+empty_moov+default_base_moof"
+# Playlist/manifest written into the directory of a live (segmented) output
+LIVE_PLAYLISTS = {"hls": "index.m3u8", "dash": "manifest.mpd"}
+# Encoder settings shared by the ffmpeg CLI and the PyAV backend (hardware
+# acceleration using nvenc; p4 is medium/good balance, cq the constant
+# quality target)
+VIDEO_CODEC = "h264_nvenc"
+VIDEO_CODEC_OPTIONS = {"preset": "p4", "cq": "23"}
+AUDIO_CODEC = "aac"
+AUDIO_BITRATE = "128k"
+
+
+class EncoderError(RuntimeError):
+    """Encoding failed.
+
+    path and stage (e.g. "open", "video encode") say where, when known;
+    errno and log carry libav's error code and last log message from the
+    PyAV backend.
+    """
+
+    def __init__(
+        self,
+        message: str,
+        path: Optional[str] = None,
+        stage: Optional[str] = None,
+        errno: Optional[int] = None,
+        log: Optional[str] = None,
+    ):
+        super().__init__(message)
+        self.path = path
+        self.stage = stage
+        self.errno = errno
+        self.log = log
+
+
+def enlarge_pipe(fd: int, size: int) -> int:
+    """Raise a pipe's capacity with F_SETPIPE_SZ (Linux only).
+
+    Returns the resulting capacity, or 0 if it could not be changed. Sizes
+    above /proc/sys/fs/pipe-max-size are refused for unprivileged users, in
+    which case the default capacity is kept.
+    """
+    try:
+        import fcntl
+    except ImportError:  # Windows
+        return 0
+    set_size = getattr(fcntl, "F_SETPIPE_SZ", None)
+    if set_size is None:
+        return 0
+    try:
+        return fcntl.fcntl(fd, set_size, size)
+    except OSError:
+        return 0
+
+
+def frame_buffer(frame: Image.Image) -> memoryview:
+    """Packed rgb24 bytes of a frame (converted to RGB and copied out once).
+
+    The memoryview lets _write_repeated slice it after a partial write
+    without copying again.
+    """
+    if frame.mode != "RGB":
+        frame = frame.convert("RGB")
+    return memoryview(frame.tobytes())
+
+
+def _write_repeated(fd: int, buffer: memoryview, count: int) -> None:
+    """Write buffer count times, batching repeats into writev() calls."""
+    if not hasattr(os, "writev"):  # Windows
+        for _ in range(count):
+            _write_all(fd, buffer)
+        return
+
+    while count:
+        batch = min(count, IOV_MAX, max(1, WRITEV_MAX_BYTES // len(buffer)))
+        written = os.writev(fd, [buffer] * batch)
+        count -= batch
+        expected = len(buffer) * batch
+        if written < expected:
+            # Partial write: finish the interrupted copy, then requeue the
+            # copies that were not started.
+            whole, partial = divmod(written, len(buffer))
+            _write_all(fd, buffer[partial:])
+            count += batch - whole - 1
+
+
+def _write_all(fd: int, buffer: memoryview) -> None:
+    while buffer:
+        written = os.write(fd, buffer)
+        buffer = buffer[written:]
+
+
+def write_frames(fd: int, frames: Iterable[Image.Image]) -> int:
+    """Write frames to an unbuffered descriptor and return the frame count.
+
+    Frame generators yield held frames as the same Image object repeatedly,
+    so each run of identical frames is converted to bytes once and written
+    with as few syscalls as possible.
+    """
+    total = 0
+    current: Optional[Image.Image] = None
+    run = 0
+    for frame in frames:
+        total += 1
+        if frame is current:
+            run += 1
+            continue
+        if current is not None:
+            _write_repeated(fd, frame_buffer(current), run)
+        current, run = frame, 1
+
+    if current is not None:
+        _write_repeated(fd, frame_buffer(current), run)
+    return total
+
+
+def output_targets(config: dict, output_path: str) -> list[dict]:
+    """Resolve config["outputs"] into encode targets.
+
+    Without "outputs" there is a single target at output_path with the
+    render resolution. Each entry may set "name", "path", "resolution" and
+    "crop" ([w, h, x, y] in render pixels, applied before scaling); a
+    target without "path" is written next to output_path as
+    <stem>_<name><suffix>.
+    """
+    render_resolution = list(config.get("resolution", [1920, 1080]))
+    outputs = config.get("outputs")
+    if not outputs:
+        _check_even("resolution", render_resolution)
+        return [{"name": "", "path": output_path, "resolution": render_resolution}]
+
+    base = Path(output_path)
+    targets = []
+    for target in outputs:
+        resolution = list(target.get("resolution", render_resolution))
+        name = str(target.get("name", f"{resolution[0]}x{resolution[1]}"))
+        path = target.get("path") or str(base.with_name(f"{base.stem}_{name}{base.suffix}"))
+        targets.append(
+            {
+                "name": name,
+                "path": path,
+                "resolution": resolution,
+                "crop": target.get("crop"),
+            }
+        )
+
+    names = [target["name"] for target in targets]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Output target names must be unique: {names}")
+    for target in targets:
+        _check_even(f"{target['name']} resolution", target["resolution"])
+        if target["crop"]:
+            _check_even(f"{target['name']} crop", target["crop"][:2])
+    return targets
+
+
+def _check_even(what: str, size: list[int]) -> None:
+    """yuv420p (and so libx264/NVENC) needs a positive, even width and height."""
+    width, height = size
+    if width <= 0 or height <= 0 or width % 2 or height % 2:
+        raise ValueError(f"Output {what} must be even, got {width}x{height}")
+
+
+def _target_filter(target: dict, render_resolution: list[int]) -> list[str]:
+    steps = []
+    source = list(render_resolution)
+    crop = target.get("crop")
+    if crop:
+        w, h, x, y = crop
+        steps.append(f"crop={w}:{h}:{x}:{y}")
+        source = [w, h]
+    if list(target["resolution"]) != source:
+        width, height = target["resolution"]
+        steps.append(f"scale={width}:{height}")
+    return steps
+
+
+def live_output_args(directory: str, live: dict, fps: int) -> list[str]:
+    """Output options writing a growing HLS/DASH segment set into directory.
+
+    Keyframes are forced at live["segment_starts"] (frame indices) and
+    suppressed everywhere else, so the segmenter can only cut there.
+    Segments are therefore sentence-aligned when the starts are.
+    """
+    live_format = live.get("format", "hls")
+    if live_format not in LIVE_PLAYLISTS:
+        raise ValueError(f"Unknown live format: {live_format} (expected hls or dash)")
+    starts = [start for start in live.get("segment_starts", []) if start > 0]
+    # Half a frame early, so rounding never pushes a keyframe to the next frame
+    times = ",".join(f"{(start - 0.5) / fps:.6f}" for start in starts)
+    # Every boundary is at least segment_seconds apart; any shorter minimum
+    # makes the segmenter cut at each forced keyframe and nowhere else
+    min_seconds = f"{live.get('segment_seconds', 6) / 2:g}"
+
+    args = ["-g", str(2**31 - 1), "-sc_threshold", "0", "-forced-idr", "1"]
+    if times:
+        args += ["-force_key_frames", times]
+
+    if live_format == "hls":
+        return args + [
+            "-f", "hls",
+            "-hls_time", min_seconds,
+            "-hls_list_size", "0",
+            "-hls_playlist_type", "event",
+            # Segments and playlist are renamed into place when complete
+            "-hls_flags", "temp_file+independent_segments",
+            "-hls_segment_filename", str(Path(directory) / "segment_%05d.ts"),
+            str(Path(directory) / LIVE_PLAYLISTS["hls"]),
+        ]
+    return args + [
+        "-f", "dash",
+        "-seg_duration", min_seconds,
+        "-use_template", "1",
+        "-use_timeline", "1",
+        "-window_size", "0",
+        "-init_seg_name", "init_$RepresentationID$.m4s",
+        "-media_seg_name", "chunk_$RepresentationID$_$Number%05d$.m4s",
+        str(Path(directory) / LIVE_PLAYLISTS["dash"]),
+    ]
+
+
+def build_encode_command(
+    audio_path: Optional[str],
+    targets: list[dict],
     config: dict,
-) -> str:
+    live: Optional[dict] = None,
+) -> list[str]:
+    """ffmpeg command reading rgb24 frames from stdin and encoding every target.
+
+    Frames are decoded once; with several targets the stream is fanned out
+    with split and each branch is cropped/scaled before its own encoder.
+    With live ({"format", "segment_seconds", "segment_starts"}) each target
+    path is a directory that receives HLS/DASH segments and a playlist.
+    """
     fps = config.get("fps", 30)
     resolution = config.get("resolution", [1920, 1080])
+    output_format = config.get("format")
 
     cmd = [
         "ffmpeg",
@@ -22,32 +265,100 @@ def assemble_video_stream(
         "-pix_fmt", "rgb24",
         "-r", str(fps),
         "-i", "-",  # Read frames from standard input
-        
-        # Audio input
-        "-i", audio_path,
-        
-        # Video encoding settings (Hardware acceleration using nvenc)
-        "-c:v", "h264_nvenc",
-        "-preset", "p4",        # NVENC preset (p4 is medium/good balance)
-        "-cq", "23",            # NVENC constant quality target
-        
-        # Audio encoding settings
-        "-c:a", "aac",
-        "-b:a", "128k",
-        
-        # Output settings
-        "-pix_fmt", "yuv420p",
-        "-shortest",
-        output_path,
     ]
+    if audio_path:
+        cmd += ["-i", audio_path]
+
+    filters = [_target_filter(target, resolution) for target in targets]
+    video_maps: list[Optional[str]] = [None]
+    if len(targets) > 1 or filters[0]:
+        graph = []
+        if len(targets) > 1:
+            branches = "".join(f"[s{i}]" for i in range(len(targets)))
+            graph.append(f"[0:v]split={len(targets)}{branches}")
+        video_maps = []
+        for i, steps in enumerate(filters):
+            source = f"[s{i}]" if len(targets) > 1 else "[0:v]"
+            if steps:
+                graph.append(f"{source}{','.join(steps)}[v{i}]")
+                video_maps.append(f"[v{i}]")
+            else:
+                video_maps.append(source)
+        cmd += ["-filter_complex", ";".join(graph)]
+
+    for target, video_map in zip(targets, video_maps):
+        if video_map:
+            cmd += ["-map", video_map]
+            if audio_path:
+                cmd += ["-map", "1:a:0"]
+
+        # Video encoding settings
+        cmd += ["-c:v", VIDEO_CODEC]
+        for option, value in VIDEO_CODEC_OPTIONS.items():
+            cmd += [f"-{option}", value]
+        if audio_path:
+            # Audio encoding settings
+            cmd += ["-c:a", AUDIO_CODEC, "-b:a", AUDIO_BITRATE]
+
+        cmd += [
+            # Output settings
+            "-pix_fmt", "yuv420p",
+            "-shortest",
+        ]
+        if live:
+            cmd += live_output_args(target["path"], live, fps)
+            continue
+        if config.get("fragmented"):
+            # Fragmented MP4: playable while it is still being written, and
+            # needs no seeking, so it can be written to a pipe
+            cmd += ["-movflags", FRAGMENTED_MOVFLAGS]
+        if output_format:
+            # "null" selects ffmpeg's null muxer (used by the benchmarks)
+            cmd += ["-f", output_format]
+        cmd.append(target["path"])
+
+    return cmd
+
+
+def assemble_video_stream(
+    frames_iterator: Iterator[Image.Image],
+    audio_path: Optional[str],
+    output_path: str,
+    config: dict,
+    targets: Optional[list[dict]] = None,
+    live: Optional[dict] = None,
+) -> list[str]:
+    """Encode frames (and audio_path, if given) into every output target.
+
+    targets defaults to output_targets(config, output_path). All targets are
+    encoded from a single pass over the frames: in-process with PyAV when
+    config["backend"] selects it (the default when PyAV is installed),
+    otherwise by one ffmpeg process. With live (see build_encode_command)
+    targets are directories that are playable while encoding runs; live
+    output always uses ffmpeg. Returns the written paths.
+    """
+    # src.av_backend builds on this module, so it is imported here
+    from src.av_backend import encode_with_av, select_backend
 
-    # Open subprocess with stdin piped
-    process = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+    if targets is None:
+        targets = output_targets(config, output_path)
+    if not live and select_backend(config.get("backend")) == "av":
+        encode_with_av(frames_iterator, audio_path, targets, config)
+        return [target["path"] for target in targets]
+
+    if live:
+        for target in targets:
+            Path(target["path"]).mkdir(parents=True, exist_ok=True)
+    cmd = build_encode_command(audio_path, targets, config, live)
+
+    # Open subprocess with an unbuffered stdin pipe; frames are written
+    # straight to its descriptor.
+    process = subprocess.Popen(cmd, stdin=subprocess.PIPE, bufsize=0)
+    enlarge_pipe(process.stdin.fileno(), config.get("pipe_buffer_kb", 1024) * 1024)
 
     try:
         # Stream frames directly to ffmpeg
-        for frame in frames_iterator:
-            process.stdin.write(frame.convert("RGB").tobytes())
+        write_frames(process.stdin.fileno(), frames_iterator)
     except Exception as e:
         process.stdin.close()
         process.terminate()
@@ -58,6 +369,240 @@ def assemble_video_stream(
     process.wait()
 
     if process.returncode != 0:
-        raise RuntimeError("FFmpeg encoding failed.")
+        raise EncoderError("FFmpeg encoding failed.")
+
+    return [target["path"] for target in targets]
+
+
+def iter_encoded_stream(
+    frames_iterator: Iterator[Image.Image],
+    audio_path: Optional[str],
+    config: dict,
+    chunk_size: int = 64 * 1024,
+) -> Iterator[bytes]:
+    """Encode frames (and audio_path) as fragmented MP4 and yield its bytes.
+
+    Nothing is written to disk: ffmpeg muxes to its stdout while frames are
+    fed to its stdin from a writer thread. Closing the iterator early stops
+    the encode.
+    """
+    stream_config = {**config, "format": "mp4", "fragmented": True}
+    target = {
+        "name": "",
+        "path": "pipe:1",
+        "resolution": list(config.get("resolution", [1920, 1080])),
+    }
+    cmd = build_encode_command(audio_path, [target], stream_config)
+    cmd[1:1] = ["-loglevel", "error"]
+
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr, bufsize=0
+        )
+        enlarge_pipe(process.stdin.fileno(), config.get("pipe_buffer_kb", 1024) * 1024)
+        writer_error: list[BaseException] = []
+
+        def feed():
+            try:
+                write_frames(process.stdin.fileno(), frames_iterator)
+            except BrokenPipeError:
+                pass  # ffmpeg exited; its return code tells why
+            except BaseException as e:
+                writer_error.append(e)
+            finally:
+                process.stdin.close()
+
+        writer = threading.Thread(target=feed, daemon=True)
+        writer.start()
+        finished = False
+        try:
+            while True:
+                chunk = process.stdout.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+            finished = True
+        finally:
+            if not finished:
+                # The consumer stopped early (or failed)
+                process.kill()
+            process.stdout.close()
+            writer.join()
+            process.wait()
+
+        if writer_error:
+            raise writer_error[0]
+        if process.returncode != 0:
+            stderr.seek(0)
+            message = stderr.read().decode("utf-8", "replace").strip()
+            raise EncoderError(f"FFmpeg encoding failed: {message}", log=message)
+
+
+# Fast, lossless encoder settings per image format
+IMAGE_SAVE_OPTIONS = {
+    "png": {"compress_level": 1},
+    "webp": {"lossless": True, "method": 0, "quality": 0},
+}
+
+# Formats that can hold the palette frames as they are
+PALETTE_FORMATS = ("png", "webp")
+
+
+def image_for_format(image: Image.Image, image_format: str) -> Image.Image:
+    """image, expanded through its palette for formats (e.g. JPEG) without one."""
+    if image.mode == "P" and image_format.lower() not in PALETTE_FORMATS:
+        return image.convert("RGB")
+    return image
+
+
+def save_frames(frames: Iterable[Image.Image], output_dir: str, prefix: str = "frame") -> None:
+    """Write frames as sequentially numbered PNGs (prefix_%06d.png)."""
+    export_image_sequence(frames, output_dir, fps=30, prefix=prefix)
+
+
+def _save_run(
+    frame: Image.Image,
+    output_dir: Path,
+    prefix: str,
+    image_format: str,
+    first_index: int,
+    count: int,
+    mode: str,
+) -> None:
+    extension = image_format.lower()
+    first_path = output_dir / f"{prefix}_{first_index:06d}.{extension}"
+    image_for_format(frame, extension).save(
+        first_path, format=image_format.upper(), **IMAGE_SAVE_OPTIONS.get(extension, {})
+    )
+
+    if mode != "hardlink":
+        return
+    for index in range(first_index + 1, first_index + count):
+        link_path = output_dir / f"{prefix}_{index:06d}.{extension}"
+        link_path.unlink(missing_ok=True)
+        try:
+            os.link(first_path, link_path)
+        except OSError:
+            # Filesystem without hardlinks: fall back to a byte copy, which
+            # is still far cheaper than compressing the frame again.
+            shutil.copyfile(first_path, link_path)
+
+
+def export_image_sequence(
+    frames: Iterable[Image.Image],
+    output_dir: str,
+    fps: int = 30,
+    prefix: str = "frame",
+    image_format: str = "png",
+    mode: str = "hardlink",
+    workers: Optional[int] = None,
+) -> int:
+    """Write frames as an image sequence, compressing only unique frames.
+
+    Held frames (the same Image object yielded repeatedly) are compressed
+    once on a thread pool; Pillow releases the GIL while encoding. With
+    mode "hardlink" every frame index gets a file, repeats being hardlinks
+    to the first one. With mode "manifest" only unique frames are written
+    and <prefix>.ffconcat records how long each is shown. At most a few
+    frames per worker are held in memory. Returns the frame count.
+    """
+    if mode not in ("hardlink", "manifest"):
+        raise ValueError(f"Unknown image sequence mode: {mode}")
+
+    out = Path(output_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    extension = image_format.lower()
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+
+    pending: deque[Future] = deque()
+    runs: list[tuple[int, int]] = []
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+
+        def submit(frame: Image.Image, first_index: int, count: int) -> None:
+            while len(pending) >= max_in_flight:
+                pending.popleft().result()
+            pending.append(
+                pool.submit(_save_run, frame, out, prefix, extension, first_index, count, mode)
+            )
+            runs.append((first_index, count))
+
+        total = 0
+        current: Optional[Image.Image] = None
+        first_index = 0
+        for frame in frames:
+            if frame is not current:
+                if current is not None:
+                    submit(current, first_index, total - first_index)
+                current, first_index = frame, total
+            total += 1
+        if current is not None:
+            submit(current, first_index, total - first_index)
+
+        while pending:
+            pending.popleft().result()
+
+    if mode == "manifest":
+        manifest = out / f"{prefix}.ffconcat"
+        with open(manifest, "w", encoding="utf-8") as f:
+            f.write("ffconcat version 1.0\n")
+            for first, count in runs:
+                f.write(f"file '{prefix}_{first:06d}.{extension}'\n")
+                f.write(f"duration {count / fps:.6f}\n")
+            if runs:
+                # The concat demuxer ignores the last entry's duration
+                # unless the file is listed once more.
+                f.write(f"file '{prefix}_{runs[-1][0]:06d}.{extension}'\n")
+
+    return total
+
+
+def _write_concat_list(paths: list[str], list_path: Path) -> None:
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path in paths:
+            escaped = str(Path(path).resolve()).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+
+def concat_segments(
+    video_paths: list[str],
+    audio_paths: list[str],
+    output_path: str,
+    config: dict,
+    work_dir: str,
+) -> str:
+    """Join video-only segments and their WAV tracks into output_path.
+
+    Video is stream-copied; audio is concatenated losslessly and encoded to
+    AAC once, so no encoder padding is introduced at segment boundaries.
+    """
+    output_format = config.get("format")
+    stem = Path(output_path).stem
+    video_list = Path(work_dir) / f"{stem}.video.txt"
+    audio_list = Path(work_dir) / f"{stem}.audio.txt"
+    _write_concat_list(video_paths, video_list)
+    _write_concat_list(audio_paths, audio_list)
+
+    cmd = [
+        "ffmpeg",
+        "-y",
+        "-f", "concat", "-safe", "0", "-i", str(video_list),
+        "-f", "concat", "-safe", "0", "-i", str(audio_list),
+        "-map", "0:v:0",
+        "-map", "1:a:0",
+        "-c:v", "copy",
+        "-c:a", AUDIO_CODEC,
+        "-b:a", AUDIO_BITRATE,
+        "-shortest",
+    ]
+    if output_format:
+        cmd += ["-f", output_format]
+    cmd.append(output_path)
+
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        log = result.stderr.strip()[-500:]
+        raise EncoderError(f"FFmpeg concat failed: {log}", path=output_path, stage="concat", log=log)
 
     return output_path
@@ -0,0 +1,37 @@
+import io
+
+import pytest
+
+from src import api
+from src.api import RenderError, iter_render, prepare_job
+
+
+def test_prepare_job_from_text():
+    job = prepare_job("Hello, world. Again!", {"video": {"resolution": [320, 180]}})
+    assert job["sentences"] == ["Hello, world.", "Again!"]
+    assert job["frame_config"]["resolution"] == [320, 180]
+    assert job["frame_config"]["font_size"] == 48
+    assert job["config"]["video"]["fps"] == 30
+
+
+def test_prepare_job_from_stream():
+    job = prepare_job(io.StringIO("One.\nTwo!\n"))
+    assert job["sentences"] == ["One.", "Two!"]
+
+
+def test_prepare_job_empty():
+    with pytest.raises(RenderError):
+        prepare_job("  \n")
+
+
+def test_iter_render_without_ffmpeg(monkeypatch):
+    monkeypatch.setattr(api, "check_ffmpeg", lambda: False)
+    with pytest.raises(RenderError, match="ffmpeg"):
+        iter_render("Hello.")
+
+
+def test_iter_render_missing_sound(monkeypatch, tmp_path):
+    monkeypatch.setattr(api, "check_ffmpeg", lambda: True)
+    config = {"audio": {"typing_sound": str(tmp_path / "missing.wav")}}
+    with pytest.raises(RenderError, match="Sound file not found"):
+        iter_render("Hello.", config)
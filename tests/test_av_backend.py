@@ -0,0 +1,120 @@
+import wave
+
+import pytest
+from PIL import Image
+
+from src import av_backend
+from src.audio_builder import schedule_clips
+from src.av_backend import select_backend
+from src.sound_bank import load_sound_bank
+from src.video_builder import EncoderError
+
+
+def _write_wav(path, frames, sample_rate=8000, channels=1):
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(frames)
+    return str(path)
+
+
+class TestSelectBackend:
+    def test_explicit_cli(self):
+        assert select_backend("cli") == "cli"
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            select_backend("gstreamer")
+
+    def test_falls_back_without_pyav(self, monkeypatch):
+        monkeypatch.setattr(av_backend, "av", None)
+        assert select_backend(None) == "cli"
+        assert select_backend("av") == "cli"
+
+    def test_auto_choice_is_logged(self, monkeypatch, caplog):
+        monkeypatch.setattr(av_backend, "av", None)
+        av_backend._log_auto_backend.cache_clear()
+        with caplog.at_level("INFO", logger="src.av_backend"):
+            select_backend("auto")
+            select_backend("cli")
+        assert [record.message for record in caplog.records] == [
+            "Encoding with the ffmpeg CLI (backend: auto; PyAV is not installed)"
+        ]
+
+
+requires_av = pytest.mark.skipif(av_backend.av is None, reason="PyAV not installed")
+
+
+@pytest.fixture
+def x264(monkeypatch):
+    """Software H.264 in place of NVENC, which needs a GPU."""
+    monkeypatch.setattr(av_backend, "VIDEO_CODEC", "libx264")
+    monkeypatch.setattr(av_backend, "VIDEO_CODEC_OPTIONS", {"preset": "ultrafast"})
+
+
+@requires_av
+def test_auto_prefers_pyav():
+    assert select_backend("auto") == "av"
+
+
+@requires_av
+def test_audio_track_has_scheduled_length(tmp_path):
+    import numpy as np
+
+    sound = _write_wav(tmp_path / "tick.wav", b"\x00\x10" * 400)
+    bank = load_sound_bank(sound, {"sample_cache_dir": str(tmp_path / "cache")}, 8000, 1)
+    config = {
+        "character_duration_ms": 50,
+        "character_pause_ms": 100,
+        "sentence_pause_ms": 200,
+        "pitch_variation": {"min": 1.1, "max": 1.1, "random": False},
+    }
+    clips = list(schedule_clips(["ab，c", "d"], bank, config, ["，"]))
+    assert [clip["duration"] for clip in clips] == [50, 150, 250, 50]
+    assert {clip["pitch"] for clip in clips} == {1.1}
+
+    output = str(tmp_path / "audio.wav")
+    av_backend.write_audio_track(clips, bank, output, 8000, 1)
+    with wave.open(output, "rb") as wav:
+        assert wav.getnframes() == 8000 * 500 // 1000
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+    # Each clip fades out to silence before the next one starts
+    assert samples[:40].any()
+    assert not samples[390:400].any()
+
+
+@requires_av
+def test_encodes_every_frame_with_explicit_pts(tmp_path, x264):
+    import av
+
+    black = Image.new("L", (64, 48), 0)
+    white = Image.new("RGB", (64, 48), "white")
+    frames = [black] * 5 + [white] * 4
+    targets = [
+        {"name": "", "path": str(tmp_path / "full.mp4"), "resolution": [64, 48]},
+        {"name": "small", "path": str(tmp_path / "small.mp4"), "resolution": [32, 24],
+         "crop": [32, 48, 0, 0]},
+    ]
+    av_backend.encode_with_av(iter(frames), None, targets, {"fps": 30, "resolution": [64, 48]})
+
+    for target in targets:
+        with av.open(target["path"]) as container:
+            decoded = list(container.decode(video=0))
+        assert [frame.pts for frame in decoded] == [i * 512 for i in range(9)]
+        assert (decoded[0].width, decoded[0].height) == tuple(target["resolution"])
+        assert decoded[-1].to_ndarray(format="gray").mean() > 200
+
+
+@requires_av
+def test_encoder_errors_are_structured(tmp_path, monkeypatch, x264):
+    monkeypatch.setattr(av_backend, "VIDEO_CODEC_OPTIONS", {"preset": "no-such-preset"})
+    path = str(tmp_path / "out.mp4")
+    target = {"name": "", "path": path, "resolution": [64, 48]}
+    with pytest.raises(EncoderError) as error:
+        av_backend.encode_with_av(
+            iter([Image.new("RGB", (64, 48))]), None, [target], {"fps": 30}
+        )
+    assert error.value.stage == "open"
+    assert error.value.path == path
+    assert error.value.errno is not None
@@ -0,0 +1,57 @@
+import pytest
+
+from benchmarks.corpora import CORPUS_KINDS, generate_corpus
+from benchmarks.run import BENCH_STYLE, _iter_frames, _timeline_frame_count, compare_to_baseline
+from src.parser import split_sentences
+
+
+@pytest.mark.parametrize("kind", CORPUS_KINDS)
+def test_generate_corpus_exact_size(kind):
+    text = generate_corpus(kind, 1000)
+    assert len(text) == 1000
+    assert split_sentences(text)
+
+
+def test_generate_corpus_deterministic():
+    assert generate_corpus("mixed", 500) == generate_corpus("mixed", 500)
+    assert generate_corpus("mixed", 500, seed=1) != generate_corpus("mixed", 500)
+
+
+@pytest.mark.parametrize("kind", ["cjk", "punct"])
+def test_video_frame_count_matches_the_frame_generator(kind):
+    sentences = split_sentences(generate_corpus(kind, 200))
+    frame_config = {**BENCH_STYLE, "resolution": [64, 48], "font_size": 16}
+    rendered = sum(1 for _ in _iter_frames(sentences, frame_config, 30))
+    assert _timeline_frame_count(sentences, 30) == rendered
+
+
+def test_generate_corpus_unknown_kind():
+    with pytest.raises(ValueError):
+        generate_corpus("klingon", 100)
+
+
+class TestCompareToBaseline:
+    def test_within_tolerance(self):
+        baseline = {"parse/cjk/1k": {"seconds": 1.0, "peak_mb": 100.0}}
+        results = {"parse/cjk/1k": {"seconds": 1.2, "peak_mb": 110.0}}
+        assert compare_to_baseline(results, baseline, 0.3, 0.3) == []
+
+    def test_slowdown_is_reported(self):
+        baseline = {"parse/cjk/1k": {"seconds": 1.0, "peak_mb": 100.0}}
+        results = {"parse/cjk/1k": {"seconds": 2.0, "peak_mb": 100.0}}
+        assert len(compare_to_baseline(results, baseline, 0.3, 0.3)) == 1
+
+    def test_memory_growth_is_reported(self):
+        baseline = {"frames/cjk/1k": {"seconds": 1.0, "peak_mb": 100.0}}
+        results = {"frames/cjk/1k": {"seconds": 1.0, "peak_mb": 500.0}}
+        assert len(compare_to_baseline(results, baseline, 0.3, 0.3)) == 1
+
+    def test_new_failure_is_reported(self):
+        baseline = {"frames/cjk/1k": {"seconds": 1.0, "peak_mb": 100.0}}
+        results = {"frames/cjk/1k": {"error": "worker killed"}}
+        assert len(compare_to_baseline(results, baseline, 0.3, 0.3)) == 1
+
+    def test_previously_failing_case_is_ignored(self):
+        baseline = {"frames/long/1k": {"error": "worker killed"}}
+        results = {"frames/long/1k": {"seconds": 30.0, "peak_mb": 50.0}}
+        assert compare_to_baseline(results, baseline, 0.3, 0.3) == []
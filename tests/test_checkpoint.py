@@ -0,0 +1,176 @@
+import wave
+
+from src.checkpoint import RenderCheckpoint, plan_segments, render_fingerprint
+
+AUDIO = {
+    "character_duration_ms": 100,
+    "sentence_pause_ms": 500,
+    "character_pause_ms": 200,
+}
+PAUSES = ["，", "、", ","]
+
+
+def write_wav(path, duration_ms, sample_rate=8000):
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(b"\x00\x00" * int(sample_rate * duration_ms / 1000))
+
+
+def test_plan_segments_splits_at_sentence_boundaries():
+    sentences = ["abcde", "fghij", "klmno", "pqrst"]  # 500ms each + 500ms pauses
+    segments = plan_segments(sentences, AUDIO, 30, PAUSES, segment_ms=2000)
+    assert [(s["first_sentence"], s["last_sentence"]) for s in segments] == [(0, 2), (2, 4)]
+    assert segments[0]["start_ms"] == 0
+    assert segments[0]["end_ms"] == 2000
+    assert segments[1]["start_ms"] == 2000
+    # The last sentence has no trailing pause
+    assert segments[1]["end_ms"] == 3500
+
+
+def test_plan_segments_are_contiguous():
+    sentences = [f"sentence{i}，ok" for i in range(50)]
+    segments = plan_segments(sentences, AUDIO, 30, PAUSES, segment_ms=3000)
+    assert segments[0]["first_sentence"] == 0
+    assert segments[-1]["last_sentence"] == 50
+    for prev, cur in zip(segments, segments[1:]):
+        assert prev["last_sentence"] == cur["first_sentence"]
+        assert prev["end_ms"] == cur["start_ms"]
+        assert prev["frame_end"] == cur["frame_start"]
+
+
+def test_fingerprint_tracks_script_and_config():
+    config = {"video": {"fps": 30}, "audio": AUDIO}
+    base = render_fingerprint(["a."], config)
+    assert base == render_fingerprint(["a."], config)
+    assert base != render_fingerprint(["b."], config)
+    assert base != render_fingerprint(["a."], {**config, "video": {"fps": 60}})
+
+
+class TestRenderCheckpoint:
+    def make_done_segments(self, tmp_path, segments):
+        checkpoint = RenderCheckpoint(str(tmp_path), "abc", fps=30)
+        for segment in segments:
+            index = segment["index"]
+            duration_ms = segment["end_ms"] - segment["start_ms"]
+            write_wav(checkpoint.audio_path(index), duration_ms)
+            checkpoint.video_path(index).write_bytes(b"video")
+            checkpoint.mark_done(segment, segment["frame_end"] - segment["frame_start"])
+        return checkpoint
+
+    def test_manifest_roundtrip(self, tmp_path):
+        segments = plan_segments(["abcde", "fghij"], AUDIO, 30, PAUSES, segment_ms=500)
+        self.make_done_segments(tmp_path, segments)
+
+        reloaded = RenderCheckpoint(str(tmp_path), "abc", fps=30)
+        assert reloaded.load()
+        assert reloaded.resumable_prefix(segments) == len(segments)
+
+    def test_fingerprint_mismatch_is_not_resumed(self, tmp_path):
+        segments = plan_segments(["abcde"], AUDIO, 30, PAUSES, segment_ms=500)
+        self.make_done_segments(tmp_path, segments)
+        assert not RenderCheckpoint(str(tmp_path), "other", fps=30).load()
+
+    def test_resume_stops_at_missing_segment(self, tmp_path):
+        segments = plan_segments(["abcde", "fghij", "klmno"], AUDIO, 30, PAUSES, segment_ms=500)
+        checkpoint = self.make_done_segments(tmp_path, segments)
+        checkpoint.video_path(1).unlink()
+
+        reloaded = RenderCheckpoint(str(tmp_path), "abc", fps=30)
+        reloaded.load()
+        assert reloaded.resumable_prefix(segments) == 1
+
+    def test_audio_offset_mismatch_is_rejected(self, tmp_path):
+        segments = plan_segments(["abcde", "fghij"], AUDIO, 30, PAUSES, segment_ms=500)
+        checkpoint = self.make_done_segments(tmp_path, segments)
+        # A truncated audio segment would shift every later sentence
+        write_wav(checkpoint.audio_path(0), 400)
+        checkpoint.mark_done(segments[0], segments[0]["frame_end"])
+
+        reloaded = RenderCheckpoint(str(tmp_path), "abc", fps=30)
+        reloaded.load()
+        assert reloaded.resumable_prefix(segments) == 0
+
+    def test_quote_led_sentences_resume(self, tmp_path):
+        from src.frame_generator import iter_timeline_frames
+
+        # An opening quote shows for a frame the audio clock does not count,
+        # so frames run ahead of the clock from segment to segment
+        sentences = ["“你好”，他说。", "“走吧。”", "“好的”，她说。", "“再见！”"] * 3
+        segments = plan_segments(sentences, AUDIO, 30, PAUSES, segment_ms=1500)
+        assert len(segments) > 2
+        assert segments[-1]["frame_end"] > round(segments[-1]["end_ms"] * 30 / 1000)
+
+        frame_config = {
+            "resolution": [64, 32],
+            "font_size": 12,
+            "text_color": "#FFFFFF",
+            "background_color": "#000000",
+            "text_position": [2, 10],
+        }
+        checkpoint = RenderCheckpoint(str(tmp_path), "abc", fps=30)
+        for segment in segments:
+            # As api.render_segment renders it
+            frames = iter_timeline_frames(
+                sentences[segment["first_sentence"]:segment["last_sentence"]],
+                frame_config,
+                None,
+                fps=30,
+                pause_chars=PAUSES,
+                elapsed_ms=segment["start_ms"],
+                pause_after_last=segment["last_sentence"] < len(sentences),
+                **AUDIO,
+            )
+            duration_ms = segment["end_ms"] - segment["start_ms"]
+            write_wav(checkpoint.audio_path(segment["index"]), duration_ms)
+            checkpoint.video_path(segment["index"]).write_bytes(b"video")
+            checkpoint.mark_done(segment, sum(1 for _ in frames))
+
+        reloaded = RenderCheckpoint(str(tmp_path), "abc", fps=30)
+        reloaded.load()
+        assert reloaded.resumable_prefix(segments) == len(segments)
+
+    def test_discard_from(self, tmp_path):
+        segments = plan_segments(["abcde", "fghij"], AUDIO, 30, PAUSES, segment_ms=500)
+        checkpoint = self.make_done_segments(tmp_path, segments)
+        checkpoint.discard_from(1)
+        assert list(checkpoint.completed) == [0]
+
+
+def test_checkpointed_render_leaves_other_files(tmp_path, monkeypatch):
+    from src import api, video_builder
+    from src.config import resolve_config
+    from src.main import _render_checkpointed
+
+    def fake_render_segment(job, segment, audio_path, targets):
+        write_wav(audio_path, segment["end_ms"] - segment["start_ms"])
+        for target in targets:
+            with open(target["path"], "wb") as f:
+                f.write(b"video")
+        return segment["frame_end"] - segment["frame_start"]
+
+    def fake_concat(video_paths, audio_paths, output_path, config, work_dir):
+        (tmp_path / "work" / "out.video.txt").write_text("list")
+        with open(output_path, "wb") as f:
+            f.write(b"joined")
+
+    monkeypatch.setattr(api, "render_segment", fake_render_segment)
+    monkeypatch.setattr(video_builder, "concat_segments", fake_concat)
+    work_dir = tmp_path / "work"
+    work_dir.mkdir()
+    (work_dir / "notes.txt").write_text("kept")
+
+    sentences = ["abcde", "fghij", "klmno"]
+    config = resolve_config({"audio": AUDIO, "video": {"segment_seconds": 1}})
+    _render_checkpointed(
+        sentences, config, {}, None, PAUSES, str(tmp_path / "out.mp4"), str(work_dir), False
+    )
+    assert (tmp_path / "out.mp4").read_bytes() == b"joined"
+    assert sorted(path.name for path in work_dir.iterdir()) == ["notes.txt"]
+
+    (work_dir / "notes.txt").unlink()
+    _render_checkpointed(
+        sentences, config, {}, None, PAUSES, str(tmp_path / "out.mp4"), str(work_dir), False
+    )
+    assert not work_dir.exists()
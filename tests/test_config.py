@@ -1,5 +1,5 @@
 import pytest
-from src.config import load_config, get_default_config
+from src.config import get_default_config, load_config, merge_config, resolve_config
 
 
 def test_load_config_file_exists(tmp_path):
@@ -19,3 +19,24 @@ def test_get_default_config():
     assert config["video"]["fps"] == 30
     assert config["style"]["font_size"] == 48
     assert "sentence_enders" in config["parsing"]
+
+
+def test_get_default_config_is_deep_copy():
+    config = get_default_config()
+    config["video"]["fps"] = 60
+    config["parsing"]["sentence_pauses"].append(";")
+    assert get_default_config()["video"]["fps"] == 30
+    assert ";" not in get_default_config()["parsing"]["sentence_pauses"]
+
+
+def test_resolve_config_deep_merges():
+    config = resolve_config({"video": {"fps": 60}, "style": {"font_size": 20}})
+    assert config["video"]["fps"] == 60
+    assert config["video"]["resolution"] == [1920, 1080]
+    assert config["style"]["font_size"] == 20
+    assert config["audio"]["sentence_pause_ms"] == 500
+
+
+def test_merge_config_replaces_non_dict_values():
+    merged = merge_config({"a": {"b": [1, 2]}, "c": 1}, {"a": {"b": [3]}, "d": {"e": 1}})
+    assert merged == {"a": {"b": [3]}, "c": 1, "d": {"e": 1}}
@@ -0,0 +1,191 @@
+import os
+import time
+import wave
+
+import pytest
+
+from src import distributed
+from src.api import RenderError, job_for_sentences
+from src.config import resolve_config
+from src.distributed import WorkQueue, render_distributed, run_worker, shared_config
+
+SEGMENTS = [{"index": i, "first_sentence": i, "last_sentence": i + 1} for i in range(3)]
+
+
+def job_record(fingerprint="abc"):
+    return {
+        "version": distributed.QUEUE_VERSION,
+        "fingerprint": fingerprint,
+        "config": resolve_config({"video": {"fps": 10}}),
+        "sentences": ["a", "b", "c"],
+        "targets": [{"name": "", "resolution": [64, 48]}],
+        "segments": SEGMENTS,
+    }
+
+
+def expire(lease, seconds=1000):
+    past = time.time() - seconds
+    os.utime(lease.path, (past, past))
+
+
+def test_claims_are_exclusive(tmp_path):
+    queue = WorkQueue(str(tmp_path))
+    queue.publish(job_record())
+    first = queue.claim(0, "w1")
+    assert first is not None and first.attempt == 0
+    assert queue.claim(0, "w2") is None
+    assert queue.claim_next(SEGMENTS, "w2", 3).index == 1
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    queue = WorkQueue(str(tmp_path), lease_seconds=60)
+    queue.publish(job_record())
+    stale = queue.claim(0, "w1")
+    expire(stale)
+    fresh = queue.claim(0, "w2")
+    assert fresh.attempt == 1
+    assert queue.holds(fresh)
+    assert not queue.holds(stale)
+
+
+def test_done_and_failed_segments_are_not_claimed(tmp_path):
+    queue = WorkQueue(str(tmp_path))
+    queue.publish(job_record())
+    queue.complete(queue.claim(0, "w1"), {"index": 0, "frame_count": 5})
+    for _ in range(2):
+        queue.fail(queue.claim(1, "w1"), "w1", "boom")
+    assert set(queue.done_records()) == {0}
+    assert queue.failure_counts() == {1: 2}
+    lease = queue.claim_next(SEGMENTS, "w1", max_attempts=2)
+    assert lease.index == 2
+    assert not queue.finished(SEGMENTS, max_attempts=2)
+    queue.complete(lease, {"index": 2, "frame_count": 5})
+    assert queue.finished(SEGMENTS, max_attempts=2)
+
+
+def test_republish_keeps_done_segments_of_the_same_job(tmp_path):
+    queue = WorkQueue(str(tmp_path))
+    queue.publish(job_record())
+    queue.complete(queue.claim(0, "w1"), {"index": 0, "frame_count": 5})
+    queue.fail(queue.claim(1, "w1"), "w1", "boom")
+    assert queue.publish(job_record())
+    assert set(queue.done_records()) == {0}
+    assert queue.failure_counts() == {}
+
+    (tmp_path / "segment_00000.wav").write_bytes(b"")
+    (tmp_path / "notes.txt").write_text("kept")
+    assert not queue.publish(job_record("changed"))
+    assert queue.done_records() == {}
+    assert not (tmp_path / "segment_00000.wav").exists()
+    queue.remove()
+    assert (tmp_path / "notes.txt").exists()
+
+
+def test_shared_config_uses_absolute_paths(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    config = resolve_config({"audio": {"sound_bank": {"latin": "latin.wav", "cjk": ["a.wav"]}}})
+    shared = shared_config(config)
+    assert shared["style"]["font_path"] == str(tmp_path / "fonts" / "default.ttf")
+    assert shared["audio"]["sound_bank"] == {
+        "latin": [str(tmp_path / "latin.wav")],
+        "cjk": [str(tmp_path / "a.wav")],
+    }
+    assert shared["audio"]["sample_cache_dir"] is None
+    assert config["audio"]["sound_bank"]["latin"] == "latin.wav"
+
+
+def test_worker_renders_every_segment(tmp_path, monkeypatch):
+    rendered = []
+
+    def fake_render_segment(job, segment, audio_path, targets):
+        rendered.append(segment["index"])
+        with wave.open(audio_path, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(8000)
+            wav.writeframes(b"\x00\x00" * 800)
+        for target in targets:
+            with open(target["path"], "wb") as f:
+                f.write(b"video")
+        return 10
+
+    monkeypatch.setattr(distributed, "render_segment", fake_render_segment)
+    queue = WorkQueue(str(tmp_path))
+    queue.publish(job_record())
+
+    assert run_worker(str(tmp_path), worker="w1") == 3
+    assert rendered == [0, 1, 2]
+    records = queue.done_records()
+    assert [records[i]["audio_ms"] for i in range(3)] == [100.0] * 3
+    assert sorted(path.name for path in tmp_path.glob("segment_*")) == [
+        f"segment_0000{i}.{ext}" for i in range(3) for ext in ("mp4", "wav")
+    ]
+    assert not list(queue.claims_dir.iterdir())
+
+
+def fake_render_segment(job, segment, audio_path, targets):
+    """Write a segment's audio and videos; BAD_SEGMENT renders extra frames."""
+    with wave.open(audio_path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(8000)
+        wav.writeframes(b"\x00\x00" * round((segment["end_ms"] - segment["start_ms"]) * 8))
+    for target in targets:
+        with open(target["path"], "wb") as f:
+            f.write(b"video")
+    frames = segment["frame_end"] - segment["frame_start"]
+    if str(segment["index"]) == os.environ.get("BAD_SEGMENT"):
+        frames += 5
+    return frames
+
+
+def fake_local_worker(queue_dir, log_level):
+    # Runs in a spawned process, where the test's monkeypatching is gone
+    distributed.render_segment = fake_render_segment
+    distributed.run_worker(queue_dir)
+
+
+def distributed_job(tmp_path, monkeypatch):
+    joined = []
+
+    def fake_concat(video_paths, audio_paths, output, video_config, work_dir):
+        joined.append(video_paths)
+        with open(output, "wb") as f:
+            f.write(b"joined")
+
+    monkeypatch.setattr(distributed, "_local_worker", fake_local_worker)
+    monkeypatch.setattr(distributed, "concat_segments", fake_concat)
+    config = resolve_config(
+        {
+            "video": {
+                "fps": 10,
+                "resolution": [64, 48],
+                "segment_seconds": 0.5,
+                "queue": {"poll_seconds": 0.05, "max_attempts": 2},
+            },
+        }
+    )
+    sentences = ["ab，cd。", "ef。", "gh！", "ij。", "kl。"]
+    return job_for_sentences(sentences, config), joined
+
+
+def test_local_workers_render_the_job(tmp_path, monkeypatch):
+    job, joined = distributed_job(tmp_path, monkeypatch)
+    output = str(tmp_path / "out.mp4")
+    queue_dir = str(tmp_path / "queue")
+
+    assert render_distributed(job, output, queue_dir, workers=2) == [output]
+    assert len(joined) == 1 and len(joined[0]) > 2
+    assert open(output, "rb").read() == b"joined"
+    assert not os.path.exists(queue_dir)
+
+
+def test_segment_failing_verification_is_an_attempt(tmp_path, monkeypatch):
+    job, joined = distributed_job(tmp_path, monkeypatch)
+    monkeypatch.setenv("BAD_SEGMENT", "1")
+    queue_dir = str(tmp_path / "queue")
+
+    with pytest.raises(RenderError, match="Segment 2 failed 2 times"):
+        render_distributed(job, str(tmp_path / "out.mp4"), queue_dir, workers=2)
+    assert WorkQueue(queue_dir).failure_counts() == {1: 2}
+    assert joined == []
@@ -0,0 +1,97 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.effects import bytes_per_pixel, effects_enabled  # noqa: E402
+from src.frame_generator import iter_timeline_frames  # noqa: E402
+from src.timeline import TimelineIndex  # noqa: E402
+
+CONFIG = {
+    "resolution": [320, 90],
+    "font_size": 16,
+    "text_color": "#FFFFFF",
+    "background_color": "#000000",
+    "text_position": [10, 30],
+}
+SENTENCES = ["ab，cd。", "你好！", "x"]
+TIMING = {
+    "fps": 30,
+    "character_duration_ms": 100,
+    "pause_chars": ["，", ","],
+    "character_pause_ms": 250,
+    "sentence_pause_ms": 600,
+}
+
+
+def with_effects(**effects):
+    return {**CONFIG, "effects": effects}
+
+
+def frames_of(config):
+    return list(iter_timeline_frames(SENTENCES, config, None, **TIMING))
+
+
+def coverage(frame):
+    return np.asarray(frame).astype(int)
+
+
+def test_disabled_by_default():
+    assert not effects_enabled(CONFIG)
+    assert not effects_enabled(with_effects(fade_in_ms=0, cursor=False, gradient=None))
+    assert effects_enabled(with_effects(cursor=True))
+    assert bytes_per_pixel(with_effects(cursor=True)) == 1
+    assert bytes_per_pixel(with_effects(gradient=["#FF0000", "#0000FF"])) == 3
+
+
+def test_fade_in_blends_between_settled_frames():
+    plain = frames_of(CONFIG)
+    faded = frames_of(with_effects(fade_in_ms=100))
+    assert len(faded) == len(plain)
+
+    # First character: 1/3 and 2/3 of its glyph, then fully drawn
+    first, second, third = (coverage(frame) for frame in faded[:3])
+    settled = coverage(plain[2])
+    assert 0 < first.sum() < second.sum() < third.sum() == settled.sum()
+    assert np.abs(first * 3 - settled).max() <= 3
+    # Frames held past the fade (end of a sentence's pause) match exactly
+    held = TimelineIndex(SENTENCES, CONFIG, None, **TIMING).frame_starts[1] - 1
+    assert faded[held].tobytes() == plain[held].tobytes()
+
+
+def test_cursor_blinks_during_pauses():
+    frames = frames_of(with_effects(cursor=True, cursor_blink_ms=100))
+    plain = frames_of(CONFIG)
+    shown = [frame.tobytes() != base.tobytes() for frame, base in zip(frames, plain)]
+    # Steady while typing (runs shorter than a blink), toggling in pauses
+    assert all(shown[:3])
+    assert not all(shown)
+    assert any(a != b for a, b in zip(shown, shown[1:]))
+
+
+def test_gradient_colours_each_character():
+    config = with_effects(gradient=["#FF0000", "#0000FF"])
+    frames = frames_of(config)
+    assert frames[0].mode == "RGB"
+    rgb = np.asarray(frames[TimelineIndex(SENTENCES, config, None, **TIMING).frame_starts[1] - 1])
+    lit = rgb[rgb.sum(axis=2) > 0]
+    reds = lit[lit[:, 0] > lit[:, 2]]
+    blues = lit[lit[:, 2] > lit[:, 0]]
+    assert len(reds) and len(blues)
+    assert not lit[:, 1].any()
+
+
+@pytest.mark.parametrize(
+    "effects",
+    [
+        {"fade_in_ms": 150},
+        {"cursor": True, "cursor_blink_ms": 100},
+        {"fade_in_ms": 70, "cursor": True, "gradient": ["#FFFFFF", "#00FF00"]},
+    ],
+)
+def test_index_matches_streamed_frames(effects):
+    config = with_effects(**effects)
+    frames = frames_of(config)
+    index = TimelineIndex(SENTENCES, config, None, **TIMING)
+    assert index.total_frames == len(frames)
+    for i in reversed(range(len(frames))):
+        assert index.render_frame(i).tobytes() == frames[i].tobytes()
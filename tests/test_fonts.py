@@ -0,0 +1,72 @@
+from PIL import Image, ImageDraw, ImageFont
+
+from src.fonts import FontChain, FontCoverage, load_coverage, load_font_chain
+
+FONT_PATH = "./fonts/default.ttf"
+
+
+def test_coverage_from_cmap(tmp_path):
+    coverage = load_coverage(FONT_PATH, str(tmp_path))
+    assert "A" in coverage
+    assert "你" in coverage
+    assert "\U0001F600" not in coverage
+
+
+def test_coverage_is_cached_on_disk(tmp_path):
+    load_coverage(FONT_PATH, str(tmp_path))
+    cached = list(tmp_path.glob("*.json"))
+    assert len(cached) == 1
+
+    # A corrupted entry is ignored and rebuilt
+    cached[0].write_text("not json")
+    assert "A" in load_coverage(FONT_PATH, str(tmp_path))
+
+
+def test_font_coverage_ranges():
+    coverage = FontCoverage([(0x41, 0x5A), (0x5B, 0x5B), (0x4E00, 0x4E10)])
+    assert coverage.ranges == [(0x41, 0x5B), (0x4E00, 0x4E10)]
+    assert "A" in coverage
+    assert "[" in coverage
+    assert "a" not in coverage
+    assert "丅" in coverage
+
+
+class TestFontChain:
+    def make_chain(self):
+        font = ImageFont.load_default()
+        latin = FontCoverage([(0x20, 0x7E)])
+        cjk = FontCoverage([(0x3000, 0x303F), (0x4E00, 0x9FFF)])
+        return FontChain([font, font], [latin, cjk])
+
+    def test_runs_group_same_font(self):
+        chain = self.make_chain()
+        assert chain.runs("Hi 你好。ok") == [(0, "Hi "), (1, "你好。"), (0, "ok")]
+
+    def test_uncovered_chars_use_primary(self):
+        chain = self.make_chain()
+        assert chain.font_index("\U0001F600") == 0
+
+    def test_draw_mixed_text(self):
+        chain = self.make_chain()
+        frame = Image.new("RGB", (200, 50), "black")
+        chain.draw_text(ImageDraw.Draw(frame), (5, 5), "Hi 你好", "white")
+        assert frame.getbbox() is not None
+
+
+def test_load_font_chain_skips_missing_fonts(tmp_path):
+    chain = load_font_chain(("missing.ttf", FONT_PATH), 24, str(tmp_path))
+    assert len(chain.fonts) == 1
+
+
+def test_load_font_chain_defaults_without_fonts():
+    chain = load_font_chain((None,), 24)
+    assert len(chain.fonts) == 1
+    assert chain.coverages == [None]
+
+
+def test_empty_fallback_fonts_key():
+    from src.frame_generator import _load_fonts
+
+    # "fallback_fonts:" with no value in config.yaml
+    chain = _load_fonts(None, {"font_size": 24, "fallback_fonts": None})
+    assert len(chain.fonts) == 1
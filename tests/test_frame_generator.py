@@ -1,4 +1,18 @@
-from src.frame_generator import generate_sentence_frames, generate_pause_frames
+import subprocess
+import sys
+
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+from src.frame_generator import (
+    frames_for_budget,
+    generate_pause_frames,
+    generate_sentence_frames,
+    iter_sentence_frames,
+    iter_timeline_frames,
+    prefetch_frames,
+    two_tone_palette,
+)
 
 
 def test_generate_sentence_frames_count():
@@ -186,3 +200,167 @@ class TestCumulativeTimeTracking:
         total_frames = len(frames1) + len(pause_frames) + len(frames2)
         video_ms = total_frames / fps * 1000
         assert abs(video_ms - total_audio_ms) <= 1000 / fps + 0.01
+
+
+class TestStreamingFrames:
+    config = {
+        "resolution": [320, 120],
+        "font_size": 24,
+        "text_color": "#FFFFFF",
+        "background_color": "#000000",
+        "text_position": [10, 40],
+    }
+
+    def test_generator_returns_elapsed_ms(self):
+        def consume():
+            elapsed = yield from iter_sentence_frames(
+                "ab，cd", self.config, character_duration_ms=80, character_pause_ms=250
+            )
+            return elapsed
+
+        gen = consume()
+        count = 0
+        while True:
+            try:
+                next(gen)
+                count += 1
+            except StopIteration as stop:
+                elapsed = stop.value
+                break
+        assert elapsed == 4 * 80 + 250
+        frames, _ = generate_sentence_frames(
+            "ab，cd", self.config, character_duration_ms=80, character_pause_ms=250
+        )
+        assert count == len(frames)
+
+    def test_held_frames_are_not_copied(self):
+        # A long hold must not allocate one image per video frame
+        frames, _ = generate_sentence_frames(
+            "ab", self.config, fps=30, character_duration_ms=1000
+        )
+        assert len(frames) == 60
+        assert len({id(frame) for frame in frames}) == 2
+
+    def test_punctuation_drawn_on_last_character_frame(self):
+        frames, _ = generate_sentence_frames(
+            "Hi!", self.config, fps=30, character_duration_ms=100
+        )
+        plain, _ = generate_sentence_frames(
+            "Hi", self.config, fps=30, character_duration_ms=100
+        )
+        assert frames[-1].tobytes() != plain[-1].tobytes()
+        assert frames[-2].tobytes() == plain[-2].tobytes()
+
+    def test_timeline_matches_per_sentence_calls(self):
+        sentences = ["Hello.", "World!"]
+        timeline = list(
+            iter_timeline_frames(
+                sentences, self.config, fps=30, character_duration_ms=80, sentence_pause_ms=1000
+            )
+        )
+        frames1, elapsed = generate_sentence_frames(
+            "Hello.", self.config, fps=30, character_duration_ms=80
+        )
+        pause, elapsed = generate_pause_frames(
+            self.config, fps=30, pause_duration_ms=1000, visible_text="Hello.", elapsed_ms=elapsed
+        )
+        frames2, _ = generate_sentence_frames(
+            "World!", self.config, fps=30, character_duration_ms=80, elapsed_ms=elapsed
+        )
+        assert len(timeline) == len(frames1) + len(pause) + len(frames2)
+
+
+class TestPrefetchFrames:
+    def test_preserves_order(self):
+        assert list(prefetch_frames(iter(range(100)), max_frames=3)) == list(range(100))
+
+    def test_propagates_producer_errors(self):
+        def failing():
+            yield 1
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            list(prefetch_frames(failing(), max_frames=2))
+
+    def test_consumer_can_stop_early(self):
+        stream = prefetch_frames(iter(range(1000)), max_frames=2)
+        assert next(stream) == 0
+        stream.close()
+
+    def test_frames_for_budget(self):
+        assert frames_for_budget([1920, 1080], 256) == 129
+        assert frames_for_budget([1920, 1080], 0) == 1
+
+
+def test_segmented_timeline_matches_single_pass():
+    config = {
+        "resolution": [160, 90],
+        "font_size": 12,
+        "text_color": "#FFFFFF",
+        "background_color": "#000000",
+        "text_position": [5, 40],
+    }
+    sentences = ["ab，c.", "de!", "fgh，ij?"]
+    kwargs = dict(fps=30, character_duration_ms=70, character_pause_ms=230, sentence_pause_ms=510)
+    whole = list(iter_timeline_frames(sentences, config, **kwargs))
+
+    def consume(stream):
+        frames = []
+        while True:
+            try:
+                frames.append(next(stream))
+            except StopIteration as stop:
+                return frames, stop.value
+
+    first, elapsed = consume(
+        iter_timeline_frames(sentences[:2], config, pause_after_last=True, **kwargs)
+    )
+    second, _ = consume(
+        iter_timeline_frames(sentences[2:], config, elapsed_ms=elapsed, **kwargs)
+    )
+    assert len(first) + len(second) == len(whole)
+
+
+class TestTwoToneFrames:
+    config = {
+        "resolution": [200, 60],
+        "font_size": 20,
+        "text_color": "#FFCC00",
+        "background_color": "#102040",
+        "text_position": [4, 10],
+    }
+
+    def test_frames_are_one_byte_per_pixel(self):
+        frames, _ = generate_sentence_frames("Hi", self.config)
+        assert frames[-1].mode == "P"
+        assert len(frames[-1].tobytes()) == 200 * 60
+
+    def test_palette_expands_to_configured_colours(self):
+        palette = two_tone_palette("#102040", "#FFCC00")
+        assert len(palette) == 256 * 3
+        assert palette[:3] == (0x10, 0x20, 0x40)
+        assert palette[-3:] == (0xFF, 0xCC, 0x00)
+
+    def test_expanded_frame_matches_rgb_drawing(self):
+        expected = Image.new("RGB", (200, 60), "#102040")
+        ImageDraw.Draw(expected).text(
+            (4, 10), "Hi", fill="#FFCC00", font=ImageFont.truetype("fonts/default.ttf", 20)
+        )
+        frames, _ = generate_sentence_frames("Hi", self.config, font_path="fonts/default.ttf")
+        assert frames[-1].convert("RGB").tobytes() == expected.tobytes()
+
+
+def test_render_without_effects_does_not_load_numpy():
+    code = (
+        "import sys\n"
+        "import src.effects\n"
+        "from src.frame_generator import iter_timeline_frames\n"
+        "config = {'resolution': [64, 48], 'font_size': 16, 'text_color': '#FFFFFF',\n"
+        "          'background_color': '#000000', 'text_position': [4, 30]}\n"
+        "frames = list(iter_timeline_frames(['ab，cd。', 'ef'], config, None, fps=10))\n"
+        "print(len(frames), 'numpy' in sys.modules)\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.split()[1] == "False"
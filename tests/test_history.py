@@ -0,0 +1,108 @@
+import pytest
+from PIL import Image
+
+from src.frame_generator import _load_fonts, iter_timeline_frames
+from src.history import HistoryLayer, history_lines
+from src.timeline import TimelineIndex
+
+CONFIG = {
+    "resolution": [320, 120],
+    "font_size": 16,
+    "text_color": "#FFFFFF",
+    "background_color": "#000000",
+    "text_position": [10, 90],
+}
+SENTENCES = ["ab，cd。", "你好！", "xyz", "end"]
+TIMING = {
+    "fps": 30,
+    "character_duration_ms": 100,
+    "pause_chars": ["，", ","],
+    "character_pause_ms": 250,
+    "sentence_pause_ms": 600,
+}
+
+
+def with_history(**history):
+    return {**CONFIG, "history": {"lines": 2, **history}}
+
+
+def frames_of(config, sentences=SENTENCES, **kwargs):
+    return list(iter_timeline_frames(sentences, config, None, **{**TIMING, **kwargs}))
+
+
+def lit_rows(frame):
+    mask = frame.convert("L") if frame.mode != "L" else frame
+    bbox = mask.point(lambda v: 255 if v else 0).getbbox()
+    return (bbox[1], bbox[3]) if bbox else None
+
+
+def test_disabled_by_default():
+    assert history_lines(CONFIG) == 0
+    assert history_lines(with_history(lines=3)) == 3
+    plain = frames_of(CONFIG)
+    assert [f.tobytes() for f in frames_of({**CONFIG, "history": {"lines": 0}})] == [
+        f.tobytes() for f in plain
+    ]
+
+
+def test_previous_lines_stay_above_the_typing_line():
+    config = with_history()
+    frames = frames_of(config)
+    index = TimelineIndex(SENTENCES, config, None, **TIMING)
+    plain = frames_of(CONFIG)
+    assert len(frames) == len(plain)
+
+    # The first sentence has no history
+    first_end = index.frame_starts[1]
+    assert [f.tobytes() for f in frames[:first_end]] == [f.tobytes() for f in plain[:first_end]]
+    # Once the last sentence has scrolled in, two lines are shown above it
+    top, _ = lit_rows(frames[-1])
+    line_height = round(16 * 1.25)
+    assert top < 90 - line_height
+    assert lit_rows(plain[-1])[0] >= 90
+
+
+def test_scroll_eases_up_by_one_line():
+    fonts = _load_fonts(None, CONFIG)
+    layer = HistoryLayer(with_history(scroll_ms=200), ["a", "b"], fonts, fps=30)
+    offsets = [layer.scroll(frame) for frame in range(8)]
+    assert offsets[0] < layer.line_height
+    assert offsets == sorted(offsets, reverse=True)
+    assert offsets[6:] == [0, 0]
+    # The cached band does not grow with the script, only with lines
+    assert layer.image.size == (320, 3 * layer.line_height)
+
+
+def test_segment_continues_the_history():
+    config = with_history()
+    frames = frames_of(config)
+    index = TimelineIndex(SENTENCES, config, None, **TIMING)
+    segment = frames_of(
+        config,
+        SENTENCES[2:],
+        elapsed_ms=index.elapsed_starts[2],
+        previous_sentences=SENTENCES[:2],
+    )
+    assert [f.tobytes() for f in segment] == [
+        f.tobytes() for f in frames[index.frame_starts[2]:]
+    ]
+
+
+@pytest.mark.parametrize(
+    "config",
+    [
+        with_history(),
+        with_history(lines=1, scroll_ms=0),
+        {**with_history(), "effects": {"fade_in_ms": 100, "cursor": True}},
+        {**with_history(), "effects": {"gradient": ["#FF0000", "#0000FF"]}},
+    ],
+)
+def test_index_matches_streamed_frames(config):
+    if "effects" in config:
+        pytest.importorskip("numpy")
+    frames = frames_of(config)
+    index = TimelineIndex(SENTENCES, config, None, **TIMING)
+    assert index.total_frames == len(frames)
+    for i in reversed(range(len(frames))):
+        assert index.render_frame(i).tobytes() == frames[i].tobytes()
+    assert isinstance(index.contact_sheet(6), Image.Image)
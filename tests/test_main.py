@@ -1,4 +1,5 @@
 from click.testing import CliRunner
+from PIL import Image
 from src.main import cli
 
 
@@ -13,3 +14,20 @@ def test_cli_help():
     result = runner.invoke(cli, ["--help"])
     assert result.exit_code == 0
     assert "Generate subtitle video" in result.output
+
+
+def test_live_formats_match_the_playlists():
+    from src.video_builder import LIVE_PLAYLISTS
+    from src.main import render
+
+    live_format = next(param for param in render.params if param.name == "live_format")
+    assert list(live_format.type.choices) == sorted(LIVE_PLAYLISTS)
+
+
+def test_frame_as_jpeg(tmp_path):
+    script = tmp_path / "script.txt"
+    script.write_text("ab，cd。你好！\n", encoding="utf-8")
+    output = tmp_path / "shot.jpg"
+    result = CliRunner().invoke(cli, ["frame", str(script), "--at", "0.5s", "-o", str(output)])
+    assert result.exit_code == 0, result.output
+    assert Image.open(output).format == "JPEG"
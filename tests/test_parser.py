@@ -1,4 +1,17 @@
-from src.parser import is_punctuation, is_pause_marker, split_sentences
+import pytest
+
+from src.parser import (
+    CHAR_PAUSE,
+    CHAR_PUNCTUATION,
+    CHAR_TEXT,
+    SentenceParser,
+    build_char_table,
+    char_kind,
+    get_char_table,
+    is_pause_marker,
+    is_punctuation,
+    split_sentences,
+)
 
 
 def test_split_sentences_chinese():
@@ -83,3 +96,59 @@ class TestIsPauseMarker:
     def test_letters_return_false(self):
         pause_chars = ["，", "、", ","]
         assert is_pause_marker("a", pause_chars) is False
+
+
+class TestSentenceParser:
+    def test_uses_configured_enders(self):
+        parser = SentenceParser.from_config({"sentence_enders": ["；"]})
+        assert parser.split("第一；第二。第三") == ["第一；", "第二。第三"]
+
+    def test_defaults_when_config_missing(self):
+        parser = SentenceParser.from_config(None)
+        assert parser.split("A. B!") == split_sentences("A. B!")
+
+    def test_regex_metacharacters_are_escaped(self):
+        parser = SentenceParser(sentence_enders=["]", "^", "-"])
+        assert parser.split("a]b^c-d") == ["a]", "b^", "c-", "d"]
+
+    def test_no_enders_keeps_whole_lines(self):
+        parser = SentenceParser(sentence_enders=[])
+        assert parser.split("one. two\nthree") == ["one. two", "three"]
+
+    def test_iter_sentences_is_lazy(self):
+        def lines():
+            yield "First. Second.\n"
+            raise AssertionError("read past the first line")
+
+        sentences = SentenceParser().iter_sentences(lines())
+        assert next(sentences) == "First."
+        assert next(sentences) == "Second."
+
+    def test_split_sentences_with_enders(self):
+        assert split_sentences("a;b;c", sentence_enders=[";"]) == ["a;", "b;", "c"]
+
+
+class TestCharTable:
+    def test_seeded_from_config(self):
+        table = build_char_table(["，", "~"])
+        assert table == {"，": CHAR_PAUSE, "~": CHAR_PAUSE}
+        assert char_kind("。", table) == CHAR_PUNCTUATION
+
+    def test_non_punctuation_pause_is_ignored(self):
+        assert "x" not in build_char_table(["x"])
+
+    def test_char_kind_leaves_table_alone(self):
+        table = build_char_table(["，"])
+        assert char_kind("你", table) == CHAR_TEXT
+        assert char_kind(" ", table) == CHAR_TEXT
+        assert char_kind("：", table) == CHAR_PUNCTUATION
+        assert char_kind("，", table) == CHAR_PAUSE
+        assert table == {"，": CHAR_PAUSE}
+
+    def test_shared_table_is_read_only(self):
+        table = get_char_table(["，"])
+        assert get_char_table(["，"]) is table
+        char_kind("你", table)
+        assert "你" not in table
+        with pytest.raises(TypeError):
+            table["你"] = CHAR_TEXT
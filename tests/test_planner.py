@@ -0,0 +1,193 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from src.audio_builder import schedule_clips
+from src.config import resolve_config
+from src.frame_generator import iter_timeline_frames
+from src.planner import (
+    DEFAULT_RATES,
+    RenderMetrics,
+    _duration,
+    calibrate,
+    load_metrics,
+    plan_render,
+    sentence_costs,
+)
+from src.sound_bank import SoundBank
+from src.timeline import TimelineIndex
+
+SENTENCES = ["ab，cd。", "你好！", "xyz", "，end"]
+PAUSE_CHARS = ["，", ","]
+
+
+def config_with(**style):
+    return resolve_config(
+        {
+            "video": {"resolution": [160, 90], "fps": 30},
+            "style": {"font_size": 16, "text_position": [10, 60], **style},
+            "audio": {"character_duration_ms": 70, "sentence_pause_ms": 400},
+        }
+    )
+
+
+def stream(config):
+    audio = config["audio"]
+    return iter_timeline_frames(
+        SENTENCES,
+        {**config["style"], "resolution": config["video"]["resolution"]},
+        None,
+        fps=config["video"]["fps"],
+        character_duration_ms=audio["character_duration_ms"],
+        pause_chars=PAUSE_CHARS,
+        character_pause_ms=audio["character_pause_ms"],
+        sentence_pause_ms=audio["sentence_pause_ms"],
+    )
+
+
+@pytest.mark.parametrize(
+    "style",
+    [
+        {},
+        {"history": {"lines": 2, "scroll_ms": 100}},
+        {"effects": {"fade_in_ms": 100}},
+        {"effects": {"cursor": True, "cursor_blink_ms": 100}},
+        {"effects": {"fade_in_ms": 50, "cursor": True}, "history": {"lines": 1}},
+    ],
+)
+def test_frames_match_the_render(style):
+    if "effects" in style:
+        pytest.importorskip("numpy")
+    config = config_with(**style)
+    plan = plan_render(SENTENCES, config, PAUSE_CHARS)
+
+    metrics = RenderMetrics(plan)
+    for _ in metrics.count(stream(config)):
+        pass
+    assert (plan["frames"], plan["unique_frames"]) == (metrics.frames, metrics.unique_frames)
+
+    audio = config["audio"]
+    index = TimelineIndex(
+        SENTENCES,
+        config["style"],
+        fps=30,
+        character_duration_ms=audio["character_duration_ms"],
+        pause_chars=PAUSE_CHARS,
+        character_pause_ms=audio["character_pause_ms"],
+        sentence_pause_ms=audio["sentence_pause_ms"],
+    )
+    assert plan["frames"] == index.total_frames
+    assert plan["duration_ms"] == index.duration_ms
+
+
+@pytest.mark.parametrize("punctuation", [False, True])
+def test_audio_clips_match_the_schedule(tmp_path, punctuation):
+    sample = tmp_path / "punctuation.wav"
+    sample.write_bytes(b"")
+    config = config_with()
+    if punctuation:
+        config["audio"]["sound_bank"] = {"punctuation": str(sample)}
+    bank = SoundBank(None, {"punctuation": [str(sample)]} if punctuation else {}, "typing.wav")
+
+    clips = list(schedule_clips(SENTENCES, bank, config["audio"], PAUSE_CHARS))
+    costs = sentence_costs(SENTENCES, config, PAUSE_CHARS)
+    assert [cost["audio_clips"] for cost in costs] == [
+        sum(clip["sentence"] == i for clip in clips) for i in range(len(SENTENCES))
+    ]
+
+
+def test_spawns_and_segments():
+    config = config_with()
+    config["audio"]["backend"] = config["video"]["backend"] = "cli"
+    config["video"]["segment_seconds"] = 1
+    plan = plan_render(SENTENCES, config, PAUSE_CHARS, segmented=True)
+    # ffprobe, a clip each, the concat and the encoder
+    assert plan["ffmpeg_spawns"] == plan["audio_clips"] + 3
+    segments = plan["segments"]
+    assert len(segments) > 1
+    assert sum(segment["frames"] for segment in segments) == plan["frames"]
+    assert plan["segmented_ffmpeg_spawns"] == sum(s["ffmpeg_spawns"] for s in segments) + 1
+
+
+def record_for(plan, video_seconds, audio_seconds, peak_memory_mb):
+    return {
+        "version": 1,
+        "plan": plan,
+        "audio_seconds": audio_seconds,
+        "video_seconds": video_seconds,
+        "wall_seconds": audio_seconds + video_seconds + 1.0,
+        "peak_memory_mb": peak_memory_mb,
+    }
+
+
+def test_calibration_fits_measured_runs(tmp_path):
+    config = config_with()
+    config["audio"]["backend"] = config["video"]["backend"] = "cli"
+    plan = plan_render(SENTENCES, config, PAUSE_CHARS)
+    records = [
+        record_for(plan, plan["video_seconds"] * 4, plan["audio_clips"] * 0.05, 300.0),
+        record_for(plan, plan["video_seconds"] * 2, plan["audio_clips"] * 0.01, 200.0),
+        record_for(plan, plan["video_seconds"] * 3, plan["audio_clips"] * 0.03, 250.0),
+    ]
+    path = tmp_path / "metrics.jsonl"
+    path.write_text("".join(json.dumps(record) + "\n" for record in records) + "not json\n")
+
+    rates = calibrate(load_metrics([str(path)]))
+    assert rates["runs"] == 3
+    assert rates["render_seconds_per_mpx"]["cli"] == pytest.approx(
+        DEFAULT_RATES["render_seconds_per_mpx"]["cli"] * 3
+    )
+    # Without av runs, av is scaled like the others
+    assert rates["encode_seconds_per_mpx"]["av"] == pytest.approx(
+        DEFAULT_RATES["encode_seconds_per_mpx"]["av"] * 3
+    )
+    assert rates["audio_seconds_per_clip"] == {"cli": pytest.approx(0.03), "av": 0.002}
+    assert rates["startup_seconds"] == pytest.approx(1.0)
+
+    calibrated = plan_render(SENTENCES, config, PAUSE_CHARS, rates)
+    assert calibrated["render_seconds"] == pytest.approx(
+        1.0 + plan["video_seconds"] * 3 + plan["audio_clips"] * 0.03
+    )
+    assert calibrated["peak_memory_mb"] == 250
+
+
+def test_metrics_are_appended(tmp_path):
+    config = config_with()
+    metrics = RenderMetrics(plan_render(SENTENCES, config, PAUSE_CHARS))
+    with metrics.phase("video"):
+        list(metrics.count(stream(config)))
+    path = str(tmp_path / "runs" / "metrics.jsonl")
+    metrics.write(path)
+    metrics.write(path)
+    records = load_metrics([path])
+    assert len(records) == 2
+    assert records[0]["frames"] == records[0]["plan"]["frames"]
+    assert records[0]["video_seconds"] > 0
+    assert calibrate(records)["runs"] == 2
+
+
+@pytest.mark.parametrize(
+    "seconds, text",
+    [(5.04, "5.0s"), (59.96, "1m00s"), (119.7, "2m00s"), (3599.6, "1h00m00s"), (3725, "1h02m05s")],
+)
+def test_durations_round_before_carrying(seconds, text):
+    assert _duration(seconds) == text
+
+
+def test_plan_command_does_not_load_the_renderer(tmp_path):
+    script = tmp_path / "script.txt"
+    script.write_text("ab，cd。你好！\n", encoding="utf-8")
+    code = (
+        "import sys\n"
+        "from src.main import cli\n"
+        f"cli(['plan', {str(script)!r}, '--json'], standalone_mode=False)\n"
+        "loaded = [m for m in ('PIL', 'numpy', 'av') if m in sys.modules]\n"
+        "print(loaded, file=sys.stderr)\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert json.loads(result.stdout)["sentences"] == 2
+    assert result.stderr.strip().splitlines()[-1] == "[]"
@@ -0,0 +1,79 @@
+import wave
+
+import pytest
+
+from src.sound_bank import SoundBank, char_class, load_sound_bank, open_sample_store
+
+
+def _write_wav(path, frames, sample_rate=44100, channels=2):
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(frames)
+    return str(path)
+
+
+@pytest.mark.parametrize(
+    "char,expected",
+    [
+        ("你", "cjk"),
+        ("カ", "cjk"),
+        ("a", "latin"),
+        ("é", "latin"),
+        ("7", "digit"),
+        ("，", "punctuation"),
+        ("!", "punctuation"),
+        ("α", None),
+    ],
+)
+def test_char_class(char, expected):
+    assert char_class(char) == expected
+
+
+class TestSampleStore:
+    def test_wav_samples_are_stored_without_decoding(self, tmp_path):
+        first = _write_wav(tmp_path / "a.wav", b"\x01\x00\x02\x00" * 10)
+        second = _write_wav(tmp_path / "b.wav", b"\x03\x00\x04\x00" * 5)
+        store = open_sample_store((first, second), 44100, 2, str(tmp_path / "cache"))
+        assert bytes(store.pcm(first)) == b"\x01\x00\x02\x00" * 10
+        assert bytes(store.pcm(second)) == b"\x03\x00\x04\x00" * 5
+        assert len(list((tmp_path / "cache").glob("*.pcm"))) == 1
+
+    def test_store_is_reused_from_cache(self, tmp_path):
+        sample = _write_wav(tmp_path / "a.wav", b"\x01\x00\x02\x00" * 10)
+        cache_dir = str(tmp_path / "cache")
+        open_sample_store((sample,), 44100, 2, cache_dir)
+        pcm_file = next((tmp_path / "cache").glob("*.pcm"))
+        mtime = pcm_file.stat().st_mtime_ns
+        open_sample_store.cache_clear()
+        store = open_sample_store((sample,), 44100, 2, cache_dir)
+        assert pcm_file.stat().st_mtime_ns == mtime
+        assert bytes(store.pcm(sample)) == b"\x01\x00\x02\x00" * 10
+
+
+    def test_equivalent_paths_share_the_cached_store(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        _write_wav(tmp_path / "a.wav", b"\x01\x00\x02\x00")
+        open_sample_store(("a.wav",), 44100, 2, "cache")
+        store = open_sample_store(("./a.wav",), 44100, 2, "cache")
+        assert bytes(store.pcm("./a.wav")) == b"\x01\x00\x02\x00"
+
+
+class TestSoundBank:
+    def test_classes_and_round_robin(self, tmp_path):
+        default = _write_wav(tmp_path / "default.wav", b"\x00\x00\x00\x00")
+        cjk_1 = _write_wav(tmp_path / "cjk_1.wav", b"\x01\x00\x01\x00")
+        cjk_2 = _write_wav(tmp_path / "cjk_2.wav", b"\x02\x00\x02\x00")
+        config = {
+            "sound_bank": {"cjk": [cjk_1, cjk_2], "digit": str(tmp_path / "missing.wav")},
+            "sample_cache_dir": str(tmp_path / "cache"),
+        }
+        bank = load_sound_bank(default, config, 44100, 2)
+        assert isinstance(bank, SoundBank)
+        assert [bank.next_sample(c) for c in "你好世"] == [cjk_1, cjk_2, cjk_1]
+        assert bank.next_sample("a") == default
+        # A missing file is skipped, so digits use the default sound
+        assert bank.next_sample("7") == default
+        assert not bank.has_class("digit")
+        assert bytes(bank.pcm(cjk_2)) == b"\x02\x00\x02\x00"
@@ -0,0 +1,109 @@
+import pytest
+from click.testing import CliRunner
+from PIL import Image
+
+from src.frame_generator import (
+    _load_fonts,
+    generate_sentence_frames,
+    iter_sentence_runs,
+    iter_timeline_frames,
+    render_draws,
+)
+from src.main import cli
+from src.timeline import TimelineIndex, parse_timestamp
+
+CONFIG = {
+    "resolution": [320, 90],
+    "font_size": 16,
+    "text_color": "#FFFFFF",
+    "background_color": "#000000",
+    "text_position": [10, 30],
+}
+SENTENCES = ["，开头", "ab，cd。", "你好，世界！", "x", "a,,b!"]
+TIMING = {
+    "fps": 30,
+    "character_duration_ms": 40,
+    "pause_chars": ["，", ","],
+    "character_pause_ms": 250,
+    "sentence_pause_ms": 333,
+}
+
+
+@pytest.fixture
+def index():
+    return TimelineIndex(SENTENCES, CONFIG, None, **TIMING)
+
+
+def test_sentence_runs_match_frame_count():
+    runs = list(iter_sentence_runs("ab，cd。", fps=30, character_duration_ms=40, pause_chars=["，"]))
+    frames, _ = generate_sentence_frames(
+        "ab，cd。", CONFIG, fps=30, character_duration_ms=40, pause_chars=["，"]
+    )
+    assert sum(count for count, _ in runs) == len(frames)
+    # The final frame overdraws the full stop onto the "ab，cd" frame
+    assert runs[-1] == (1, (5, 6))
+
+
+def test_index_matches_streamed_frames(index):
+    frames = list(iter_timeline_frames(SENTENCES, CONFIG, None, **TIMING))
+    assert index.total_frames == len(frames)
+    # Out of order, so every lookup starts from the index, not a cache
+    for i in reversed(range(len(frames))):
+        assert index.render_frame(i).tobytes() == frames[i].tobytes()
+
+
+def test_frame_index_at_clamps(index):
+    assert index.frame_index_at(0) == 0
+    assert index.frame_index_at(0.1) == 3
+    assert index.frame_index_at(-5) == 0
+    assert index.frame_index_at(10_000) == index.total_frames - 1
+    with pytest.raises(IndexError):
+        index.render_frame(index.total_frames)
+
+
+def test_poster_shows_whole_sentence(index):
+    sentence = SENTENCES[1]
+    expected = render_draws(CONFIG, sentence, (len(sentence),), _load_fonts(None, CONFIG))
+    assert index.poster_frame_index(1) == index.frame_starts[2] - 1
+    assert index.render_poster(1).tobytes() == expected.tobytes()
+    assert index.poster_frame_index(len(SENTENCES) - 1) == index.total_frames - 1
+
+
+def test_segment_starts_are_sentence_aligned(index):
+    starts = index.segment_starts(1)
+    assert starts[0] == 0
+    assert set(starts) <= set(index.frame_starts)
+    assert all(b - a >= 30 for a, b in zip(starts, starts[1:]))
+    assert index.segment_starts(0) == index.frame_starts
+
+
+def test_contact_sheet_layout(index):
+    sheet = index.contact_sheet(6, columns=4, thumb_width=80)
+    assert sheet.size == (4 * 80, 2 * round(90 * 80 / 320))
+
+
+@pytest.mark.parametrize(
+    "value,seconds",
+    [("754.2s", 754.2), ("754.2", 754.2), ("12:34.2", 754.2), ("1:00:00", 3600.0)],
+)
+def test_parse_timestamp(value, seconds):
+    assert parse_timestamp(value) == pytest.approx(seconds)
+
+
+def test_parse_timestamp_invalid():
+    with pytest.raises(ValueError):
+        parse_timestamp("soon")
+
+
+def test_frame_command(tmp_path):
+    input_file = tmp_path / "input.txt"
+    input_file.write_text("Hello, world. Again!\n", encoding="utf-8")
+    output = tmp_path / "frame.png"
+
+    result = CliRunner().invoke(cli, ["frame", str(input_file), "--at", "0.5s", "-o", str(output)])
+    assert result.exit_code == 0, result.output
+    with Image.open(output) as image:
+        assert image.size == (1920, 1080)
+
+    result = CliRunner().invoke(cli, ["frame", str(input_file), "-o", str(output)])
+    assert result.exit_code != 0
@@ -1,7 +1,22 @@
+import os
+import threading
 from PIL import Image
 import tempfile
 from pathlib import Path
-from src.video_builder import save_frames
+import pytest
+
+from src.config import resolve_config
+from src.video_builder import (
+    FRAGMENTED_MOVFLAGS,
+    IOV_MAX,
+    LIVE_PLAYLISTS,
+    build_encode_command,
+    enlarge_pipe,
+    export_image_sequence,
+    output_targets,
+    save_frames,
+    write_frames,
+)
 
 
 def test_save_frames():
@@ -17,3 +32,205 @@ def test_save_frames_empty():
         save_frames([], tmpdir, prefix="test")
         saved_files = list(Path(tmpdir).glob("test_*.png"))
         assert len(saved_files) == 0
+
+
+def _read_pipe(frames):
+    read_fd, write_fd = os.pipe()
+    chunks = []
+
+    def drain():
+        with os.fdopen(read_fd, "rb") as reader:
+            chunks.append(reader.read())
+
+    thread = threading.Thread(target=drain)
+    thread.start()
+    count = write_frames(write_fd, frames)
+    os.close(write_fd)
+    thread.join()
+    return count, chunks[0]
+
+
+def test_write_frames_repeats_held_frames():
+    red = Image.new("RGB", (4, 2), "red")
+    blue = Image.new("RGB", (4, 2), "blue")
+    count, data = _read_pipe([red, red, red, blue, red])
+    assert count == 5
+    expected = red.tobytes() * 3 + blue.tobytes() + red.tobytes()
+    assert data == expected
+
+
+def test_write_frames_converts_non_rgb():
+    frame = Image.new("L", (3, 3), 255)
+    count, data = _read_pipe([frame])
+    assert count == 1
+    assert data == frame.convert("RGB").tobytes()
+
+
+def test_write_frames_large_batches():
+    # More repeats than fit in one writev() call
+    frame = Image.new("RGB", (2, 2), "green")
+    count, data = _read_pipe([frame] * (IOV_MAX * 2 + 3))
+    assert count == IOV_MAX * 2 + 3
+    assert data == frame.tobytes() * count
+
+
+def test_enlarge_pipe_does_not_raise():
+    read_fd, write_fd = os.pipe()
+    try:
+        assert enlarge_pipe(write_fd, 1024 * 1024) >= 0
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+
+class TestOutputTargets:
+    def test_single_target_by_default(self):
+        targets = output_targets({"resolution": [1920, 1080]}, "out/video.mp4")
+        assert targets == [{"name": "", "path": "out/video.mp4", "resolution": [1920, 1080]}]
+
+    def test_named_targets_derive_paths(self):
+        config = {
+            "resolution": [1920, 1080],
+            "outputs": [
+                {"name": "1080p"},
+                {"resolution": [1280, 720]},
+                {"name": "vertical", "resolution": [1080, 1920], "crop": [608, 1080, 656, 0]},
+                {"name": "custom", "path": "elsewhere/custom.mp4"},
+            ],
+        }
+        targets = output_targets(config, "out/video.mp4")
+        assert [t["path"] for t in targets] == [
+            "out/video_1080p.mp4",
+            "out/video_1280x720.mp4",
+            "out/video_vertical.mp4",
+            "elsewhere/custom.mp4",
+        ]
+        assert targets[0]["resolution"] == [1920, 1080]
+
+    def test_duplicate_names_rejected(self):
+        config = {"outputs": [{"name": "a"}, {"name": "a"}]}
+        with pytest.raises(ValueError):
+            output_targets(config, "video.mp4")
+
+    @pytest.mark.parametrize(
+        "config",
+        [
+            {"resolution": [1921, 1080]},
+            {"outputs": [{"name": "small", "resolution": [641, 360]}]},
+            {"outputs": [{"name": "vertical", "crop": [607, 1080, 0, 0]}]},
+        ],
+    )
+    def test_odd_sizes_rejected(self, config):
+        with pytest.raises(ValueError, match="even"):
+            output_targets(config, "video.mp4")
+
+
+class TestBuildEncodeCommand:
+    def test_container_follows_the_extension(self):
+        config = resolve_config()["video"]
+        cmd = build_encode_command("audio.wav", output_targets(config, "out.mkv"), config)
+        # Only the raw frame input names a format
+        assert cmd.count("-f") == 1 and cmd[cmd.index("-f") + 1] == "rawvideo"
+        assert cmd[-1] == "out.mkv"
+
+    def test_single_target_has_no_filter(self):
+        config = {"resolution": [640, 480], "fps": 30}
+        cmd = build_encode_command("audio.wav", output_targets(config, "out.mp4"), config)
+        assert "-filter_complex" not in cmd
+        assert cmd[-1] == "out.mp4"
+        assert cmd.count("-c:v") == 1
+
+    def test_live_hls_forces_keyframes_at_segment_starts(self):
+        config = {"resolution": [640, 480], "fps": 30, "format": "mp4"}
+        targets = [{"name": "", "path": "live", "resolution": [640, 480]}]
+        live = {"format": "hls", "segment_seconds": 6, "segment_starts": [0, 180, 400]}
+        cmd = build_encode_command("audio.wav", targets, config, live)
+        assert cmd[cmd.index("-force_key_frames") + 1] == "5.983333,13.316667"
+        assert cmd[cmd.index("hls") - 1] == "-f"
+        assert cmd[cmd.index("-hls_time") + 1] == "3"
+        assert cmd[-1] == str(Path("live") / LIVE_PLAYLISTS["hls"])
+        assert "mp4" not in cmd
+
+    def test_live_dash_and_unknown_format(self):
+        config = {"resolution": [640, 480], "fps": 30}
+        targets = [{"name": "", "path": "live", "resolution": [640, 480]}]
+        cmd = build_encode_command("audio.wav", targets, config, {"format": "dash"})
+        assert "-force_key_frames" not in cmd
+        assert cmd[-1] == str(Path("live") / LIVE_PLAYLISTS["dash"])
+        with pytest.raises(ValueError):
+            build_encode_command("audio.wav", targets, config, {"format": "rtmp"})
+
+    def test_fragmented_output(self):
+        config = {"resolution": [640, 480], "fps": 30, "format": "mp4", "fragmented": True}
+        targets = [{"name": "", "path": "pipe:1", "resolution": [640, 480]}]
+        cmd = build_encode_command("audio.wav", targets, config)
+        assert cmd[cmd.index("-movflags") + 1] == FRAGMENTED_MOVFLAGS
+        assert cmd[-3:] == ["-f", "mp4", "pipe:1"]
+
+    def test_fan_out_splits_once(self):
+        config = {
+            "resolution": [1920, 1080],
+            "fps": 30,
+            "outputs": [
+                {"name": "full"},
+                {"name": "720p", "resolution": [1280, 720]},
+                {"name": "vertical", "resolution": [1080, 1920], "crop": [608, 1080, 656, 0]},
+            ],
+        }
+        cmd = build_encode_command("audio.wav", output_targets(config, "out.mp4"), config)
+        # One rawvideo input, one audio input, three encodes
+        assert cmd.count("-i") == 2
+        assert cmd.count("-c:v") == 3
+        graph = cmd[cmd.index("-filter_complex") + 1]
+        assert graph.startswith("[0:v]split=3[s0][s1][s2]")
+        assert "[s1]scale=1280:720[v1]" in graph
+        assert "[s2]crop=608:1080:656:0,scale=1080:1920[v2]" in graph
+        assert cmd.count("1:a:0") == 3
+
+    def test_video_only(self):
+        config = {"resolution": [640, 480], "fps": 30, "outputs": [{"name": "a"}, {"name": "b"}]}
+        cmd = build_encode_command(None, output_targets(config, "out.mp4"), config)
+        assert "-c:a" not in cmd
+        assert "1:a:0" not in cmd
+
+
+class TestExportImageSequence:
+    def test_held_frames_are_hardlinked(self, tmp_path):
+        red = Image.new("RGB", (8, 8), "red")
+        blue = Image.new("RGB", (8, 8), "blue")
+        count = export_image_sequence([red, red, red, blue], str(tmp_path), workers=2)
+        assert count == 4
+        files = sorted(tmp_path.glob("frame_*.png"))
+        assert len(files) == 4
+        assert files[0].stat().st_ino == files[2].stat().st_ino
+        assert files[0].stat().st_ino != files[3].stat().st_ino
+        assert Image.open(files[3]).getpixel((0, 0)) == (0, 0, 255)
+
+    def test_manifest_mode_writes_unique_frames(self, tmp_path):
+        red = Image.new("RGB", (8, 8), "red")
+        blue = Image.new("RGB", (8, 8), "blue")
+        export_image_sequence([red] * 30 + [blue] * 15, str(tmp_path), fps=30, mode="manifest")
+        assert sorted(p.name for p in tmp_path.glob("*.png")) == [
+            "frame_000000.png",
+            "frame_000030.png",
+        ]
+        manifest = (tmp_path / "frame.ffconcat").read_text()
+        assert "file 'frame_000000.png'\nduration 1.000000" in manifest
+        assert "file 'frame_000030.png'\nduration 0.500000" in manifest
+
+    def test_webp_is_lossless(self, tmp_path):
+        frame = Image.new("RGB", (8, 8), (12, 34, 56))
+        export_image_sequence([frame], str(tmp_path), image_format="webp")
+        saved = Image.open(tmp_path / "frame_000000.webp").convert("RGB")
+        assert saved.tobytes() == frame.tobytes()
+
+    def test_palette_frames_as_jpeg(self, tmp_path):
+        frame = Image.new("RGB", (8, 8), "red").convert("P")
+        export_image_sequence([frame, frame], str(tmp_path), image_format="jpeg")
+        saved = Image.open(tmp_path / "frame_000000.jpeg")
+        assert saved.mode == "RGB"
+        assert saved.getpixel((4, 4))[0] > 200
+
+    def test_unknown_mode(self, tmp_path):
+        with pytest.raises(ValueError):
+            export_image_sequence([], str(tmp_path), mode="zip")